@@ -0,0 +1,39 @@
+import sys
+import random
+import time
+
+import engine
+import game
+import kingsburg
+import logger
+import training
+
+def samples(games: int):
+    states = []
+    influences = []
+    rng = random.Random(0)
+    for i in range(0, games):
+        eng = engine.TrainingDataEngine(logger.SilentLogger(), rng)
+        game.Game(eng, kingsburg.State()).play()
+        for influence, idx in eng.advisor_choices:
+            states.append(eng.states[idx])
+            influences.append(influence)
+    return states, influences
+
+def scalar(states, influences):
+    return [training.state_to_input(s) + training.advisor_choice_to_input(s, i) for s, i in zip(states, influences)]
+
+def batch(states, influences):
+    return training.states_to_input(states), training.advisor_choices_to_input(states, influences)
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    states, influences = samples(games)
+    print("%d samples from %d games" % (len(states), games))
+
+    for name, encode in [("scalar", scalar), ("batch", batch)]:
+        start = time.time()
+        encode(states, influences)
+        elapsed = time.time() - start
+        print("  %-7s %10.0f samples/sec" % (name + ":", len(states) / elapsed))
@@ -0,0 +1,28 @@
+import sys
+import subprocess
+import time
+
+# The modules a random game or data generation needs.
+RANDOM_PATH = "import engine, game, simulation, bin.generate_random_games"
+
+def import_time(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.check_call([sys.executable, "-c", code])
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print("Usage:")
+        print("python -m bin.benchmark_imports [max_ms]")
+        sys.exit(1)
+
+    runs = 5
+    baseline = min(import_time("pass") for i in range(0, runs))
+    elapsed = min(import_time(RANDOM_PATH) for i in range(0, runs))
+    ms = (elapsed - baseline) * 1000
+    print("Interpreter startup: %6.1fms" % (baseline * 1000))
+    print("Random-game imports: %6.1fms" % ms)
+
+    if len(sys.argv) == 2 and ms > float(sys.argv[1]):
+        print("Slower than " + sys.argv[1] + "ms")
+        sys.exit(1)
@@ -0,0 +1,114 @@
+import collections.abc
+import itertools
+import sys
+import timeit
+
+import kingsburg
+
+# The "insanebonus" cases from kingsburg_test, plus the same dice with
+# every modifier available.
+CASES = [
+    ("insanebonus", [6, 6, 6], [6], False, False),
+    ("insanebonus+plustwo+market", [6, 6, 6], [6], True, True),
+    ("mixed+plustwo+market", [1, 3, 5], [2, 4], True, True),
+]
+
+def player_for(player_dice, bonus_dice, plustwo, market) -> kingsburg.PlayerState:
+    player = kingsburg.PlayerState("fred").roll(kingsburg.ProductiveSeasonRoll(player_dice, bonus_dice))
+    if market:
+        player = player.addBuilding(kingsburg.BUILDING_MARKET, [])
+    if plustwo:
+        player.plustwo_tokens = 1
+    return player
+
+# A frozen copy of the original move generator and the util helpers it was
+# built on, kept here as the reference the cached generator is timed against.
+# Don't "fix" these: they are meant to stay exactly as they were.
+
+def unique_combinations(nums, max_len=None):
+    combos = []
+    alreadySeen = set()
+    l = max_len
+    if l is None:
+        l = len(nums)
+    for i in range(0, l+1):
+        for combo in [x for x in itertools.combinations(nums, i)]:
+            if combo in alreadySeen:
+                continue
+            alreadySeen.add(combo)
+            combos.append(list(combo))
+    return combos
+
+def unique_list_pairs(lists1, lists2):
+    combos = []
+    alreadySeen = set()
+    for l1 in lists1:
+        for l2 in lists2:
+            combo = [l1, l2]
+            t = tuplize(combo)
+            if t in alreadySeen:
+                continue
+            alreadySeen.add(t)
+            combos.append(combo)
+    return combos
+
+def tuplize(list):
+    out = []
+    for item in list:
+        if not isinstance(item, collections.abc.Iterable):
+            out.append(item)
+        else:
+            out.append(tuplize(item))
+    return tuple(out)
+
+def generate_advisor_influences(player_dice, bonus_dice, plustwo, market):
+    market_modifiers = [-1, 1] if market else []
+    plustwos = [1] if plustwo else []
+
+    player_dice_combos = unique_combinations(player_dice)
+    bonus_dice_combos = unique_combinations(bonus_dice)
+    plustwo_combos = unique_combinations(plustwos)
+    market_combos = unique_combinations(market_modifiers, 1)
+
+    all_possible_moves = unique_list_pairs(
+        unique_list_pairs(
+            unique_list_pairs(player_dice_combos, bonus_dice_combos),
+            plustwo_combos),
+        market_combos)
+
+    influences = []
+    for move in all_possible_moves:
+        move_player_dice = move[0][0][0]
+        move_bonus_dice = move[0][0][1]
+        move_plustwo = len(move[0][1]) > 0
+        market_modifier = move[1][0] if len(move[1]) > 0 else 0
+
+        influence = kingsburg.AdvisorInfluence(move_player_dice, move_bonus_dice, move_plustwo, market_modifier)
+        score = influence.advisorScore()
+        if score < 1 or score > kingsburg.ADVISOR_MAX:
+            continue
+        if len(influence.player_dice) == 0:
+            continue
+        influences.append(influence)
+    return influences
+
+def uncached(player: kingsburg.PlayerState, plustwo: bool, market: bool):
+    available = kingsburg.ADVISORS_MASK
+    influences = generate_advisor_influences(player.dice.player_dice, player.dice.bonus_dice, plustwo, market)
+    return [kingsburg.ADVISOR_INFLUENCE_PASS] + [i for i in influences if available & kingsburg.ADVISOR_BIT[i.advisorScore()]]
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for name, player_dice, bonus_dice, plustwo, market in CASES:
+        player = player_for(player_dice, bonus_dice, plustwo, market)
+        reference = uncached(player, plustwo, market)
+        got = player.choices__advisorInfluence(kingsburg.ADVISORS_MASK)
+        assert len(reference) == len(got) and set(reference) == set(got)
+
+        before = timeit.timeit(lambda: uncached(player, plustwo, market), number=number)
+        after = timeit.timeit(lambda: player.choices__advisorInfluence(kingsburg.ADVISORS_MASK), number=number)
+        print(name)
+        print("  original:  %8.1f us/call" % (before / number * 1e6))
+        print("  cached:    %8.1f us/call" % (after / number * 1e6))
+        print("  speedup:   %8.1fx" % (before / after))
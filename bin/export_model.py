@@ -0,0 +1,21 @@
+import sys
+
+import keras
+import numpy
+
+import inference
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage:")
+        print("python -m bin.export_model <model> <out.npz>")
+        sys.exit(1)
+
+    model = keras.models.load_model(sys.argv[1])
+    exported = inference.NumpyModel.fromKeras(model)
+    exported.save(sys.argv[2])
+
+    # Check the export against Keras on random 0/1 inputs.
+    inputs = (numpy.random.rand(100, exported.layers[0][0].shape[0]) > 0.5).astype(numpy.float32)
+    difference = numpy.max(numpy.abs(model.predict(inputs) - exported.predict(inputs)))
+    print("Max difference from Keras: " + str(difference))
@@ -1,15 +1,24 @@
-import sys
+import argparse
 import os
 import errno
 import json
 import time
-import datetime
+import hashlib
+import multiprocessing
 import random
+from typing import Tuple
 
 import kingsburg
 import engine
 import logger
 import game
+import shards
+
+FORMAT_JSONL = "jsonl"
+FORMAT_NPY = "npy"
+
+# training.ENCODINGS, listed here so the JSON path never imports numpy.
+ENCODINGS = [1, 2]
 
 def mkdir_p(path):
     try:
@@ -20,11 +29,72 @@ def mkdir_p(path):
         else:
             raise
 
-def ident():
-    d = datetime.datetime.now()
-    unix = time.mktime(d.timetuple())
-    rand = random.randint(10000, 99990)
-    return str(unix) + "-" + str(rand)
+def worker_seed(master_seed: int, worker: int) -> int:
+    """
+    Derives an independent, reproducible seed for the given worker.
+    """
+    digest = hashlib.sha256((str(master_seed) + ":" + str(worker)).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def play_game(rng: random.Random) -> Tuple[engine.TrainingDataEngine, kingsburg.State]:
+    """
+    Plays one random game, returning the engine holding its training data
+    and the final state.
+    """
+    eng = engine.TrainingDataEngine(logger.SilentLogger(), rng)
+    g = game.Game(eng, kingsburg.State())
+    g.play()
+    return eng, g.state
+
+def game_json(eng: engine.TrainingDataEngine, state: kingsburg.State) -> str:
+    return json.dumps({
+        "states": [state.toDict() for state in eng.states],
+        "advisor_choices": [[choice[0].toDict(), choice[1]] for choice in eng.advisor_choices],
+        "advisor_actions": [kingsburg.action_id(choice[0]) for choice in eng.advisor_choices],
+        "won": eng.won(state)
+    })
+
+def generate(worker: int, num: int, batchsize: int, dir: str, master_seed: int, progress=None, compression=None, format=FORMAT_JSONL, encoding=1):
+    """
+    Plays num games with the worker's own rng, streaming them into shards
+    of batchsize games named after the master seed and worker.
+    """
+    seed = worker_seed(master_seed, worker)
+    rng = random.Random(seed)
+    prefix = str(master_seed) + "-" + str(worker)
+    seeds = {"master": master_seed, "worker": worker, "seed": seed}
+    if format == FORMAT_NPY:
+        generate_npy(rng, num, batchsize, dir, prefix, seeds, progress, encoding)
+    else:
+        generate_jsonl(rng, num, batchsize, dir, prefix, seeds, progress, compression)
+
+def generate_jsonl(rng: random.Random, num: int, batchsize: int, dir: str, prefix: str, seeds, progress, compression):
+    with shards.ShardWriter(dir, prefix, max_records=batchsize, compression=compression, seeds=seeds) as writer:
+        for i in range(0, num):
+            eng, state = play_game(rng)
+            writer.write(game_json(eng, state))
+            count_game(progress)
+
+def generate_npy(rng: random.Random, num: int, batchsize: int, dir: str, prefix: str, seeds, progress, encoding: int):
+    # Only the .npy format needs numpy, so it is not imported otherwise.
+    import dataset
+    with dataset.NpyShardWriter(dir, prefix, max_records=batchsize, seeds=seeds, encoding=encoding) as writer:
+        for i in range(0, num):
+            eng, state = play_game(rng)
+            features, labels = dataset.encode_game(eng.states, eng.advisor_choices, eng.won(state), encoding)
+            writer.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+            count_game(progress)
+
+def count_game(progress):
+    if progress is not None:
+        with progress.get_lock():
+            progress.value += 1
+
+def split(num: int, workers: int):
+    """
+    Splits num games as evenly as possible between workers.
+    """
+    return [num // workers + (1 if worker < num % workers else 0) for worker in range(workers)]
 
 # TODO should start games at a random state rather than beginning
 # TODO in addition to this, test the effect of having more than one output
@@ -32,34 +102,39 @@ def ident():
 # TODO does randomplayer ever need to pass unnecessarily? it may on buildings, not on influence
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage:")
-        print("python -m bin.generate_random_games <num> <batchsize> <dir>")
-        sys.exit(1)
-
-    num = int(sys.argv[1])
-    batchsize = int(sys.argv[2])
-    dir = sys.argv[3]
-
-    mkdir_p(dir)
-
-    output = ""
-    for i in range(1, num+1):
-        l = logger.SilentLogger()
-        eng = engine.TrainingDataEngine(l)
-        state = kingsburg.State()
-        g = game.Game(eng, kingsburg.State())
-        g.play()
-        game_json = json.dumps({
-            "states": [state.toDict() for state in eng.states],
-            "advisor_choices": [[choice[0].toDict(), choice[1]] for choice in eng.advisor_choices],
-            "won": eng.won(g.state)
-        })
-        output += game_json + "\n"
-        if i % batchsize == 0:
-            filename = dir + "/" + ident()
-            f = open(filename, "w")
-            f.write(output)
-            f.close()
-            output = ""
-        print(i)
+    parser = argparse.ArgumentParser(prog="python -m bin.generate_random_games")
+    parser.add_argument("num", type=int, help="number of games to play")
+    parser.add_argument("batchsize", type=int, help="games per output file")
+    parser.add_argument("dir", help="output directory")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="master seed, random if not given")
+    parser.add_argument("--compression", choices=[shards.COMPRESSION_GZIP, shards.COMPRESSION_LZMA], default=None, help="compress shards")
+    parser.add_argument("--format", choices=[FORMAT_JSONL, FORMAT_NPY], default=FORMAT_JSONL, help="write JSON lines of states, or pre-encoded .npy features and labels")
+    parser.add_argument("--encoding", type=int, choices=ENCODINGS, default=1, help="training encoding of .npy features; 2 adds advisor occupancy")
+    args = parser.parse_args()
+
+    master_seed = args.seed if args.seed is not None else random.randrange(2**32)
+    print("Seed: " + str(master_seed))
+
+    mkdir_p(args.dir)
+
+    start = time.time()
+    progress = multiprocessing.Value("i", 0)
+    processes = []
+    for worker, count in enumerate(split(args.num, args.workers)):
+        if count == 0:
+            continue
+        p = multiprocessing.Process(target=generate, args=(worker, count, args.batchsize, args.dir, master_seed, progress, args.compression, args.format, args.encoding))
+        p.start()
+        processes.append(p)
+
+    while any(p.is_alive() for p in processes):
+        time.sleep(1)
+        elapsed = time.time() - start
+        print("%d/%d games (%.1f games/sec)" % (progress.value, args.num, progress.value / elapsed))
+
+    for p in processes:
+        p.join()
+        if p.exitcode != 0:
+            raise Exception("Worker exited with code " + str(p.exitcode))
+    print("%d games in %.1fs" % (progress.value, time.time() - start))
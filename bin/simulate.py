@@ -0,0 +1,38 @@
+import random
+import sys
+import time
+
+import engine
+import game
+import kingsburg
+import logger
+import simulation
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage:")
+        print("python -m bin.simulate <num> [seed]")
+        sys.exit(1)
+
+    num = int(sys.argv[1])
+    seed = int(sys.argv[2]) if len(sys.argv) == 3 else None
+
+    start = time.time()
+    results = simulation.simulate(num, seed=seed)
+    elapsed = time.time() - start
+
+    # The same games again through game.Game and an engine, for comparison.
+    rng = random.Random(seed)
+    start = time.time()
+    for i in range(0, num):
+        game.Game(engine.RandomEngine(logger.SilentLogger(), rng), kingsburg.State()).play()
+    game_elapsed = time.time() - start
+
+    wins: dict = {}
+    for result in results:
+        for name in result.winners:
+            wins[name] = wins.get(name, 0) + 1
+    print("Games: " + str(num))
+    print("Wins (ties count for everyone tied): " + str(wins))
+    print("simulate():  %.2fs (%.1f games/sec)" % (elapsed, num / elapsed))
+    print("Game.play(): %.2fs (%.1f games/sec)" % (game_elapsed, num / game_elapsed))
@@ -1,58 +1,58 @@
 import sys
-import os
-import json
+import math
 
 import keras
-import numpy
 
+import dataset
 import kingsburg
 import training
 
+BATCH_SIZE = 32
+SHUFFLE_BUFFER = 10000
+
+MODE_ADVISOR_CHOOSER = "advisor_chooser"
+MODE_POLICY = "policy"
+
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
+    if len(sys.argv) not in [4, 5, 6] or (len(sys.argv) >= 5 and sys.argv[4] not in [MODE_ADVISOR_CHOOSER, MODE_POLICY]):
         print("Usage:")
-        print("python -m bin.train <num> <out> <dir>")
+        print("python -m bin.train <num> <out> <dir> [advisor_chooser|policy] [encoding]")
+        print("<num> is the number of samples to train on per epoch")
+        print("[encoding] is a training encoding, taken from .npy shards if not given")
         sys.exit(1)
 
     num = int(sys.argv[1])
     out = sys.argv[2]
     dir = sys.argv[3]
+    mode = sys.argv[4] if len(sys.argv) >= 5 else MODE_ADVISOR_CHOOSER
+    encoding = dataset.dir_encoding(dir, int(sys.argv[5]) if len(sys.argv) == 6 else None)
+    print("Encoding: " + str(encoding))
 
-    files = os.listdir(dir)
-    files = [dir + "/" + f for f in files if os.path.isfile(dir + "/" + f)]
-
-    advisor_chooser_inputs = []
-    advisor_chooser_outputs = []
-
-    print("Loading data...")
-    stop = False
-    count = 0
-    for file in files:
-        if stop:
-            break
-        with open(file, "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                if count == num:
-                    stop = True
-                    break
-                d = json.loads(line)
-                states = [kingsburg.State().fromDict(s) for s in d["states"]]
-                for choice in d["advisor_choices"]:
-                    # Structure of each element is (advisor_influence, state_idx)
-                    influence = kingsburg.AdvisorInfluence.fromDict(choice[0])
-                    s = states[choice[1]]
-                    base_input = training.state_to_input(s)
-                    influence_input = training.advisor_choice_to_input(s, influence)
-                    advisor_chooser_inputs.append(base_input + influence_input)
-                    advisor_chooser_outputs.append([int(d["won"]), 1-int(d["won"])])
+    print("Counting samples...")
+    # Samples are streamed from disk rather than loaded, so the dataset
+    # can be larger than memory.
+    num = min(num, dataset.count_samples(dir))
+    steps = int(math.ceil(num / BATCH_SIZE))
 
     print("Training...")
-    advisor_chooser_model = keras.models.Sequential()
-    advisor_chooser_model.add(keras.layers.Dense(1000, input_dim=516, activation="relu"))
-    advisor_chooser_model.add(keras.layers.Dense(1000, activation='relu'))
-    advisor_chooser_model.add(keras.layers.Dense(1000, activation='relu'))
-    advisor_chooser_model.add(keras.layers.Dense(2, activation="linear", kernel_initializer="glorot_uniform"))
-    advisor_chooser_model.compile(loss="mean_squared_error", optimizer="adam", metrics=["accuracy"])
-    advisor_chooser_model.fit(numpy.asarray(advisor_chooser_inputs), numpy.asarray(advisor_chooser_outputs), verbose=True)
-    advisor_chooser_model.save(out + '_advisor_chooser')
+    if mode == MODE_POLICY:
+        # Scores every action from the state alone. Only choices made in won
+        # games are weighted, so it learns to place dice like a winner.
+        policy_data = dataset.policy_training_batches(dir, BATCH_SIZE, SHUFFLE_BUFFER, num=num, encoding=encoding)
+        policy_model = keras.models.Sequential()
+        policy_model.add(keras.layers.Dense(1000, input_dim=training.state_inputs(encoding), activation="relu"))
+        policy_model.add(keras.layers.Dense(1000, activation='relu'))
+        policy_model.add(keras.layers.Dense(len(kingsburg.ACTIONS), activation="softmax"))
+        policy_model.compile(loss="sparse_categorical_crossentropy", optimizer="adam", metrics=["accuracy"])
+        policy_model.fit_generator(policy_data, steps_per_epoch=steps, verbose=True)
+        policy_model.save(out + '_policy')
+    else:
+        value_data = dataset.training_batches(dir, BATCH_SIZE, SHUFFLE_BUFFER, num=num, encoding=encoding)
+        advisor_chooser_model = keras.models.Sequential()
+        advisor_chooser_model.add(keras.layers.Dense(1000, input_dim=dataset.feature_count(encoding), activation="relu"))
+        advisor_chooser_model.add(keras.layers.Dense(1000, activation='relu'))
+        advisor_chooser_model.add(keras.layers.Dense(1000, activation='relu'))
+        advisor_chooser_model.add(keras.layers.Dense(2, activation="linear", kernel_initializer="glorot_uniform"))
+        advisor_chooser_model.compile(loss="mean_squared_error", optimizer="adam", metrics=["accuracy"])
+        advisor_chooser_model.fit_generator(value_data, steps_per_epoch=steps, verbose=True)
+        advisor_chooser_model.save(out + '_advisor_chooser')
@@ -0,0 +1,360 @@
+import itertools
+import json
+import os
+import random
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import numpy
+
+import kingsburg
+import shards
+import training
+
+# Every advisor choice is encoded as the state followed by the choice
+# itself (140 ints), see training.encode_advisor_choices. With the default
+# encoding, training.ENCODING_V1, the state is 376 ints.
+FEATURES = training.STATE_INPUTS + training.ADVISOR_CHOICE_INPUTS
+LABELS = 2
+DTYPE = training.INPUT_DTYPE
+# Each advisor choice is also stored as its kingsburg action ID.
+ACTION_DTYPE = numpy.int16
+
+INDEX_SUFFIX = ".index.json"
+FEATURES_SUFFIX = ".features.npy"
+LABELS_SUFFIX = ".labels.npy"
+ACTIONS_SUFFIX = ".actions.npy"
+TMP_SUFFIX = ".tmp"
+
+def feature_count(encoding: int) -> int:
+    """
+    Returns the number of features per advisor choice with the given encoding.
+    """
+    return training.state_inputs(encoding) + training.ADVISOR_CHOICE_INPUTS
+
+def encode_game(states: List[kingsburg.State], advisor_choices: List[Tuple[kingsburg.AdvisorInfluence, int]], won: float, encoding: int=training.ENCODING_V1) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Encodes one game's advisor choices into a (choices, feature_count)
+    feature matrix and a (choices, LABELS) label matrix, the same way
+    bin/train encodes JSON games.
+    """
+    chosen = [states[idx] for influence, idx in advisor_choices]
+    influences = [influence for influence, idx in advisor_choices]
+    features = training.encode_advisor_choices(chosen, influences, encoding)
+    labels = numpy.empty((len(advisor_choices), LABELS), dtype=DTYPE)
+    labels[:] = [int(won), 1-int(won)]
+    return features, labels
+
+def encode_actions(advisor_choices: List[Tuple[kingsburg.AdvisorInfluence, int]]) -> numpy.ndarray:
+    """
+    Returns the action ID of each advisor choice.
+    """
+    return numpy.array([kingsburg.action_id(influence) for influence, idx in advisor_choices], dtype=ACTION_DTYPE)
+
+def decode_game(d: Dict[str, Any], encoding: int=training.ENCODING_V1) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Encodes a game as written to JSON lines by bin/generate_random_games.
+    """
+    states = [kingsburg.State().fromDict(s) for s in d["states"]]
+    # Structure of each element is (advisor_influence, state_idx)
+    advisor_choices = [(kingsburg.AdvisorInfluence.fromDict(c[0]), c[1]) for c in d["advisor_choices"]]
+    return encode_game(states, advisor_choices, d["won"], encoding)
+
+class NpyShardWriter():
+    """
+    Writes encoded games as .npy shards, one each for features, labels and
+    action IDs, rotating after max_records games.
+
+    Like shards.ShardWriter, each shard is saved to a temporary file and
+    atomically renamed into place, and an index listing every shard, its
+    game and sample counts and the given seeds is written on close to
+    <dir>/<prefix>.index.json. The index also records the encoding the
+    games were written with, which readers use to size their inputs.
+    """
+
+    def __init__(self, dir: str, prefix: str, max_records: Optional[int]=None, seeds: Optional[Dict[str, Any]]=None, encoding: int=training.ENCODING_V1):
+        self.dir = dir
+        self.prefix = prefix
+        self.max_records = max_records
+        self.encoding = encoding
+        self.seeds = seeds if seeds is not None else {}
+        self.shards: List[Dict[str, Any]] = []
+        self._features: List[numpy.ndarray] = []
+        self._labels: List[numpy.ndarray] = []
+        self._actions: List[numpy.ndarray] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def write(self, features: numpy.ndarray, labels: numpy.ndarray, actions: numpy.ndarray):
+        self._features.append(features)
+        self._labels.append(labels)
+        self._actions.append(actions)
+        if self.max_records is not None and len(self._features) >= self.max_records:
+            self._finish()
+
+    def close(self):
+        """
+        Finishes the current shard, if any, and writes the index.
+        """
+        if len(self._features) > 0:
+            self._finish()
+        index = {
+            "shards": self.shards,
+            "encoding": self.encoding,
+            "features": feature_count(self.encoding),
+            "labels": LABELS,
+            "dtype": numpy.dtype(DTYPE).name,
+            "seeds": self.seeds,
+        }
+        path = os.path.join(self.dir, self.prefix + INDEX_SUFFIX)
+        with open(path + TMP_SUFFIX, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(path + TMP_SUFFIX, path)
+
+    def _finish(self):
+        name = self.prefix + "-" + str(len(self.shards))
+        features = numpy.concatenate(self._features)
+        labels = numpy.concatenate(self._labels)
+        actions = numpy.concatenate(self._actions)
+        for suffix, array in [(FEATURES_SUFFIX, features), (LABELS_SUFFIX, labels), (ACTIONS_SUFFIX, actions)]:
+            path = os.path.join(self.dir, name + suffix)
+            # numpy.save appends .npy to paths, so save through a file object.
+            with open(path + TMP_SUFFIX, "wb") as f:
+                numpy.save(f, array)
+            os.replace(path + TMP_SUFFIX, path)
+        self.shards.append({
+            "features": name + FEATURES_SUFFIX,
+            "labels": name + LABELS_SUFFIX,
+            "actions": name + ACTIONS_SUFFIX,
+            "games": len(self._features),
+            "samples": len(features),
+        })
+        self._features = []
+        self._labels = []
+        self._actions = []
+
+def index_files(dir: str) -> List[str]:
+    return [os.path.join(dir, f) for f in sorted(os.listdir(dir)) if f.endswith(INDEX_SUFFIX)]
+
+def dir_encoding(dir: str, requested: Optional[int]=None) -> int:
+    """
+    Returns the encoding of the .npy shards in dir, or for JSON games the
+    requested encoding, training.ENCODING_V1 if none is. Raises a
+    ValueError if the shards were written with mixed encodings or with
+    another encoding than requested.
+    """
+    found = set()
+    for index_file in index_files(dir):
+        with open(index_file, "r") as f:
+            # Indexes from before encodings were versioned are ENCODING_V1.
+            found.add(json.load(f).get("encoding", training.ENCODING_V1))
+    if len(found) == 0:
+        return requested if requested is not None else training.ENCODING_V1
+    if len(found) > 1:
+        raise ValueError("Shards in " + dir + " use mixed encodings: " + str(sorted(found)))
+    result = found.pop()
+    if requested is not None and requested != result:
+        raise ValueError("Shards in " + dir + " use encoding " + str(result) + ", not " + str(requested))
+    return result
+
+def open_shards(dir: str) -> List[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """
+    Memory-maps every .npy shard listed by the indexes in dir, returning
+    (features, labels) pairs. Nothing is read until the arrays are used.
+    """
+    pairs: List[Tuple[numpy.ndarray, numpy.ndarray]] = []
+    for index_file in index_files(dir):
+        with open(index_file, "r") as f:
+            index = json.load(f)
+        for shard in index["shards"]:
+            features = numpy.load(os.path.join(dir, shard["features"]), mmap_mode="r")
+            labels = numpy.load(os.path.join(dir, shard["labels"]), mmap_mode="r")
+            pairs.append((features, labels))
+    return pairs
+
+def open_actions(dir: str) -> List[numpy.ndarray]:
+    """
+    Memory-maps the action IDs of every shard, in the same order as open_shards.
+    """
+    actions: List[numpy.ndarray] = []
+    for index_file in index_files(dir):
+        with open(index_file, "r") as f:
+            index = json.load(f)
+        for shard in index["shards"]:
+            actions.append(numpy.load(os.path.join(dir, shard["actions"]), mmap_mode="r"))
+    return actions
+
+Sample = Tuple[numpy.ndarray, numpy.ndarray]
+
+def samples(dir: str, rng: Optional[random.Random]=None, encoding: int=training.ENCODING_V1) -> Iterator[Sample]:
+    """
+    Yields a (features, labels) row for every sample in dir, reading one
+    shard at a time. Pre-encoded .npy shards are used if dir has an index,
+    otherwise JSON games are decoded and encoded with the given encoding
+    as they are read. If rng is given the shard order is shuffled.
+    """
+    pairs = open_shards(dir)
+    if len(pairs) > 0:
+        if rng is not None:
+            rng.shuffle(pairs)
+        for features, labels in pairs:
+            for i in range(0, len(features)):
+                yield features[i], labels[i]
+        return
+
+    files = shards.shard_files(dir)
+    if rng is not None:
+        rng.shuffle(files)
+    for file in files:
+        for line in shards.read_records(file):
+            features, labels = decode_game(json.loads(line), encoding)
+            for i in range(0, len(features)):
+                yield features[i], labels[i]
+
+def count_samples(dir: str) -> int:
+    """
+    Counts the samples in dir without encoding them.
+    """
+    if len(index_files(dir)) > 0:
+        count = 0
+        for index_file in index_files(dir):
+            with open(index_file, "r") as f:
+                count += sum(shard["samples"] for shard in json.load(f)["shards"])
+        return count
+    return sum(len(json.loads(line)["advisor_choices"]) for file in shards.shard_files(dir) for line in shards.read_records(file))
+
+T = TypeVar("T")
+
+def shuffled(stream: Iterator[T], size: int, rng: random.Random) -> Iterator[T]:
+    """
+    Shuffles a stream through a buffer of size samples, so samples from
+    neighbouring shards are mixed without holding the whole stream.
+    """
+    buffer: List[T] = []
+    for sample in stream:
+        if len(buffer) < size:
+            buffer.append(sample)
+            continue
+        i = rng.randrange(size)
+        yield buffer[i]
+        buffer[i] = sample
+    rng.shuffle(buffer)
+    for sample in buffer:
+        yield sample
+
+def batches(stream: Iterator[Sample], batch_size: int, width: int=FEATURES) -> Iterator[Sample]:
+    """
+    Groups a stream of samples into (batch_size, width) and
+    (batch_size, LABELS) arrays. The last batch may be smaller.
+    """
+    features = numpy.empty((batch_size, width), dtype=DTYPE)
+    labels = numpy.empty((batch_size, LABELS), dtype=DTYPE)
+    n = 0
+    for f, l in stream:
+        features[n] = f
+        labels[n] = l
+        n += 1
+        if n == batch_size:
+            yield features, labels
+            # Batches may be queued by the consumer, so never reuse one.
+            features = numpy.empty((batch_size, width), dtype=DTYPE)
+            labels = numpy.empty((batch_size, LABELS), dtype=DTYPE)
+            n = 0
+    if n > 0:
+        yield features[:n], labels[:n]
+
+def training_batches(dir: str, batch_size: int, buffer_size: int, seed: Optional[int]=None, num: Optional[int]=None, encoding: Optional[int]=None) -> Iterator[Sample]:
+    """
+    Endlessly yields shuffled batches of up to num samples per epoch from
+    dir, as keras' fit_generator expects. The shard order is shuffled each
+    epoch, so when num is less than the whole dataset each epoch may see a
+    different subset of it.
+
+    The encoding is that of the .npy shards in dir, which must match the
+    given one if any. JSON games are encoded with the given one, or
+    training.ENCODING_V1.
+    """
+    rng = random.Random(seed)
+    encoding = dir_encoding(dir, encoding)
+    width = feature_count(encoding)
+    while True:
+        stream: Iterator[Sample] = samples(dir, rng, encoding)
+        if num is not None:
+            stream = itertools.islice(stream, num)
+        for batch in batches(shuffled(stream, buffer_size, rng), batch_size, width):
+            yield batch
+
+# A state encoding, the action ID chosen from it, and whether the game was won.
+PolicySample = Tuple[numpy.ndarray, int, int]
+
+def policy_samples(dir: str, rng: Optional[random.Random]=None, encoding: int=training.ENCODING_V1) -> Iterator[PolicySample]:
+    """
+    Like samples, but yields (state features, action ID, won) for training
+    a policy over kingsburg.ACTIONS.
+    """
+    inputs = training.state_inputs(encoding)
+    pairs = open_shards(dir)
+    if len(pairs) > 0:
+        shards_actions = list(zip(pairs, open_actions(dir)))
+        if rng is not None:
+            rng.shuffle(shards_actions)
+        for (features, labels), actions in shards_actions:
+            for i in range(0, len(features)):
+                yield features[i, :inputs], int(actions[i]), int(labels[i, 0])
+        return
+
+    files = shards.shard_files(dir)
+    if rng is not None:
+        rng.shuffle(files)
+    for file in files:
+        for line in shards.read_records(file):
+            d = json.loads(line)
+            states = [kingsburg.State().fromDict(s) for s in d["states"]]
+            advisor_choices = [(kingsburg.AdvisorInfluence.fromDict(c[0]), c[1]) for c in d["advisor_choices"]]
+            features = training.encode_states([states[idx] for influence, idx in advisor_choices], encoding)
+            actions = encode_actions(advisor_choices)
+            for i in range(0, len(features)):
+                yield features[i], int(actions[i]), int(d["won"])
+
+def policy_batches(stream: Iterator[PolicySample], batch_size: int, width: int=training.STATE_INPUTS) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """
+    Groups policy samples into (inputs, action IDs, sample weights) batches
+    for a softmax over kingsburg.ACTIONS. Only choices from won games are
+    weighted, so the policy learns to imitate the winners.
+    """
+    inputs = numpy.empty((batch_size, width), dtype=DTYPE)
+    actions = numpy.empty((batch_size, 1), dtype=ACTION_DTYPE)
+    weights = numpy.empty(batch_size, dtype=numpy.float32)
+    n = 0
+    for features, action, won in stream:
+        inputs[n] = features
+        actions[n] = action
+        weights[n] = won
+        n += 1
+        if n == batch_size:
+            yield inputs, actions, weights
+            # Batches may be queued by the consumer, so never reuse one.
+            inputs = numpy.empty((batch_size, width), dtype=DTYPE)
+            actions = numpy.empty((batch_size, 1), dtype=ACTION_DTYPE)
+            weights = numpy.empty(batch_size, dtype=numpy.float32)
+            n = 0
+    if n > 0:
+        yield inputs[:n], actions[:n], weights[:n]
+
+def policy_training_batches(dir: str, batch_size: int, buffer_size: int, seed: Optional[int]=None, num: Optional[int]=None, encoding: Optional[int]=None) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """
+    Like training_batches, for policy_batches.
+    """
+    rng = random.Random(seed)
+    encoding = dir_encoding(dir, encoding)
+    width = training.state_inputs(encoding)
+    while True:
+        stream: Iterator[PolicySample] = policy_samples(dir, rng, encoding)
+        if num is not None:
+            stream = itertools.islice(stream, num)
+        for batch in policy_batches(shuffled(stream, buffer_size, rng), batch_size, width):
+            yield batch
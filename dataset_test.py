@@ -0,0 +1,150 @@
+import json
+import os
+import random
+import tempfile
+
+import numpy
+import pytest
+
+import dataset
+import engine
+import game
+import kingsburg
+import logger
+import shards
+import training
+
+def play(seed: int) -> engine.TrainingDataEngine:
+    eng = engine.TrainingDataEngine(logger.SilentLogger(), random.Random(seed))
+    g = game.Game(eng, kingsburg.State())
+    g.play()
+    return eng
+
+def test_encode_game():
+    eng = play(1)
+    features, labels = dataset.encode_game(eng.states, eng.advisor_choices, 1)
+    assert features.shape == (len(eng.advisor_choices), dataset.FEATURES)
+    assert labels.shape == (len(eng.advisor_choices), dataset.LABELS)
+    for row, (influence, idx) in enumerate(eng.advisor_choices):
+        s = eng.states[idx]
+        assert features[row].tolist() == training.state_to_input(s) + training.advisor_choice_to_input(s, influence)
+        assert labels[row].tolist() == [1, 0]
+
+def test_encode_game__v2():
+    eng = play(1)
+    features, labels = dataset.encode_game(eng.states, eng.advisor_choices, 1, training.ENCODING_V2)
+    assert features.shape == (len(eng.advisor_choices), dataset.feature_count(training.ENCODING_V2))
+    for row, (influence, idx) in enumerate(eng.advisor_choices):
+        s = eng.states[idx]
+        assert features[row].tolist() == training.state_to_input(s) + training.advisors_to_input(s) + training.advisor_choice_to_input(s, influence)
+
+def test_encodings():
+    eng = play(2)
+    with tempfile.TemporaryDirectory() as dir:
+        # JSON games and old indexes without an encoding are ENCODING_V1.
+        assert dataset.dir_encoding(dir) == training.ENCODING_V1
+        assert dataset.dir_encoding(dir, training.ENCODING_V2) == training.ENCODING_V2
+
+        with dataset.NpyShardWriter(dir, "v2", encoding=training.ENCODING_V2) as w:
+            features, labels = dataset.encode_game(eng.states, eng.advisor_choices, 1, training.ENCODING_V2)
+            w.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+        assert dataset.dir_encoding(dir) == training.ENCODING_V2
+        with pytest.raises(ValueError):
+            dataset.dir_encoding(dir, training.ENCODING_V1)
+
+        inputs, labels = next(dataset.training_batches(dir, 4, 10, seed=1))
+        assert inputs.shape == (4, dataset.feature_count(training.ENCODING_V2))
+        inputs, actions, weights = next(dataset.policy_training_batches(dir, 4, 10, seed=1))
+        assert inputs.shape == (4, training.STATE_INPUTS_V2)
+
+        with dataset.NpyShardWriter(dir, "v1") as w:
+            features, labels = dataset.encode_game(eng.states, eng.advisor_choices, 1)
+            w.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+        with pytest.raises(ValueError):
+            dataset.dir_encoding(dir)
+
+def test_npy_round_trip():
+    games = [play(seed) for seed in range(0, 3)]
+    encoded = [dataset.encode_game(eng.states, eng.advisor_choices, 0) for eng in games]
+    with tempfile.TemporaryDirectory() as dir:
+        with dataset.NpyShardWriter(dir, "run", max_records=2, seeds={"master": 0}) as w:
+            for eng, (features, labels) in zip(games, encoded):
+                w.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+        assert [s["games"] for s in w.shards] == [2, 1]
+        assert os.path.isfile(os.path.join(dir, "run" + dataset.INDEX_SUFFIX))
+
+        pairs = dataset.open_shards(dir)
+        assert len(pairs) == 2
+        assert isinstance(pairs[0][0], numpy.memmap)
+
+        actions = numpy.concatenate(dataset.open_actions(dir))
+        expected = [kingsburg.action_id(influence) for eng in games for influence, idx in eng.advisor_choices]
+        assert actions.tolist() == expected
+
+        features = numpy.concatenate([p[0] for p in pairs])
+        labels = numpy.concatenate([p[1] for p in pairs])
+        assert numpy.array_equal(features, numpy.concatenate([e[0] for e in encoded]))
+        assert numpy.array_equal(labels, numpy.concatenate([e[1] for e in encoded]))
+
+def test_training_batches():
+    games = [play(seed) for seed in range(0, 3)]
+    encoded = [dataset.encode_game(eng.states, eng.advisor_choices, seed % 2) for seed, eng in enumerate(games)]
+    total = sum(len(e[0]) for e in encoded)
+    expected = sorted(map(tuple, numpy.concatenate([numpy.hstack(e) for e in encoded]).tolist()))
+    with tempfile.TemporaryDirectory() as dir:
+        # The same games as JSON lines and as .npy shards stream identically.
+        os.makedirs(dir + "/json")
+        with shards.ShardWriter(dir + "/json", "run", max_records=1) as w:
+            for seed, eng in enumerate(games):
+                w.write(json.dumps({
+                    "states": [s.toDict() for s in eng.states],
+                    "advisor_choices": [[c[0].toDict(), c[1]] for c in eng.advisor_choices],
+                    "won": seed % 2,
+                }))
+        os.makedirs(dir + "/npy")
+        with dataset.NpyShardWriter(dir + "/npy", "run", max_records=1) as n:
+            for eng, (features, labels) in zip(games, encoded):
+                n.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+
+        for sub in ["json", "npy"]:
+            assert dataset.count_samples(dir + "/" + sub) == total
+            epoch = []
+            gen = dataset.training_batches(dir + "/" + sub, 16, 50, seed=1)
+            while sum(len(b[0]) for b in epoch) < total:
+                epoch.append(next(gen))
+            assert all(len(b[0]) == 16 for b in epoch[:-1])
+            got = sorted(map(tuple, numpy.concatenate([numpy.hstack(b) for b in epoch]).tolist()))
+            assert got == expected
+
+            gen = dataset.training_batches(dir + "/" + sub, 16, 50, seed=1, num=20)
+            assert [len(next(gen)[0]) for i in range(0, 4)] == [16, 4, 16, 4]
+
+def test_policy_batches():
+    games = [play(seed) for seed in range(0, 2)]
+    expected = []
+    for seed, eng in enumerate(games):
+        for influence, idx in eng.advisor_choices:
+            expected.append((tuple(training.state_to_input(eng.states[idx])), kingsburg.action_id(influence), seed % 2))
+    expected.sort()
+
+    with tempfile.TemporaryDirectory() as dir:
+        os.makedirs(dir + "/json")
+        with shards.ShardWriter(dir + "/json", "run") as w:
+            for seed, eng in enumerate(games):
+                w.write(json.dumps({
+                    "states": [s.toDict() for s in eng.states],
+                    "advisor_choices": [[c[0].toDict(), c[1]] for c in eng.advisor_choices],
+                    "won": seed % 2,
+                }))
+        os.makedirs(dir + "/npy")
+        with dataset.NpyShardWriter(dir + "/npy", "run") as n:
+            for seed, eng in enumerate(games):
+                features, labels = dataset.encode_game(eng.states, eng.advisor_choices, seed % 2)
+                n.write(features, labels, dataset.encode_actions(eng.advisor_choices))
+
+        for sub in ["json", "npy"]:
+            gen = dataset.policy_training_batches(dir + "/" + sub, len(expected), 10, seed=1)
+            inputs, actions, weights = next(gen)
+            assert inputs.shape == (len(expected), training.STATE_INPUTS)
+            got = sorted((tuple(i), int(a), int(w)) for i, a, w in zip(inputs.tolist(), actions[:, 0], weights))
+            assert got == expected
@@ -1,9 +1,15 @@
+import random
 from typing import Union, List, Dict, Optional, Tuple
 
+import events
 import kingsburg
 import player
 import logger
 
+# The players seated by RandomEngine. "fred" is the player whose decisions
+# TrainingDataEngine records.
+RANDOM_PLAYER_NAMES: List[str] = ["fred", "george", "ron"]
+
 class Engine():
     """
     Provides inputs necessary to advance through game states.
@@ -11,6 +17,7 @@ class Engine():
 
     def __init__(self, logger: logger.Logger):
         self.logger = logger
+        self.events: events.EventSink = logger.eventSink()
 
     def start(self, state: kingsburg.State):
         """
@@ -24,7 +31,7 @@ class Engine():
         """
         self.logger.over(state)
 
-    def log(self, state: kingsburg.State, message: Union[str, List[str], None]=None):
+    def log(self, state: kingsburg.State, message: Union[str, List[events.Event], None]=None):
         """
         Let the engine know when states have changed.
         """
@@ -60,6 +67,11 @@ class PlayerEngine(Engine):
         super().__init__(logger)
         self.players: Dict[str, player.Player] = {}
 
+    def over(self, state: kingsburg.State):
+        super().over(state)
+        for p in self.players.values():
+            p.close()
+
     def pickFreeResource(self, state, name):
         return self.players[name].pickFreeResource(state)
 
@@ -108,24 +120,31 @@ class CliEngine(PlayerEngine):
                 self.players[name] = player.GovAlphaPlayer(name, "models/" + name)
             elif name.startswith("gov_alpha2_"):
                 self.players[name] = player.GovAlpha2Player(name, "models/" + name)
+            elif name.startswith("gov_policy_"):
+                self.players[name] = player.GovPolicyPlayer(name, "models/" + name)
             else:
                 self.players[name] = player.CliPlayer(name)
 
 class RandomEngine(PlayerEngine):
     """
     Play the game with automated random players.
+    If an rng is given, all players draw from it.
     """
 
+    def __init__(self, logger: logger.Logger, rng: Optional[random.Random]=None):
+        super().__init__(logger)
+        self.rng = rng
+
     def setupPlayers(self):
-        names = ["fred", "george", "ron"]
+        names = list(RANDOM_PLAYER_NAMES)
         for name in names:
-            self.players[name] = player.RandomPlayer(name)
+            self.players[name] = player.RandomPlayer(name, self.rng)
         return names
 
 # TODO make a version for Alpha and Alpha2
 class TrainingDataEngine(RandomEngine):
-    def __init__(self, logger: logger.Logger):
-        RandomEngine.__init__(self, logger)
+    def __init__(self, logger: logger.Logger, rng: Optional[random.Random]=None):
+        RandomEngine.__init__(self, logger, rng)
         self.advisor_choices: List[Tuple[kingsburg.AdvisorInfluence, int]] = []
         self.states: List[kingsburg.State] = []
 
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Tuple
+
+##############################################
+# Event types
+##############################################
+
+EventType = str
+
+EVENT_PHASE: EventType = "phase"
+EVENT_FEWEST_BUILDINGS: EventType = "fewest-buildings"
+EVENT_FEWEST_RESOURCES: EventType = "fewest-resources"
+EVENT_KINGS_FAVOR_TIE: EventType = "kings-favor-tie"
+EVENT_TURN_ORDER: EventType = "turn-order"
+EVENT_INFLUENCE_PASS: EventType = "influence-pass"
+EVENT_TAKE_REWARD: EventType = "take-reward"
+EVENT_VICTORY_POINTS: EventType = "victory-points"
+EVENT_SOLDIERS: EventType = "soldiers"
+EVENT_RESOURCE: EventType = "resource"
+EVENT_BUILD_PASS: EventType = "build-pass"
+EVENT_BUILDING: EventType = "building"
+EVENT_STABLE: EventType = "stable"
+EVENT_KINGS_FAVOR_BONUS_DIE: EventType = "kings-favor-bonus-die"
+EVENT_INFLUENCE: EventType = "influence"
+EVENT_SPEND_PLAYER_DICE: EventType = "spend-player-dice"
+EVENT_SPEND_BONUS_DICE: EventType = "spend-bonus-dice"
+EVENT_SPEND_PLUSTWO: EventType = "spend-plustwo"
+EVENT_MARKET: EventType = "market"
+EVENT_PLUSTWOS: EventType = "plustwos"
+EVENT_ROLL: EventType = "roll"
+EVENT_LOSE_KINGS_ENVOY: EventType = "lose-kings-envoy"
+
+def _gains_or_loses(amount: int, what: str) -> str:
+    if amount >= 0:
+        return "gains +" + str(amount) + " " + what
+    return "loses -" + str(amount) + " " + what
+
+def _resource(amount: int, resource: str) -> str:
+    if amount > 0:
+        return "gains +" + str(amount) + " " + resource
+    return "loses " + str(amount) + " " + resource
+
+def _plustwos(amount: int) -> str:
+    if amount < 0:
+        return "loses " + str(amount) + " plustwo tokens"
+    return "gains +" + str(amount) + " plustwo tokens"
+
+def _faces(counts: Tuple[int, ...]) -> List[int]:
+    # Rolls are sent as face counts: counts[0] ones, up to counts[5] sixes.
+    return [face+1 for face in range(0, len(counts)) for i in range(0, counts[face])]
+
+def _advisor(score: int) -> str:
+    # Imported here, as kingsburg imports this module.
+    import kingsburg
+    return kingsburg.ADVISOR[score].name + " (" + str(score) + ")"
+
+def _roll(player_dice: List[int], bonus_dice: List[int]) -> str:
+    message = "rolled player dice: " + ", ".join([str(die) for die in player_dice])
+    if len(bonus_dice) > 0:
+        message += ", bonus dice: " + ", ".join([str(die) for die in bonus_dice])
+    return message
+
+# Formatters for each event type. The first argument of every player
+# event is the player's name.
+FORMATTERS: Dict[EventType, Any] = {
+    EVENT_PHASE: lambda year, phase: "Transitioning to year: " + str(year) + ", phase: " + phase,
+    EVENT_FEWEST_BUILDINGS: lambda name: name + " has the fewest buildings",
+    EVENT_FEWEST_RESOURCES: lambda name: name + " has the fewest resources",
+    EVENT_KINGS_FAVOR_TIE: lambda: "Kings Favor is a tie",
+    EVENT_TURN_ORDER: lambda turn_order: "Turn order: " + str(turn_order),
+    EVENT_INFLUENCE_PASS: lambda name: name + " passes",
+    EVENT_TAKE_REWARD: lambda name, score: name + " takes reward from " + _advisor(score),
+    EVENT_VICTORY_POINTS: lambda name, amount: name + " " + _gains_or_loses(amount, "victory points"),
+    EVENT_SOLDIERS: lambda name, amount: name + " " + _gains_or_loses(amount, "soldiers"),
+    EVENT_RESOURCE: lambda name, amount, resource: name + " " + _resource(amount, resource),
+    EVENT_BUILD_PASS: lambda name: name + " passes",
+    EVENT_BUILDING: lambda name, building: name + " gains building " + building,
+    EVENT_STABLE: lambda name: name + " Stable gives +1 solidier when influencing an advisor giving you at least 1 soldier",
+    EVENT_KINGS_FAVOR_BONUS_DIE: lambda name: name + " gains King's Favor bonus die",
+    EVENT_INFLUENCE: lambda name, score: name + " influences " + _advisor(score),
+    EVENT_SPEND_PLAYER_DICE: lambda name, dice: name + " spends player dice: " + str(dice),
+    EVENT_SPEND_BONUS_DICE: lambda name, dice: name + " spends bonus dice: " + str(dice),
+    EVENT_SPEND_PLUSTWO: lambda name: name + " spends a plustwo",
+    EVENT_MARKET: lambda name, modifier: name + " uses market " + ("+1" if modifier > 0 else "-1"),
+    EVENT_PLUSTWOS: lambda name, amount: name + " " + _plustwos(amount),
+    EVENT_ROLL: lambda name, player_counts, bonus_counts: name + " " + _roll(_faces(player_counts), _faces(bonus_counts)),
+    EVENT_LOSE_KINGS_ENVOY: lambda name: name + " loses King's Envoy",
+}
+
+##############################################
+# Events
+##############################################
+
+class Event():
+    """
+    A structured game event: a type plus the arguments needed to
+    describe it. Events are only turned into text when formatted.
+    """
+
+    def __init__(self, type: EventType, args: Tuple[Any, ...]):
+        self.type: EventType = type
+        self.args: Tuple[Any, ...] = args
+
+    def __eq__(self, other):
+        return isinstance(other, Event) and self.type == other.type and self.args == other.args
+
+    def __repr__(self):
+        return "Event(" + repr(self.type) + ", " + repr(self.args) + ")"
+
+    def __str__(self):
+        return self.format()
+
+    def format(self) -> str:
+        return FORMATTERS[self.type](*self.args)
+
+##############################################
+# Sinks
+##############################################
+
+class EventSink():
+    """
+    Receives events emitted by state transitions.
+    """
+
+    def emit(self, type: EventType, *args):
+        raise NotImplementedError
+
+    def drain(self) -> List[Event]:
+        """
+        Returns and forgets all events received so far.
+        """
+        raise NotImplementedError
+
+class NullEventSink(EventSink):
+    """
+    Throws every event away.
+    """
+
+    def emit(self, type: EventType, *args):
+        pass
+
+    def drain(self) -> List[Event]:
+        return []
+
+class ListEventSink(EventSink):
+    """
+    Records events in the order they were emitted.
+    """
+
+    def __init__(self):
+        self.events: List[Event] = []
+
+    def emit(self, type: EventType, *args):
+        self.events.append(Event(type, args))
+
+    def drain(self) -> List[Event]:
+        events = self.events
+        self.events = []
+        return events
+
+NULL_SINK = NullEventSink()
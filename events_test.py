@@ -0,0 +1,34 @@
+import events
+import kingsburg
+
+def test_list_event_sink():
+    sink = events.ListEventSink()
+    state = kingsburg \
+        .State(sink) \
+        .setPlayers(["fred", "george"]) \
+        .takeFreeResource("fred", kingsburg.RESOURCE_GOLD)
+    got = sink.drain()
+    assert got == [events.Event(events.EVENT_RESOURCE, ("fred", 1, kingsburg.RESOURCE_GOLD))]
+    assert [e.format() for e in got] == ["fred gains +1 gold"]
+    assert sink.drain() == []
+
+def test_with_sink():
+    sink = events.ListEventSink()
+    state = kingsburg.State().setPlayers(["fred", "george"])
+
+    # The default null sink records nothing.
+    state.takeFreeResource("fred", kingsburg.RESOURCE_GOLD)
+    assert sink.drain() == []
+
+    state.withSink(sink).takeFreeResource("george", kingsburg.RESOURCE_WOOD)
+    assert [e.format() for e in sink.drain()] == ["george gains +1 wood"]
+
+def test_format():
+    event = events.Event(events.EVENT_ROLL, ("fred", kingsburg.dice_counts([3, 1, 3]), kingsburg.dice_counts([4])))
+    assert event.format() == "fred rolled player dice: 1, 3, 3, bonus dice: 4"
+
+    event = events.Event(events.EVENT_INFLUENCE, ("fred", 12))
+    assert event.format() == "fred influences duchess (12)"
+
+    event = events.Event(events.EVENT_MARKET, ("fred", -1))
+    assert event.format() == "fred uses market -1"
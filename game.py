@@ -1,6 +1,7 @@
-from typing import Dict, Set, Optional
+from typing import Callable, Dict, List, Optional, Protocol, Set
 
 import engine
+import events
 import kingsburg
 
 # TODO right now a player can influence the same advisor twice with King's Envoy
@@ -10,6 +11,26 @@ import kingsburg
 
 # It is currently able to spend two plustwos in a row
 
+class Decider(Protocol):
+    """
+    Makes the decisions for every player at the table, by name.
+    engine.Engine is one.
+    """
+
+    def pickFreeResource(self, state: kingsburg.State, name: str) -> str: ...
+
+    def rollDice(self, state: kingsburg.State, name: str) -> kingsburg.ProductiveSeasonRoll: ...
+
+    def chooseAdvisor(self, state: kingsburg.State, name: str) -> kingsburg.AdvisorInfluence: ...
+
+    def chooseReward(self, state: kingsburg.State, name: str, advisorScore: kingsburg.AdvisorScore, possible_rewards: List[kingsburg.Reward]) -> Optional[kingsburg.Reward]: ...
+
+    def chooseBuilding(self, state: kingsburg.State, name: str, use_kings_envoy: bool) -> kingsburg.Building: ...
+
+# Called with a state whenever it is worth showing, and optionally a message.
+# Without a message, the events emitted since the last call are logged.
+Log = Callable[..., None]
+
 class Game():
     """
     Plays through a game, using inputs from an Engine.
@@ -20,6 +41,7 @@ class Game():
         # TODO also, self.state does not appear to be type-checked
         self.engine = engine
         self.state = state
+        self.events: events.EventSink = engine.events
 
     def play(self):
         """
@@ -37,7 +59,7 @@ class Game():
         Setup game state for the start of the game.
         Initial turn order is assumed to be the order the players were entered.
         """
-        self.state = self.state.setPlayers(self.engine.setupPlayers())
+        self.state = self.state.withSink(self.events).setPlayers(self.engine.setupPlayers())
         self.engine.start(self.state)
 
     def tick(self) -> bool:
@@ -45,111 +67,142 @@ class Game():
         Advance to the next step of the game.
         Returns True if the game is over.
         """
-        if self.state.last_phase_played == self.state.phase:
-            self.state = self.state.nextPhase()
-            if self.state.over:
-                return True
-            self.engine.log(self.state, self.state.clearMessages())
-            return False
-
-        phase = kingsburg.PHASES[self.state.phase]
-        if phase == kingsburg.PHASE_KINGS_FAVOR:
-            self.kingsFavor()
-        elif phase in kingsburg.PRODUCTIVE_SEASONS:
-            self.productiveSeason(phase)
-        elif phase == kingsburg.PHASE_KINGS_REWARD:
-            # TODO
-            self.state = self.state.phaseComplete(kingsburg.PHASE_KINGS_REWARD)
-        elif phase == kingsburg.PHASE_KINGS_ENVOY:
-            # TODO
-            self.state = self.state.phaseComplete(kingsburg.PHASE_KINGS_ENVOY)
-        elif phase == kingsburg.PHASE_RECRUIT_SOLDIERS:
-            # TODO
-            self.state = self.state.phaseComplete(kingsburg.PHASE_RECRUIT_SOLDIERS)
-        elif phase == kingsburg.PHASE_WINTER:
-            # TODO
-            self.state = self.state.phaseComplete(kingsburg.PHASE_WINTER)
-
-        return False
+        self.state = advance(self.state, self.engine, self.log)
+        return self.state.over
 
     def kingsFavor(self):
         """
         Plays the King's Favor phase.
         """
-        result = self.state.kingsFavor()
-        if result == kingsburg.KINGS_FAVOR_TIE:
-            messages = self.state.clearMessages()
-            messages.append("Kings Favor is a tie")
-            self.engine.log(self.state, messages)
-            for player in self.state.players:
-                resource = self.engine.pickFreeResource(self.state, player)
-                self.state = self.state.takeFreeResource(player, resource)
-        else:
-            self.state = result
-        self.state = self.state.phaseComplete(kingsburg.PHASE_KINGS_FAVOR)
+        self.state = playKingsFavor(self.state, self.engine, self.log)
 
     def productiveSeason(self, phase: kingsburg.Phase):
         """
         Productive season.
         """
+        self.state = playProductiveSeason(self.state, phase, self.engine, self.log)
+
+    def log(self, state: kingsburg.State, message: Optional[str]=None):
+        self.engine.log(state, self.events.drain() if message is None else message)
+
+def advance(state: kingsburg.State, decider: Decider, log: Optional[Log]=None) -> kingsburg.State:
+    """
+    Plays the next step of the game and returns the resulting state,
+    which is over once the game has ended.
+
+    This is where the rules live: Game calls it with its engine, and
+    simulation calls it directly with the players. Without a log nothing
+    is logged.
+    """
+    if state.last_phase_played == state.phase:
+        state = state.nextPhase()
+        if not state.over and log is not None:
+            log(state)
+        return state
+
+    phase = kingsburg.PHASES[state.phase]
+    if phase == kingsburg.PHASE_KINGS_FAVOR:
+        state = playKingsFavor(state, decider, log)
+    elif phase in kingsburg.PRODUCTIVE_SEASONS:
+        state = playProductiveSeason(state, phase, decider, log)
+    elif phase == kingsburg.PHASE_KINGS_REWARD:
+        # TODO
+        state = state.phaseComplete(kingsburg.PHASE_KINGS_REWARD)
+    elif phase == kingsburg.PHASE_KINGS_ENVOY:
+        # TODO
+        state = state.phaseComplete(kingsburg.PHASE_KINGS_ENVOY)
+    elif phase == kingsburg.PHASE_RECRUIT_SOLDIERS:
+        # TODO
+        state = state.phaseComplete(kingsburg.PHASE_RECRUIT_SOLDIERS)
+    elif phase == kingsburg.PHASE_WINTER:
+        # TODO
+        state = state.phaseComplete(kingsburg.PHASE_WINTER)
+
+    return state
+
+def playKingsFavor(state: kingsburg.State, decider: Decider, log: Optional[Log]=None) -> kingsburg.State:
+    """
+    Plays the King's Favor phase. On a tie every player picks a free resource.
+    """
+    result = state.kingsFavor()
+    if not isinstance(result, kingsburg.State):
+        # kingsburg.KINGS_FAVOR_TIE
+        state.sink.emit(events.EVENT_KINGS_FAVOR_TIE)
+        if log is not None:
+            log(state)
+        for player in state.players:
+            resource = decider.pickFreeResource(state, player)
+            state = state.takeFreeResource(player, resource)
+    else:
+        state = result
+    return state.phaseComplete(kingsburg.PHASE_KINGS_FAVOR)
+
+def playProductiveSeason(state: kingsburg.State, phase: kingsburg.Phase, decider: Decider, log: Optional[Log]=None) -> kingsburg.State:
+    """
+    Plays a productive season.
+    """
 
-        # TODO Merchant's guild rewards gold
-        # TODO 2-player rule: block advisors
-
-        # Each player rolls dice and turn order is set.
-        rolls: Dict[str, kingsburg.ProductiveSeasonRoll] = {}
-        for name in self.state.players:
-            rolls[name] = self.engine.rollDice(self.state, name)
-        self.state = self.state.productiveSeasonRolls(rolls)
-        self.engine.log(self.state, self.state.clearMessages())
-
-        # TODO Statue & Chapel allow re-rolls
-
-        # Players take turns influencing advisors until each player passes.
-        passes: Set[str] = set()
-        while len(passes) < len(self.state.turn_order):
-            for name in self.state.turn_order:
-                if name in passes:
-                    continue
-                influence = self.engine.chooseAdvisor(self.state, name)
-                if influence == kingsburg.ADVISOR_INFLUENCE_PASS:
-                    passes.add(name)
-                self.state = self.state.influenceAdvisor(name, influence)
-            self.engine.log(self.state, self.state.clearMessages())
-
-        # Players take their rewards in order of advisor score.
-        for advisorScore in kingsburg.ADVISORS:
-            if advisorScore in self.state.taken_advisors:
-                for name in self.state.taken_advisors[advisorScore]:
-                    # TODO refactor possible_rewards into engine/player
-                    # In fact make engine list the possible stuff for every move
-                    # That way it can be fed into both CliPlayer and RandomPlayer
-                    possible_rewards = kingsburg.ADVISOR[advisorScore].choices__rewards(self.state.players[name].resources)
-                    reward: Optional[kingsburg.Reward] = None
-                    if len(possible_rewards) == 1:
-                        reward = possible_rewards[0]
-                    else:
-                        self.engine.log(self.state, self.state.clearMessages())
-                        reward = self.engine.chooseReward(self.state, name, advisorScore, possible_rewards)
-                    if reward is not None:
-                        # TODO view enemies
-                        self.state = self.state.giveReward(name, advisorScore, reward)
-        self.engine.log(self.state, self.state.clearMessages())
-
-        # In turn order, players construct buildings.
-        for name in self.state.turn_order:
-            building = self.engine.chooseBuilding(self.state, name, use_kings_envoy=False)
-            self.state = self.state.giveBuilding(name, building, use_kings_envoy=False)
-            if building != kingsburg.BUILD_PASS and self.state.players[name].has_kings_envoy:
-                building = self.engine.chooseBuilding(self.state, name, use_kings_envoy=True)
-                self.state = self.state.giveBuilding(name, building, use_kings_envoy=True)
-        self.engine.log(self.state, self.state.clearMessages())
-
-        self.engine.log(self.state, "Productive season done")
-        self.state = self.state.clearAdvisorInfluences()
-
-        # TODO at end of summer, Inn rewards token thingie
-        # TODO Town hall allows trading token for VP
-        # TODO Embassy grants VP
-
-        self.state = self.state.phaseComplete(phase)
+    # TODO Merchant's guild rewards gold
+    # TODO 2-player rule: block advisors
+
+    # Each player rolls dice and turn order is set.
+    rolls: Dict[str, kingsburg.ProductiveSeasonRoll] = {}
+    for name in state.players:
+        rolls[name] = decider.rollDice(state, name)
+    state = state.productiveSeasonRolls(rolls)
+    if log is not None:
+        log(state)
+
+    # TODO Statue & Chapel allow re-rolls
+
+    # Players take turns influencing advisors until each player passes.
+    passes: Set[str] = set()
+    while len(passes) < len(state.turn_order):
+        for name in state.turn_order:
+            if name in passes:
+                continue
+            influence = decider.chooseAdvisor(state, name)
+            if influence == kingsburg.ADVISOR_INFLUENCE_PASS:
+                passes.add(name)
+            state = state.influenceAdvisor(name, influence)
+        if log is not None:
+            log(state)
+
+    # Players take their rewards in order of advisor score.
+    for advisorScore in kingsburg.ADVISORS:
+        if advisorScore in state.taken_advisors:
+            for name in state.taken_advisors[advisorScore]:
+                # TODO refactor possible_rewards into engine/player
+                # In fact make engine list the possible stuff for every move
+                # That way it can be fed into both CliPlayer and RandomPlayer
+                possible_rewards = kingsburg.ADVISOR[advisorScore].choices__rewards(state.players[name].resources)
+                reward: Optional[kingsburg.Reward] = None
+                if len(possible_rewards) == 1:
+                    reward = possible_rewards[0]
+                else:
+                    if log is not None:
+                        log(state)
+                    reward = decider.chooseReward(state, name, advisorScore, possible_rewards)
+                if reward is not None:
+                    # TODO view enemies
+                    state = state.giveReward(name, advisorScore, reward)
+    if log is not None:
+        log(state)
+
+    # In turn order, players construct buildings.
+    for name in state.turn_order:
+        building = decider.chooseBuilding(state, name, use_kings_envoy=False)
+        state = state.giveBuilding(name, building, use_kings_envoy=False)
+        if building != kingsburg.BUILD_PASS and state.players[name].has_kings_envoy:
+            building = decider.chooseBuilding(state, name, use_kings_envoy=True)
+            state = state.giveBuilding(name, building, use_kings_envoy=True)
+    if log is not None:
+        log(state)
+        log(state, "Productive season done")
+    state = state.clearAdvisorInfluences()
+
+    # TODO at end of summer, Inn rewards token thingie
+    # TODO Town hall allows trading token for VP
+    # TODO Embassy grants VP
+
+    return state.phaseComplete(phase)
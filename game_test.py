@@ -2,6 +2,7 @@ import kingsburg
 import engine
 import logger
 import game
+import player
 
 def test_random_game():
     l = logger.SilentLogger()
@@ -18,3 +19,21 @@ def test_random_game():
     assert g.state.year == kingsburg.MAX_YEAR
     assert g.state.phase == kingsburg.MAX_PHASE
     assert g.state.over
+
+def test_game_over_closes_players():
+    closed = []
+
+    class ClosingPlayer(player.RandomPlayer):
+        def close(self):
+            closed.append(self.name)
+
+    class ClosingEngine(engine.RandomEngine):
+        def setupPlayers(self):
+            names = super().setupPlayers()
+            for name in names:
+                self.players[name] = ClosingPlayer(name)
+            return names
+
+    g = game.Game(ClosingEngine(logger.SilentLogger()), kingsburg.State())
+    g.play()
+    assert sorted(closed) == sorted(engine.RANDOM_PLAYER_NAMES)
@@ -0,0 +1,263 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy
+
+ACTIVATION_RELU = "relu"
+ACTIVATION_LINEAR = "linear"
+ACTIVATION_SOFTMAX = "softmax"
+
+ACTIVATIONS = [ACTIVATION_RELU, ACTIVATION_LINEAR, ACTIVATION_SOFTMAX]
+
+NPZ_SUFFIX = ".npz"
+
+Layer = Tuple[numpy.ndarray, numpy.ndarray, str]
+
+class NumpyModel():
+    """
+    A stack of dense layers evaluated with numpy, standing in for a Keras
+    Sequential model of Dense layers. predict takes and returns the same
+    shapes as the Keras model's predict.
+    """
+
+    def __init__(self, layers: List[Layer]):
+        for weights, bias, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError("Unsupported activation: " + str(activation))
+        self.layers = [(weights.astype(numpy.float32), bias.astype(numpy.float32), activation) for weights, bias, activation in layers]
+
+    def predict(self, inputs: Any) -> numpy.ndarray:
+        x = numpy.asarray(inputs, dtype=numpy.float32)
+        for weights, bias, activation in self.layers:
+            x = x @ weights
+            x += bias
+            if activation == ACTIVATION_RELU:
+                numpy.maximum(x, 0, out=x)
+            elif activation == ACTIVATION_SOFTMAX:
+                x -= x.max(axis=-1, keepdims=True)
+                numpy.exp(x, out=x)
+                x /= x.sum(axis=-1, keepdims=True)
+        return x
+
+    def save(self, filename: str):
+        arrays: Dict[str, Any] = {"layers": numpy.array(len(self.layers))}
+        for i, (weights, bias, activation) in enumerate(self.layers):
+            arrays["weights" + str(i)] = weights
+            arrays["bias" + str(i)] = bias
+            arrays["activation" + str(i)] = numpy.array(activation)
+        numpy.savez(filename, **arrays)
+
+    @staticmethod
+    def load(filename: str) -> "NumpyModel":
+        with numpy.load(filename) as f:
+            layers = []
+            for i in range(0, int(f["layers"])):
+                layers.append((f["weights" + str(i)], f["bias" + str(i)], str(f["activation" + str(i)])))
+        return NumpyModel(layers)
+
+    @staticmethod
+    def fromKeras(model) -> "NumpyModel":
+        """
+        Copies the weights out of a Keras Sequential model of Dense layers.
+        """
+        layers = []
+        for layer in model.layers:
+            config = layer.get_config()
+            if not config.get("use_bias", True):
+                raise ValueError("Layers without a bias are not supported: " + config["name"])
+            weights, bias = layer.get_weights()
+            layers.append((weights, bias, config["activation"]))
+        return NumpyModel(layers)
+
+def load_model(filename: str):
+    """
+    Loads a model for predicting. An exported .npz file is used if filename
+    ends in .npz, or if filename + ".npz" exists. Otherwise the model is
+    loaded through Keras, which is only imported then.
+    """
+    if filename.endswith(NPZ_SUFFIX):
+        return NumpyModel.load(filename)
+    if os.path.isfile(filename + NPZ_SUFFIX):
+        return NumpyModel.load(filename + NPZ_SUFFIX)
+    import keras
+    return keras.models.load_model(filename)
+
+class ModelRegistry():
+    """
+    A process-wide cache of loaded models keyed by absolute path, so every
+    player using the same model shares one copy of its weights.
+
+    acquire loads a model on first use and counts its users; release
+    uncounts them. Models stay loaded until evicted, which only drops
+    models nobody holds. Call preload before forking worker processes so
+    the workers share the loaded weights copy-on-write instead of each
+    loading their own.
+    """
+
+    def __init__(self, loader: Callable[[str], Any]=load_model):
+        self.loader = loader
+        self.models: Dict[str, Any] = {}
+        self.refcounts: Dict[str, int] = {}
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, filename: str) -> Any:
+        key = os.path.abspath(filename)
+        with self._lock:
+            if key not in self.models:
+                self.models[key] = self.loader(filename)
+                self.refcounts[key] = 0
+                self.loads += 1
+            self.refcounts[key] += 1
+            return self.models[key]
+
+    def release(self, filename: str):
+        key = os.path.abspath(filename)
+        with self._lock:
+            if self.refcounts.get(key, 0) == 0:
+                raise Exception("Releasing a model that was not acquired: " + filename)
+            self.refcounts[key] -= 1
+
+    def preload(self, filenames: Iterable[str]):
+        """
+        Loads models without acquiring them.
+        """
+        for filename in filenames:
+            self.acquire(filename)
+            self.release(filename)
+
+    def evict(self, filename: Optional[str]=None) -> int:
+        """
+        Drops the given model, or every model, that is no longer acquired.
+        Returns how many models were dropped.
+        """
+        with self._lock:
+            if filename is None:
+                keys = list(self.models)
+            else:
+                keys = [os.path.abspath(filename)]
+            evicted = 0
+            for key in keys:
+                if key in self.models and self.refcounts[key] == 0:
+                    del self.models[key]
+                    del self.refcounts[key]
+                    evicted += 1
+            return evicted
+
+REGISTRY = ModelRegistry()
+
+class _Request():
+    __slots__ = ("inputs", "outputs", "error", "done")
+
+    def __init__(self, inputs: numpy.ndarray):
+        self.inputs = inputs
+        self.outputs: Optional[numpy.ndarray] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+class BatchingPredictor():
+    """
+    Coalesces predict calls from many threads into large batches for one
+    model. It is a drop-in replacement for the model: predict blocks until
+    the rows submitted have been scored as part of a batch.
+
+    A batch is sent to the model once it holds max_batch rows, or
+    max_latency seconds after its first request arrived, whichever is
+    first. Games played concurrently in threads can share one predictor,
+    so their players' small predict calls cost one model call per batch.
+    """
+
+    def __init__(self, model: Any, max_batch: int=4096, max_latency: float=0.002):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.batches = 0
+        self.rows = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        # Guards _closed, so no request is queued after the stop sentinel.
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def predict(self, inputs: Any) -> numpy.ndarray:
+        request = _Request(numpy.asarray(inputs))
+        with self._lock:
+            if self._closed:
+                raise Exception("Predicting with a closed BatchingPredictor")
+            self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        assert request.outputs is not None
+        return request.outputs
+
+    def close(self):
+        """
+        Scores any requests already submitted and stops the batching thread.
+        Requests it could not score are failed rather than left waiting.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = Exception("BatchingPredictor closed before scoring the request")
+                request.done.set()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            requests = [first]
+            rows = len(first.inputs)
+            deadline = time.perf_counter() + self.max_latency
+            stopping = False
+            while rows < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                requests.append(request)
+                rows += len(request.inputs)
+            self._score(requests)
+            if stopping:
+                return
+
+    def _score(self, requests: List[_Request]):
+        try:
+            outputs = self.model.predict(numpy.concatenate([r.inputs for r in requests]))
+            self.batches += 1
+            self.rows += len(outputs)
+            offset = 0
+            for r in requests:
+                r.outputs = outputs[offset:offset+len(r.inputs)]
+                offset += len(r.inputs)
+        except Exception as e:
+            for r in requests:
+                r.error = e
+        for r in requests:
+            r.done.set()
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+
+import numpy
+import pytest
+
+import inference
+
+def random_layers(sizes):
+    rng = numpy.random.RandomState(0)
+    layers = []
+    for i in range(0, len(sizes)-1):
+        activation = inference.ACTIVATION_RELU if i < len(sizes)-2 else inference.ACTIVATION_LINEAR
+        layers.append((rng.randn(sizes[i], sizes[i+1]), rng.randn(sizes[i+1]), activation))
+    return layers
+
+def test_predict():
+    layers = random_layers([5, 4, 3, 2])
+    model = inference.NumpyModel(layers)
+    inputs = (numpy.random.RandomState(1).rand(7, 5) > 0.5).astype(numpy.int8)
+
+    expected = inputs.astype(numpy.float64)
+    for weights, bias, activation in layers:
+        expected = expected @ weights + bias
+        if activation == inference.ACTIVATION_RELU:
+            expected = numpy.maximum(expected, 0)
+
+    got = model.predict(inputs)
+    assert got.shape == (7, 2)
+    assert numpy.allclose(got, expected, atol=1e-4)
+
+def test_softmax():
+    weights, bias, _ = random_layers([5, 3])[0]
+    model = inference.NumpyModel([(weights, bias, inference.ACTIVATION_SOFTMAX)])
+    inputs = numpy.eye(5)
+    logits = inputs @ weights + bias
+    expected = numpy.exp(logits) / numpy.exp(logits).sum(axis=1, keepdims=True)
+    assert numpy.allclose(model.predict(inputs), expected, atol=1e-5)
+
+def test_unsupported_activation():
+    with pytest.raises(ValueError):
+        inference.NumpyModel([(numpy.zeros((2, 2)), numpy.zeros(2), "tanh")])
+
+def test_save_load():
+    model = inference.NumpyModel(random_layers([5, 4, 2]))
+    inputs = numpy.eye(5)
+    with tempfile.TemporaryDirectory() as dir:
+        model.save(dir + "/model.npz")
+        loaded = inference.load_model(dir + "/model.npz")
+        assert numpy.array_equal(loaded.predict(inputs), model.predict(inputs))
+
+        # A model exported next to the Keras file is preferred over it.
+        model.save(dir + "/gov_alpha_fred.npz")
+        loaded = inference.load_model(dir + "/gov_alpha_fred")
+        assert numpy.array_equal(loaded.predict(inputs), model.predict(inputs))
+
+def test_matches_keras():
+    keras = pytest.importorskip("keras.models")
+    layers = pytest.importorskip("keras.layers")
+    model = keras.Sequential()
+    model.add(layers.Dense(8, input_dim=5, activation="relu"))
+    model.add(layers.Dense(2, activation="linear"))
+    inputs = (numpy.random.RandomState(1).rand(10, 5) > 0.5).astype(numpy.float32)
+    exported = inference.NumpyModel.fromKeras(model)
+    assert numpy.allclose(exported.predict(inputs), model.predict(inputs), atol=1e-5)
+
+def test_registry():
+    loaded = []
+    def loader(filename):
+        loaded.append(filename)
+        return object()
+
+    registry = inference.ModelRegistry(loader)
+    a = registry.acquire("models/gov_alpha2_fred")
+    b = registry.acquire(os.path.abspath("models/gov_alpha2_fred"))
+    assert a is b
+    assert loaded == ["models/gov_alpha2_fred"]
+    assert registry.refcounts[os.path.abspath("models/gov_alpha2_fred")] == 2
+
+    # Models in use are never evicted.
+    registry.release("models/gov_alpha2_fred")
+    assert registry.evict() == 0
+    registry.release("models/gov_alpha2_fred")
+    assert registry.evict("models/gov_alpha2_fred") == 1
+    assert registry.models == {}
+    with pytest.raises(Exception):
+        registry.release("models/gov_alpha2_fred")
+
+    registry.preload(["models/a", "models/b"])
+    assert registry.loads == 3
+    registry.acquire("models/a")
+    assert registry.loads == 3
+    assert registry.evict() == 1
+
+def test_registry_preload_before_fork():
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("fork is not available")
+
+    registry = inference.ModelRegistry(lambda filename: inference.NumpyModel(random_layers([3, 2])))
+    registry.preload(["models/shared"])
+
+    def child(queue):
+        registry.acquire("models/shared")
+        queue.put(registry.loads)
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    p = ctx.Process(target=child, args=(queue,))
+    p.start()
+    assert queue.get(timeout=10) == 1
+    p.join()
+
+def test_batching_predictor():
+    model = inference.NumpyModel(random_layers([5, 4, 2]))
+    rng = numpy.random.RandomState(2)
+    inputs = [(rng.rand(rng.randint(1, 20), 5) > 0.5).astype(numpy.int8) for i in range(0, 40)]
+    results = [None] * len(inputs)
+
+    with inference.BatchingPredictor(model, max_batch=64, max_latency=0.05) as predictor:
+        def worker(i):
+            results[i] = predictor.predict(inputs[i])
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(0, len(inputs))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    for i in range(0, len(inputs)):
+        assert numpy.allclose(results[i], model.predict(inputs[i]))
+    assert predictor.rows == sum(len(i) for i in inputs)
+    # Concurrent requests were coalesced rather than scored one by one.
+    assert predictor.batches < len(inputs)
+
+    with pytest.raises(Exception):
+        predictor.predict(inputs[0])
+
+def test_batching_predictor_error():
+    model = inference.NumpyModel(random_layers([5, 2]))
+    with inference.BatchingPredictor(model) as predictor:
+        with pytest.raises(ValueError):
+            predictor.predict(numpy.zeros((1, 3)))
+        assert predictor.predict(numpy.zeros((1, 5))).shape == (1, 2)
+
+def test_batching_predictor_close_race():
+    model = inference.NumpyModel(random_layers([5, 2]))
+    predictor = inference.BatchingPredictor(model, max_latency=0.01)
+    outcomes = []
+
+    def worker():
+        for i in range(0, 50):
+            try:
+                predictor.predict(numpy.zeros((1, 5)))
+                outcomes.append("scored")
+            except Exception:
+                outcomes.append("closed")
+                return
+
+    threads = [threading.Thread(target=worker) for i in range(0, 8)]
+    for t in threads:
+        t.start()
+    predictor.close()
+    # Every caller returns, either scored or told the predictor is closed.
+    for t in threads:
+        t.join(timeout=10)
+        assert not t.is_alive()
+    assert outcomes.count("closed") <= len(threads)
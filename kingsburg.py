@@ -1,7 +1,9 @@
 from __future__ import annotations
-import copy
-from typing import Dict, Union, List, Optional
+import functools
+import hashlib
+from typing import Any, Dict, Union, List, Optional, Tuple
 
+import events
 import util
 
 ##############################################
@@ -22,6 +24,8 @@ class Reward():
     Represents a reward or a penalty that can be given to a player.
     """
 
+    __slots__ = ("victory_points", "resources", "soldiers", "plustwos", "receive_any_resource", "view_enemy")
+
     def __init__(
             self,
             victory_points: int=0,
@@ -39,14 +43,58 @@ class Reward():
         self.view_enemy: bool = view_enemy
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, Reward):
+            return NotImplemented
+        return self.victory_points == other.victory_points \
+            and self.resources == other.resources \
+            and self.soldiers == other.soldiers \
+            and self.plustwos == other.plustwos \
+            and self.receive_any_resource == other.receive_any_resource \
+            and self.view_enemy == other.view_enemy
+
+    def __hash__(self):
+        return hash((
+            self.victory_points,
+            frozenset(self.resources.items()),
+            self.soldiers,
+            self.plustwos,
+            self.receive_any_resource,
+            self.view_enemy,
+        ))
+
+    def toDict(self):
+        return {
+            "victory_points": self.victory_points,
+            "resources": dict(self.resources),
+            "soldiers": self.soldiers,
+            "plustwos": self.plustwos,
+            "receive_any_resource": self.receive_any_resource,
+            "view_enemy": self.view_enemy,
+        }
 
     @staticmethod
     def fromDict(d) -> Optional[Reward]:
         if d is None:
             return None
-        # TODO
-        return None
+        return Reward(
+            victory_points=d["victory_points"],
+            resources=dict(d["resources"]),
+            soldiers=d["soldiers"],
+            plustwos=d["plustwos"],
+            receive_any_resource=d["receive_any_resource"],
+            view_enemy=d["view_enemy"],
+        )
+
+def resource_mask(resources: ResourceInventory) -> int:
+    """
+    Returns a mask with bit i set if there is at least one of RESOURCES[i]
+    in the given inventory.
+    """
+    mask = 0
+    for i, resource in enumerate(RESOURCES):
+        if resource in resources and resources[resource] > 0:
+            mask |= 1 << i
+    return mask
 
 # A lookup of the possible resource inventories you can get based on
 # a reward of "receive_any_resource" of the given amount.
@@ -117,6 +165,37 @@ PROVINCE_SHEET: List[List[Building]] = [
 
 BUILD_PASS: Building = "pass"
 
+# Every building in province sheet order. A player's buildings are stored
+# as a bitmask where bit i is set if they own BUILDINGS[i].
+BUILDINGS: List[Building] = [building for row in PROVINCE_SHEET for building in row]
+
+BUILDING_BIT: Dict[Building, int] = {building: 1 << i for i, building in enumerate(BUILDINGS)}
+
+BUILDING_ROW_SIZE = len(PROVINCE_SHEET[0])
+BUILDING_ROW_MASK = (1 << BUILDING_ROW_SIZE) - 1
+
+# For each way of owning the buildings of a single row, the bit of the
+# first building in that row which is not yet owned (0 if the row is full).
+# Only that building can be bought next from the row.
+BUILDING_ROW_FRONTIER: List[int] = [
+    next((1 << i for i in range(BUILDING_ROW_SIZE) if not owned & (1 << i)), 0)
+    for owned in range(BUILDING_ROW_MASK + 1)
+]
+
+def building_frontier(building_mask: int) -> int:
+    """
+    Returns the mask of buildings that are next in line to be bought
+    on each row of the province sheet.
+    """
+    frontier = 0
+    for row in range(len(PROVINCE_SHEET)):
+        shift = row * BUILDING_ROW_SIZE
+        frontier |= BUILDING_ROW_FRONTIER[(building_mask >> shift) & BUILDING_ROW_MASK] << shift
+    return frontier
+
+def building_count(building_mask: int) -> int:
+    return bin(building_mask).count("1")
+
 BUILDING_VP: Dict[Building, int] = {
     BUILDING_STATUE: 3,
     BUILDING_CHAPEL: 5,
@@ -163,6 +242,37 @@ BUILDING_COST: Dict[Building, ResourceInventory] = {
     BUILDING_EMBASSY: {RESOURCE_GOLD: -2, RESOURCE_WOOD: -2, RESOURCE_STONE: -2},
 }
 
+# Past these amounts, having more of a resource cannot make any more
+# buildings affordable.
+BUILDING_MAX_COST: Dict[Resource, int] = {
+    resource: max(-BUILDING_COST[building].get(resource, 0) for building in BUILDINGS)
+    for resource in RESOURCES
+}
+
+# The mask of buildings that can be afforded, keyed by (gold, wood, stone)
+# with each amount capped at BUILDING_MAX_COST.
+BUILDING_AFFORDABLE: Dict[Tuple[int, int, int], int] = {
+    (gold, wood, stone): sum(
+        BUILDING_BIT[building] for building in BUILDINGS
+        if gold + BUILDING_COST[building].get(RESOURCE_GOLD, 0) >= 0
+        and wood + BUILDING_COST[building].get(RESOURCE_WOOD, 0) >= 0
+        and stone + BUILDING_COST[building].get(RESOURCE_STONE, 0) >= 0
+    )
+    for gold in range(BUILDING_MAX_COST[RESOURCE_GOLD] + 1)
+    for wood in range(BUILDING_MAX_COST[RESOURCE_WOOD] + 1)
+    for stone in range(BUILDING_MAX_COST[RESOURCE_STONE] + 1)
+}
+
+def buildings_affordable(resources: ResourceInventory) -> int:
+    """
+    Returns the mask of buildings that can be bought with the given resources.
+    """
+    return BUILDING_AFFORDABLE[(
+        max(0, min(resources[RESOURCE_GOLD], BUILDING_MAX_COST[RESOURCE_GOLD])),
+        max(0, min(resources[RESOURCE_WOOD], BUILDING_MAX_COST[RESOURCE_WOOD])),
+        max(0, min(resources[RESOURCE_STONE], BUILDING_MAX_COST[RESOURCE_STONE])),
+    )]
+
 ##############################################
 # Phases
 ##############################################
@@ -227,6 +337,24 @@ ADVISORS: List[AdvisorScore] = [
 
 ADVISOR_MAX = len(ADVISORS)
 
+# Sets of advisors are stored as bitmasks where bit (score - 1) is set
+# if the advisor with that score is in the set.
+ADVISOR_BIT: Dict[AdvisorScore, int] = {score: 1 << (score - 1) for score in ADVISORS}
+
+ADVISORS_MASK = (1 << ADVISOR_MAX) - 1
+
+def advisor_mask(scores: Union[List[AdvisorScore], int]) -> int:
+    """
+    Returns the bitmask for the given advisor scores.
+    Masks are passed through unchanged.
+    """
+    if isinstance(scores, int):
+        return scores
+    mask = 0
+    for score in scores:
+        mask |= ADVISOR_BIT[score]
+    return mask
+
 class Advisor():
     """
     Represents an advisor which has a name and a set
@@ -236,28 +364,50 @@ class Advisor():
         self.name: str = name
         self.rewards: List[Reward] = rewards
 
+        # Every reward this advisor can give, with "receive any resource"
+        # rewards expanded into each concrete choice, keyed by the mask of
+        # resources the player holds (see resource_mask). The rewards are
+        # shared and must not be modified.
+        expanded = [(self._tradeMask(reward), r) for reward in rewards for r in self._expand(reward)]
+        self.reward_choices: Dict[int, List[Reward]] = {
+            held: [r for needed, r in expanded if needed & held == needed]
+            for held in range(1 << len(RESOURCES))
+        }
+
+    def _tradeMask(self, reward: Reward) -> int:
+        """
+        Returns the mask of resources the player has to give up to take
+        the reward. Rewards only ever trade away one of a resource, so
+        holding one is enough.
+        """
+        mask = 0
+        for i, resource in enumerate(RESOURCES):
+            amount = reward.resources.get(resource, 0)
+            if amount < -1:
+                raise Exception("Advisor rewards may only trade away one of each resource")
+            if amount < 0:
+                mask |= 1 << i
+        return mask
+
+    def _expand(self, reward: Reward) -> List[Reward]:
+        # If you can receive any resource, then instead of adding this
+        # reward directly to the list we'll generate all possible resource rewards.
+        if reward.receive_any_resource == 0:
+            return [reward]
+        return [
+            Reward(
+                victory_points=reward.victory_points,
+                resources=dict(resource_reward),
+                soldiers=reward.soldiers,
+                plustwos=reward.plustwos,
+                view_enemy=reward.view_enemy,
+            )
+            for resource_reward in RECEIVE_ANY_RESOURCE[reward.receive_any_resource]
+        ]
+
     def choices__rewards(self, player_resources: ResourceInventory) -> List[Reward]:
-        possible_rewards = []
-        for reward in self.rewards:
-            skip_reward = False
-            # Can't trade a resource if you don't have it
-            for resource in RESOURCES:
-                player_amount = player_resources[resource] if resource in player_resources else 0
-                if resource in reward.resources and (reward.resources[resource] + player_amount < 0):
-                    skip_reward = True
-                    continue
-            # If you can receive any resource, then instead of adding this
-            # reward directly to the list we'll generate all possible resource rewards.
-            if reward.receive_any_resource > 0:
-                for resource_reward in RECEIVE_ANY_RESOURCE[reward.receive_any_resource]:
-                    rew = copy.deepcopy(reward)
-                    rew.receive_any_resource = 0
-                    rew.resources = resource_reward
-                    possible_rewards.append(rew)
-                continue
-            if not skip_reward:
-                possible_rewards.append(reward)
-        return possible_rewards
+        # Can't trade a resource if you don't have it
+        return list(self.reward_choices[resource_mask(player_resources)])
 
 ADVISOR = {
     ADVISOR_JESTER: Advisor("jester", [Reward(victory_points=1)]),
@@ -287,32 +437,112 @@ ADVISOR = {
 
 ADVISORS_STABLE = [score for score in ADVISORS if ADVISOR[score].rewards[0].soldiers > 0]
 
+ADVISORS_STABLE_MASK = advisor_mask(ADVISORS_STABLE)
+
 ##############################################
 # Die
 ##############################################
 
 DiceRoll = List[int]
 
+DIE_FACES = 6
+
+# A multiset of dice stored as the number of dice showing each face:
+# counts[0] is the number of ones, counts[5] the number of sixes.
+DiceCounts = Tuple[int, ...]
+
+NO_DICE: DiceCounts = (0,) * DIE_FACES
+
+def dice_counts(dice: DiceRoll) -> DiceCounts:
+    """
+    Returns the face counts of the given dice.
+    """
+    counts = [0] * DIE_FACES
+    for die in dice:
+        if die < 1 or die > DIE_FACES:
+            raise ValueError("Invalid die: " + str(die))
+        counts[die - 1] += 1
+    return tuple(counts)
+
+def dice_from_counts(counts: DiceCounts) -> DiceRoll:
+    """
+    Returns the dice with the given face counts, lowest first.
+    """
+    dice: DiceRoll = []
+    for face in range(DIE_FACES):
+        dice.extend([face + 1] * counts[face])
+    return dice
+
+def dice_minus(counts: DiceCounts, dice: DiceRoll) -> DiceCounts:
+    """
+    Removes the given dice from the face counts. Like util.list_minus,
+    dice that are not in the counts are ignored.
+    """
+    remaining = list(counts)
+    for die in dice:
+        if remaining[die - 1] > 0:
+            remaining[die - 1] -= 1
+    return tuple(remaining)
+
 class ProductiveSeasonRoll():
     """
     Represents a productive season dice roll.
     For each productive season, players roll three dice.
     They may also have bonus dice to roll.
+
+    Dice are stored as face counts, so rolls are immutable and the
+    order dice were entered in does not matter.
     """
 
+    __slots__ = ("player_counts", "bonus_counts")
+
     def __init__(self, player_dice: DiceRoll, bonus_dice: DiceRoll):
-        self.player_dice: DiceRoll = player_dice
-        self.bonus_dice: DiceRoll = bonus_dice
+        self.player_counts: DiceCounts = dice_counts(player_dice)
+        self.bonus_counts: DiceCounts = dice_counts(bonus_dice)
+
+    @staticmethod
+    def fromCounts(player_counts: DiceCounts, bonus_counts: DiceCounts) -> ProductiveSeasonRoll:
+        roll = ProductiveSeasonRoll.__new__(ProductiveSeasonRoll)
+        roll.player_counts = player_counts
+        roll.bonus_counts = bonus_counts
+        return roll
+
+    @property
+    def player_dice(self) -> DiceRoll:
+        return dice_from_counts(self.player_counts)
+
+    @property
+    def bonus_dice(self) -> DiceRoll:
+        return dice_from_counts(self.bonus_counts)
+
+    def __eq__(self, other):
+        if not isinstance(other, ProductiveSeasonRoll):
+            return NotImplemented
+        return self.player_counts == other.player_counts and self.bonus_counts == other.bonus_counts
+
+    def __hash__(self):
+        return hash((self.player_counts, self.bonus_counts))
+
+    def toDict(self):
+        return {
+            "player_dice": self.player_dice,
+            "bonus_dice": self.bonus_dice,
+        }
+
+    @staticmethod
+    def fromDict(d) -> ProductiveSeasonRoll:
+        return ProductiveSeasonRoll(
+            player_dice=list(d["player_dice"]),
+            bonus_dice=list(d["bonus_dice"]),
+        )
 
     def totalValue(self) -> int:
         """
         Returns the total value of all player dice and hit dice together.
         """
         total = 0
-        for die in self.player_dice:
-            total += die
-        for die in self.bonus_dice:
-            total += die
+        for face in range(DIE_FACES):
+            total += (face + 1) * (self.player_counts[face] + self.bonus_counts[face])
         return total
 
 class AdvisorInfluence():
@@ -330,6 +560,8 @@ class AdvisorInfluence():
     to a given roll.
     """
 
+    __slots__ = ("player_dice", "bonus_dice", "plus_two", "market_modifier", "reward")
+
     def __init__(self, player_dice: DiceRoll, bonus_dice: DiceRoll, plus_two: bool=False, market_modifier: int=0, reward: Optional[Reward]=None):
         self.player_dice: DiceRoll = player_dice
         self.bonus_dice: DiceRoll = bonus_dice
@@ -338,10 +570,29 @@ class AdvisorInfluence():
         self.reward: Optional[Reward] = reward
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, AdvisorInfluence):
+            return NotImplemented
+        return self.player_dice == other.player_dice \
+            and self.bonus_dice == other.bonus_dice \
+            and self.plus_two == other.plus_two \
+            and self.market_modifier == other.market_modifier \
+            and self.reward == other.reward
+
+    def __hash__(self):
+        return hash((tuple(self.player_dice), tuple(self.bonus_dice), self.plus_two, self.market_modifier, self.reward))
+
+    def __repr__(self):
+        return "AdvisorInfluence(" + repr(self.player_dice) + ", " + repr(self.bonus_dice) + \
+            ", plus_two=" + repr(self.plus_two) + ", market_modifier=" + repr(self.market_modifier) + ")"
 
     def toDict(self):
-        return self.__dict__
+        return {
+            "player_dice": list(self.player_dice),
+            "bonus_dice": list(self.bonus_dice),
+            "plus_two": self.plus_two,
+            "market_modifier": self.market_modifier,
+            "reward": None if self.reward is None else self.reward.toDict(),
+        }
 
     @staticmethod
     def fromDict(d) -> AdvisorInfluence:
@@ -365,6 +616,209 @@ class AdvisorInfluence():
 
 ADVISOR_INFLUENCE_PASS = AdvisorInfluence([], [])
 
+def generate_advisor_influences(player_dice: DiceRoll, bonus_dice: DiceRoll, plustwo: bool, market: bool) -> List[AdvisorInfluence]:
+    """
+    Generates every valid advisor influence for the given dice, ignoring
+    which advisors are already taken. plustwo and market say whether a
+    plustwo token and the Market building may be used.
+    The "Pass" influence is not included.
+    """
+    # Determine available market modifiers.
+    market_modifiers: List[int] = [-1, 1] if market else []
+
+    # Determine available plustwo modifiers.
+    plustwos: List[int] = [1] if plustwo else []
+
+    # Determine all possible moves, one distinct combination of each component.
+    all_possible_moves = util.multiset_product(
+        util.multiset_combinations(player_dice),
+        util.multiset_combinations(bonus_dice),
+        util.multiset_combinations(plustwos),
+        util.multiset_combinations(market_modifiers, 1),
+    )
+
+    influences: List[AdvisorInfluence] = []
+    for move_player_dice, move_bonus_dice, move_plustwo, move_market in all_possible_moves:
+        # Must use at least one player die.
+        if len(move_player_dice) == 0:
+            continue
+        market_modifier: int = move_market[0] if len(move_market) > 0 else 0
+        influence = AdvisorInfluence(list(move_player_dice), list(move_bonus_dice), len(move_plustwo) > 0, market_modifier)
+        score = influence.advisorScore()
+        # Can't score below 1 or above 18.
+        if score < 1 or score > ADVISOR_MAX:
+            continue
+        influences.append(influence)
+    return influences
+
+@functools.lru_cache(maxsize=4096)
+def advisor_influence_candidates(player_counts: DiceCounts, bonus_counts: DiceCounts, plustwo: bool, market: bool) -> Tuple[Tuple[int, AdvisorInfluence], ...]:
+    """
+    Cached version of generate_advisor_influences, keyed by the face
+    counts of the dice. Each influence is paired with the advisor bit
+    of its score so callers can filter by occupancy with a single bit test.
+
+    The returned influences are shared between callers and must not be modified.
+    """
+    return tuple(
+        (ADVISOR_BIT[influence.advisorScore()], influence)
+        for influence in generate_advisor_influences(dice_from_counts(player_counts), dice_from_counts(bonus_counts), plustwo, market)
+    )
+
+# Every distinct dice placement, ignoring rewards, has a fixed integer ID
+# so moves can be stored as one int and scored as one output of a policy.
+# IDs are assigned in sorted order of (player dice, bonus dice, plus_two,
+# market_modifier), with 0 for "Pass". Changing the rules below changes
+# the IDs, which invalidates any data or models that use them.
+
+MAX_PLAYER_DICE = 3
+MAX_BONUS_DICE = 2
+
+ActionKey = Tuple[Tuple[int, ...], Tuple[int, ...], bool, int]
+
+def action_key(influence: AdvisorInfluence) -> ActionKey:
+    return (tuple(sorted(influence.player_dice)), tuple(sorted(influence.bonus_dice)), influence.plus_two, influence.market_modifier)
+
+def _action_catalog() -> List[AdvisorInfluence]:
+    faces = list(range(1, DIE_FACES+1))
+    keys: List[ActionKey] = []
+    for player_dice in util.multiset_combinations(sorted(faces * MAX_PLAYER_DICE), MAX_PLAYER_DICE):
+        # Must use at least one player die.
+        if len(player_dice) == 0:
+            continue
+        for bonus_dice in util.multiset_combinations(sorted(faces * MAX_BONUS_DICE), MAX_BONUS_DICE):
+            for plus_two in [False, True]:
+                for market_modifier in [-1, 0, 1]:
+                    score = sum(player_dice) + sum(bonus_dice) + (2 if plus_two else 0) + market_modifier
+                    if 1 <= score <= ADVISOR_MAX:
+                        keys.append((player_dice, bonus_dice, plus_two, market_modifier))
+    keys.sort()
+    return [ADVISOR_INFLUENCE_PASS] + [AdvisorInfluence(list(k[0]), list(k[1]), k[2], k[3]) for k in keys]
+
+ACTIONS: List[AdvisorInfluence] = _action_catalog()
+ACTION_PASS = 0
+ACTION_ID: Dict[ActionKey, int] = {action_key(a): i for i, a in enumerate(ACTIONS)}
+
+def action_id(influence: AdvisorInfluence) -> int:
+    """
+    Returns the ID of the given influence's dice placement. Rewards are ignored.
+    """
+    return ACTION_ID[action_key(influence)]
+
+def action(id: int) -> AdvisorInfluence:
+    """
+    Returns the influence with the given ID. It is shared and must not be modified.
+    """
+    return ACTIONS[id]
+
+def action_ids(mask: int) -> List[int]:
+    """
+    Returns the IDs set in an action mask, in ascending order.
+    """
+    ids: List[int] = []
+    while mask:
+        low = mask & -mask
+        ids.append(low.bit_length() - 1)
+        mask ^= low
+    return ids
+
+@functools.lru_cache(maxsize=4096)
+def advisor_action_masks(player_counts: DiceCounts, bonus_counts: DiceCounts, plustwo: bool, market: bool) -> Tuple[int, ...]:
+    """
+    The action IDs of advisor_influence_candidates as bitmasks grouped by
+    advisor: element score has bit 1 << id set for every candidate that
+    influences that advisor. Element 0 is unused.
+    """
+    masks = [0] * (ADVISOR_MAX + 1)
+    for _, influence in advisor_influence_candidates(player_counts, bonus_counts, plustwo, market):
+        masks[influence.advisorScore()] |= 1 << action_id(influence)
+    return tuple(masks)
+
+##############################################
+# Zobrist hashing
+##############################################
+
+# States keep a 64-bit Zobrist hash: the XOR of one random key per
+# (owner, field, value), where the owner is a player name or "" for the
+# state itself. A transition that changes a field XORs the old value's key
+# out and the new value's key in, so hashing a state reached by a move
+# costs the same however big the state is. Hashes are computed lazily: a
+# state built from scratch has none until first asked for, after which
+# the states derived from it carry theirs along.
+#
+# Keys are derived from the owner, field and value rather than drawn at
+# random, so hashes are the same in every process.
+
+# Set to recompute every hash from scratch and compare it with the
+# incrementally maintained one whenever it is read.
+DEBUG_ZOBRIST = False
+
+@functools.lru_cache(maxsize=1 << 16)
+def zobrist_key(*parts) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=8).digest(), "big")
+
+def zobrist_swap(h: Optional[int], owner: str, field: str, old, new) -> Optional[int]:
+    """
+    Updates hash h for owner's field changing from old to new.
+    An unknown hash stays unknown.
+    """
+    if h is None:
+        return None
+    return h ^ zobrist_key(owner, field, old) ^ zobrist_key(owner, field, new)
+
+##############################################
+# Moves
+##############################################
+
+# Moves for State.move and State.apply, as tuples starting with the kind of
+# move followed by the arguments of the matching State transition:
+#   (MOVE_RESOURCE, name, resource)
+#   (MOVE_INFLUENCE, name, influence)
+#   (MOVE_REWARD, name, advisor_score, reward)
+#   (MOVE_BUILDING, name, building, use_kings_envoy)
+#   (MOVE_ROLL, rolls)
+MOVE_RESOURCE = "resource"
+MOVE_INFLUENCE = "influence"
+MOVE_REWARD = "reward"
+MOVE_BUILDING = "building"
+MOVE_ROLL = "roll"
+
+Move = Tuple[Any, ...]
+
+# What State.apply changed, as (target, key, old value) in the order it
+# was changed. The target is an object whose attribute key was set, or a
+# dict whose item key was set. An old value of UNDO_MISSING means the item
+# was added.
+UndoRecord = Tuple[Tuple[Any, Any, Any], ...]
+
+UNDO_MISSING = object()
+
+def turn_order(rolls: Dict[str, ProductiveSeasonRoll], current: List[str]) -> List[str]:
+    """
+    Returns the turn order for the given rolls. The lowest total roll goes
+    first. If there is a tie, the tied players maintain the same order in
+    relation to each other that they had in the current turn order.
+    """
+    rollers_by_score: Dict[int, List[str]] = {}
+    for name in rolls:
+        score = rolls[name].totalValue()
+        if score not in rollers_by_score:
+            rollers_by_score[score] = []
+        rollers_by_score[score].append(name)
+    scores: List[int] = []
+    for score in rollers_by_score:
+        scores.append(score)
+    scores.sort()
+    new_turn_order: List[str] = []
+    for score in scores:
+        if len(rollers_by_score[score]) == 1:
+            new_turn_order.append(rollers_by_score[score][0])
+        else:
+            for name in current:
+                if name in rollers_by_score[score]:
+                    new_turn_order.append(name)
+    return new_turn_order
+
 ##############################################
 # Game state
 ##############################################
@@ -378,8 +832,13 @@ class State():
     computes possible next moves.
     """
 
-    def __init__(self):
-        self.messages: List[str] = []
+    __slots__ = (
+        "sink", "players", "over", "year", "phase", "last_phase_played", "turn_order",
+        "taken_advisors", "taken_mask", "player_advisor_masks", "zhash", "owns_parts",
+    )
+
+    def __init__(self, sink: events.EventSink=events.NULL_SINK):
+        self.sink: events.EventSink = sink
         self.players: Dict[str, PlayerState] = {}
         self.over: bool = False
         self.year: int = 1
@@ -387,45 +846,141 @@ class State():
         self.last_phase_played: int = -1
         self.turn_order: List[str] = []
         self.taken_advisors: Dict[AdvisorScore, List[str]] = {}
+        # Bitmasks of the advisors in taken_advisors, overall and per player.
+        self.taken_mask: int = 0
+        self.player_advisor_masks: Dict[str, int] = {}
+        # The Zobrist hash, if known. See zobristHash.
+        self.zhash: Optional[int] = None
+        # Whether no other state shares this state's parts. See mutable.
+        self.owns_parts: bool = False
+
+    def __eq__(self, other):
+        if not isinstance(other, State):
+            return NotImplemented
+        if self.zobristHash() != other.zobristHash():
+            return False
+        return self.over == other.over \
+            and self.year == other.year \
+            and self.phase == other.phase \
+            and self.last_phase_played == other.last_phase_played \
+            and self.turn_order == other.turn_order \
+            and self.taken_advisors == other.taken_advisors \
+            and self.players == other.players
+
+    def __hash__(self):
+        return self.zobristHash()
+
+    def zobristHash(self) -> int:
+        """
+        Returns the 64-bit Zobrist hash of this state, covering every field
+        except the event sink.
+        """
+        if self.zhash is None:
+            self.zhash = self.computeZobristHash()
+        elif DEBUG_ZOBRIST and self.zhash != self.computeZobristHash():
+            raise Exception("Incremental Zobrist hash does not match the state")
+        return self.zhash
+
+    def computeZobristHash(self) -> int:
+        """
+        Computes the Zobrist hash from scratch.
+        """
+        h = zobrist_key("", "over", self.over) \
+            ^ zobrist_key("", "year", self.year) \
+            ^ zobrist_key("", "phase", self.phase) \
+            ^ zobrist_key("", "last_phase_played", self.last_phase_played) \
+            ^ zobrist_key("", "turn_order", tuple(self.turn_order))
+        for score in self.taken_advisors:
+            h ^= zobrist_key("", "advisor", score, tuple(self.taken_advisors[score]))
+        for name in self.players:
+            h ^= self.players[name].zobristHash()
+        return h
 
     def toDict(self):
-        d = self.__dict__
-        del d["messages"]
-        d["players"] = [p.toDict() for p in self.playerList()]
-        return d
+        return {
+            "players": [p.toDict() for p in self.playerList()],
+            "over": self.over,
+            "year": self.year,
+            "phase": self.phase,
+            "last_phase_played": self.last_phase_played,
+            "turn_order": list(self.turn_order),
+            "taken_advisors": {score: list(self.taken_advisors[score]) for score in self.taken_advisors},
+        }
 
     # TODO make static method
     def fromDict(self, d):
-        self.messages = []
         self.players = {}
         for p in d["players"]:
-            player = PlayerState("foo").fromDict(p)
+            player = PlayerState("foo", self.sink).fromDict(p)
             self.players[player.name] = player
         self.over = d["over"]
         self.year = d["year"]
         self.phase = d["phase"]
         self.last_phase_played = d["last_phase_played"]
         self.turn_order = d["turn_order"]
-        self.taken_advisors = d["taken_advisors"]
+        # JSON turns the integer advisor scores into strings.
+        self.taken_advisors = {int(score): d["taken_advisors"][score] for score in d["taken_advisors"]}
+        self.taken_mask = advisor_mask(list(self.taken_advisors))
+        self.player_advisor_masks = {}
+        for score in self.taken_advisors:
+            for name in self.taken_advisors[score]:
+                self.player_advisor_masks[name] = self.player_advisor_masks.get(name, 0) | ADVISOR_BIT[score]
+        self.zhash = None
         return self
 
     def copy(self) -> State:
-        return copy.deepcopy(self)
+        """
+        Returns a shallow copy of this state.
 
-    def message(self, message) -> State:
-        state = self.copy()
-        state.messages.append(message)
+        States are persistent: players, lists and dicts are shared
+        between a state and its copies. A transition must replace any
+        container it changes rather than mutate it in place.
+
+        The copy's Zobrist hash is unknown, as the caller may change any
+        field. Transitions set it again once they are done.
+        """
+        state = State.__new__(State)
+        state.sink = self.sink
+        state.players = self.players
+        state.over = self.over
+        state.year = self.year
+        state.phase = self.phase
+        state.last_phase_played = self.last_phase_played
+        state.turn_order = self.turn_order
+        state.taken_advisors = self.taken_advisors
+        state.taken_mask = self.taken_mask
+        state.player_advisor_masks = self.player_advisor_masks
+        state.zhash = None
+        state.owns_parts = False
         return state
 
-    def clearMessages(self) -> List[str]:
-        messages = self.messages
-        self.messages = []
-        return messages
+    def withSink(self, sink: events.EventSink) -> State:
+        """
+        Returns this state with its players emitting events to the given sink.
+        Players exploring hypothetical moves should use events.NULL_SINK so
+        their lookahead does not show up in the game log.
+        """
+        state = self.copy()
+        state.sink = sink
+        state.players = {}
+        for name in self.players:
+            player = self.players[name].copy()
+            player.sink = sink
+            player.zhash = self.players[name].zhash
+            state.players[name] = player
+        state.zhash = self.zhash
+        return state
 
     def clearAdvisorInfluences(self) -> State:
         # TODO test
         state = self.copy()
         state.taken_advisors = {}
+        state.taken_mask = 0
+        state.player_advisor_masks = {}
+        if self.zhash is not None:
+            state.zhash = self.zhash
+            for score in self.taken_advisors:
+                state.zhash ^= zobrist_key("", "advisor", score, tuple(self.taken_advisors[score]))
         return state
 
     def playerList(self) -> List[PlayerState]:
@@ -433,10 +988,10 @@ class State():
 
     def updatePlayer(self, name: str, player: PlayerState) -> State:
         state = self.copy()
+        state.players = dict(self.players)
         state.players[name] = player
-        messages = player.clearMessages()
-        for message in messages:
-            state = state.message(message)
+        if self.zhash is not None:
+            state.zhash = self.zhash ^ self.players[name].zobristHash() ^ player.zobristHash()
         return state
 
     def setPlayers(self, playerNames: List[str]) -> State:
@@ -447,8 +1002,10 @@ class State():
         randomized by whatever method the Engine chose.
         """
         state = self.copy()
+        state.players = dict(self.players)
+        state.turn_order = self.turn_order[:]
         for name in playerNames:
-            player = PlayerState(name)
+            player = PlayerState(name, self.sink)
             state.players[name] = player
             state.turn_order.append(name)
         return state
@@ -459,23 +1016,29 @@ class State():
             state.over = True
         else:
             state.year += 1
+        state.zhash = zobrist_swap(self.zhash, "", "over", self.over, state.over)
+        state.zhash = zobrist_swap(state.zhash, "", "year", self.year, state.year)
         return state
 
     def nextPhase(self) -> State:
         state = self.copy()
+        state.zhash = self.zhash
         if state.phase == MAX_PHASE:
             state = state.nextYear()
             if not state.over:
                 state.phase = 0
         else:
             state.phase += 1
-        return state.message("Transitioning to year: " + str(state.year) + ", phase: " + PHASES[state.phase])
+        state.zhash = zobrist_swap(state.zhash, "", "phase", self.phase, state.phase)
+        self.sink.emit(events.EVENT_PHASE, state.year, PHASES[state.phase])
+        return state
 
     def phaseComplete(self, phase: Phase) -> State:
         if phase != PHASES[self.phase]:
             raise Exception("Completed the wrong phase")
         state = self.copy()
         state.last_phase_played = self.phase
+        state.zhash = zobrist_swap(self.zhash, "", "last_phase_played", self.last_phase_played, state.last_phase_played)
         return state
 
     def kingsFavor(self) -> Union[State, str]:
@@ -497,18 +1060,20 @@ class State():
         resource_count = {}
         for name in self.players:
             player = self.players[name]
-            building_count[name] = len(player.buildings)
+            building_count[name] = player.getNumBuildings()
             resource_count[name] = 0
             for resource in player.resources:
                 resource_count[name] += player.resources[resource]
 
         fewest_buildings = util.lowest(building_count)
         if fewest_buildings is not None:
-            return self.message(fewest_buildings + " has the fewest buildings").giveKingsFavorBonusDie(fewest_buildings)
+            self.sink.emit(events.EVENT_FEWEST_BUILDINGS, fewest_buildings)
+            return self.giveKingsFavorBonusDie(fewest_buildings)
 
         fewest_resources = util.lowest(resource_count)
         if fewest_resources is not None:
-            return self.message(fewest_resources + " has the fewest resources").giveKingsFavorBonusDie(fewest_resources)
+            self.sink.emit(events.EVENT_FEWEST_RESOURCES, fewest_resources)
+            return self.giveKingsFavorBonusDie(fewest_resources)
 
         return KINGS_FAVOR_TIE
 
@@ -529,12 +1094,8 @@ class State():
         """
         Gives the given building to the given player.
         """
-        state = self.copy()
-        player_advisors: List[AdvisorScore] = []
-        for score in ADVISORS:
-            if score in self.taken_advisors and name in self.taken_advisors[score]:
-                player_advisors.append(score)
-        state = state.updatePlayer(name, state.players[name].addBuilding(building, player_advisors))
+        player_advisors = self.player_advisor_masks.get(name, 0)
+        state = self.updatePlayer(name, self.players[name].addBuilding(building, player_advisors))
         if building != BUILD_PASS and use_kings_envoy:
             state = state.updatePlayer(name, state.players[name].useKingsEnvoy())
         return state
@@ -578,10 +1139,10 @@ class State():
             elif p.getTotalResources() > highest_resource:
                 highest_resource = p.getTotalResources()
                 highest_resource_players = [p.name]
-            if len(p.buildings) == highest_building:
+            if p.getNumBuildings() == highest_building:
                 highest_building_players.append(p.name)
-            elif len(p.buildings) > highest_building:
-                highest_building = len(p.buildings)
+            elif p.getNumBuildings() > highest_building:
+                highest_building = p.getNumBuildings()
                 highest_building_players = [p.name]
         if len(highest_vp_players) == 1:
             return highest_vp_players
@@ -598,60 +1159,223 @@ class State():
         Resets bonus die.
         """
         state = self.copy()
+        state.zhash = self.zhash
 
         # Update player rolls.
         for name in state.players:
             player = state.players[name]
-            roll = rolls[name]
-            roll.player_dice.sort()
-            roll.bonus_dice.sort()
-            state = state.updatePlayer(name, player.roll(roll))
-
-        # Set turn order. The lowest total roll goes first.
-        # If there is a tie, the tied players maintain the
-        # same order in relation to each other that they
-        # had in the existing turn order.
-        rollers_by_score: Dict[int, List[str]] = {}
-        for name in rolls:
-            score = rolls[name].totalValue()
-            if score not in rollers_by_score:
-                rollers_by_score[score] = []
-            rollers_by_score[score].append(name)
-        scores: List[int] = []
-        for score in rollers_by_score:
-            scores.append(score)
-        scores.sort()
-        new_turn_order: List[str] = []
-        for score in scores:
-            if len(rollers_by_score[score]) == 1:
-                new_turn_order.append(rollers_by_score[score][0])
-            else:
-                for name in state.turn_order:
-                    if name in rollers_by_score[score]:
-                        new_turn_order.append(name)
+            state = state.updatePlayer(name, player.roll(rolls[name]))
+
+        # Set turn order.
+        new_turn_order = turn_order(rolls, state.turn_order)
+        state.zhash = zobrist_swap(state.zhash, "", "turn_order", tuple(state.turn_order), tuple(new_turn_order))
         state.turn_order = new_turn_order
-        state = state.message("Turn order: " + str(state.turn_order))
+        self.sink.emit(events.EVENT_TURN_ORDER, new_turn_order)
 
         return state
 
     def influenceAdvisor(self, name: str, influence: AdvisorInfluence) -> State:
         # TODO test
         state = self.copy()
+        state.zhash = self.zhash
         if influence == ADVISOR_INFLUENCE_PASS:
-            return state.message(name + " passes")
+            self.sink.emit(events.EVENT_INFLUENCE_PASS, name)
+            return state
         score = influence.advisorScore()
         influencers = state.taken_advisors[score] if score in state.taken_advisors else []
-        influencers.append(name)
-        state.taken_advisors[score] = influencers
+        state.taken_advisors = dict(state.taken_advisors)
+        state.taken_advisors[score] = influencers + [name]
+        if state.zhash is not None:
+            if len(influencers) > 0:
+                state.zhash ^= zobrist_key("", "advisor", score, tuple(influencers))
+            state.zhash ^= zobrist_key("", "advisor", score, tuple(state.taken_advisors[score]))
+        state.taken_mask = self.taken_mask | ADVISOR_BIT[score]
+        state.player_advisor_masks = dict(self.player_advisor_masks)
+        state.player_advisor_masks[name] = self.player_advisor_masks.get(name, 0) | ADVISOR_BIT[score]
         return state.updatePlayer(name, state.players[name].influenceAdvisor(influence))
 
     def giveReward(self, name: str, advisor_score: AdvisorScore, reward: Reward) -> State:
         # TODO test
+        self.sink.emit(events.EVENT_TAKE_REWARD, name, advisor_score)
+        return self.updatePlayer(name, self.players[name].applyReward(reward))
+
+    def move(self, move: Move) -> State:
+        """
+        Returns the state after the given move. See Moves.
+        """
+        kind = move[0]
+        if kind == MOVE_RESOURCE:
+            return self.takeFreeResource(move[1], move[2])
+        if kind == MOVE_INFLUENCE:
+            return self.influenceAdvisor(move[1], move[2])
+        if kind == MOVE_REWARD:
+            return self.giveReward(move[1], move[2], move[3])
+        if kind == MOVE_BUILDING:
+            return self.giveBuilding(move[1], move[2], move[3])
+        if kind == MOVE_ROLL:
+            return self.productiveSeasonRolls(move[1])
+        raise Exception("Unknown move: " + str(kind))
+
+    def mutable(self) -> State:
+        """
+        Returns a copy of this state for apply and undo, which change it in
+        place. Unlike copy, it shares no players, lists or dicts with this
+        state, so changing it leaves every other state alone.
+
+        States derived from a mutable state with the functional transitions
+        share its parts, and so change along with it. Call mutable again
+        to keep a snapshot.
+        """
         state = self.copy()
-        state = state.message(name + " takes reward from " + ADVISOR[advisor_score].name + " (" + str(advisor_score) + ")")
-        state = state.updatePlayer(name, state.players[name].applyReward(reward))
+        state.sink = events.NULL_SINK
+        state.players = {}
+        for name in self.players:
+            player = self.players[name].copy()
+            player.sink = events.NULL_SINK
+            player.resources = dict(player.resources)
+            player.zhash = self.players[name].zhash
+            state.players[name] = player
+        state.turn_order = list(self.turn_order)
+        state.taken_advisors = dict(self.taken_advisors)
+        state.player_advisor_masks = dict(self.player_advisor_masks)
+        state.zhash = self.zhash
+        state.owns_parts = True
         return state
 
+    def apply(self, move: Move) -> UndoRecord:
+        """
+        Makes the given move on this state in place, with the same result
+        as move(move) but without building a new state. Returns a record
+        that undo uses to restore this state exactly. No events are sent.
+
+        Only states returned by mutable can be changed this way.
+        """
+        if not self.owns_parts:
+            raise Exception("Applying a move to a state that shares its parts; use mutable()")
+        undo: List[Tuple[Any, Any, Any]] = [(self, "zhash", self.zhash)]
+        kind = move[0]
+        if kind == MOVE_ROLL:
+            self._applyRolls(move[1], undo)
+            return tuple(undo)
+        if kind not in (MOVE_RESOURCE, MOVE_INFLUENCE, MOVE_REWARD, MOVE_BUILDING):
+            raise Exception("Unknown move: " + str(kind))
+
+        name = move[1]
+        player = self.players[name]
+        undo.append((player, "zhash", player.zhash))
+        if kind == MOVE_RESOURCE:
+            self._addResource(player, move[2], 1, undo)
+        elif kind == MOVE_INFLUENCE:
+            self._applyInfluence(player, move[2], undo)
+        elif kind == MOVE_REWARD:
+            reward = move[3]
+            self._setPlayer(player, "victory_points", player.victory_points + reward.victory_points, undo)
+            for resource in reward.resources:
+                self._addResource(player, resource, reward.resources[resource], undo)
+            self._setPlayer(player, "soldiers", player.soldiers + reward.soldiers, undo)
+            self._setPlayer(player, "plustwo_tokens", player.plustwo_tokens + reward.plustwos, undo)
+        else:
+            self._applyBuilding(player, move[2], move[3], undo)
+        return tuple(undo)
+
+    def undo(self, record: UndoRecord):
+        """
+        Takes back the move apply returned the record for. Moves must be
+        undone in the opposite order they were applied, on the same state.
+        """
+        if not self.owns_parts:
+            raise Exception("Undoing a move on a state that shares its parts; use mutable()")
+        for target, key, old in reversed(record):
+            if type(target) is dict:
+                if old is UNDO_MISSING:
+                    del target[key]
+                else:
+                    target[key] = old
+            else:
+                setattr(target, key, old)
+
+    def _applyRolls(self, rolls: Dict[str, ProductiveSeasonRoll], undo: List[Tuple[Any, Any, Any]]):
+        for name in self.players:
+            player = self.players[name]
+            undo.append((player, "zhash", player.zhash))
+            roll = rolls[name]
+            self._setPlayer(player, "dice", roll, undo, (player.dice.player_counts, player.dice.bonus_counts), (roll.player_counts, roll.bonus_counts))
+            self._setPlayer(player, "has_kings_favor_bonus_die", False, undo)
+        new_turn_order = turn_order(rolls, self.turn_order)
+        self.zhash = zobrist_swap(self.zhash, "", "turn_order", tuple(self.turn_order), tuple(new_turn_order))
+        undo.append((self, "turn_order", self.turn_order))
+        self.turn_order = new_turn_order
+
+    def _applyInfluence(self, player: PlayerState, influence: AdvisorInfluence, undo: List[Tuple[Any, Any, Any]]):
+        # Only "Pass" uses no player dice.
+        if len(influence.player_dice) == 0:
+            return
+        name = player.name
+        score = influence.advisorScore()
+        influencers = self.taken_advisors.get(score, [])
+        undo.append((self.taken_advisors, score, self.taken_advisors.get(score, UNDO_MISSING)))
+        self.taken_advisors[score] = influencers + [name]
+        if self.zhash is not None:
+            if len(influencers) > 0:
+                self.zhash ^= zobrist_key("", "advisor", score, tuple(influencers))
+            self.zhash ^= zobrist_key("", "advisor", score, tuple(self.taken_advisors[score]))
+        undo.append((self, "taken_mask", self.taken_mask))
+        self.taken_mask |= ADVISOR_BIT[score]
+        undo.append((self.player_advisor_masks, name, self.player_advisor_masks.get(name, UNDO_MISSING)))
+        self.player_advisor_masks[name] = self.player_advisor_masks.get(name, 0) | ADVISOR_BIT[score]
+
+        dice = ProductiveSeasonRoll.fromCounts(
+            dice_minus(player.dice.player_counts, influence.player_dice),
+            dice_minus(player.dice.bonus_counts, influence.bonus_dice),
+        )
+        self._setPlayer(player, "dice", dice, undo, (player.dice.player_counts, player.dice.bonus_counts), (dice.player_counts, dice.bonus_counts))
+        if influence.plus_two:
+            self._setPlayer(player, "plustwo_tokens", player.plustwo_tokens - 1, undo)
+
+    def _applyBuilding(self, player: PlayerState, building: Building, use_kings_envoy: bool, undo: List[Tuple[Any, Any, Any]]):
+        if building == BUILD_PASS:
+            return
+        if player.building_mask & BUILDING_BIT[building]:
+            raise Exception("Adding an already-owned building")
+        if use_kings_envoy and not player.has_kings_envoy:
+            raise Exception("Cannot use King's Envoy")
+        self._setPlayer(player, "building_mask", player.building_mask | BUILDING_BIT[building], undo)
+        cost = BUILDING_COST[building]
+        for resource in cost:
+            self._addResource(player, resource, cost[resource], undo)
+        self._setPlayer(player, "victory_points", player.victory_points + BUILDING_VP[building], undo)
+        if building == BUILDING_STABLE and self.player_advisor_masks.get(player.name, 0) & ADVISORS_STABLE_MASK:
+            self._setPlayer(player, "soldiers", player.soldiers + 1, undo)
+        if use_kings_envoy:
+            self._setPlayer(player, "has_kings_envoy", False, undo)
+
+    def _addResource(self, player: PlayerState, resource: Resource, amount: int, undo: List[Tuple[Any, Any, Any]]):
+        if amount == 0:
+            return
+        old = player.resources[resource]
+        undo.append((player.resources, resource, old))
+        player.resources[resource] = old + amount
+        self._rehash(player, "resource", (resource, old), (resource, old + amount))
+
+    def _setPlayer(self, player: PlayerState, field: str, value: Any, undo: List[Tuple[Any, Any, Any]], old_key: Any=UNDO_MISSING, new_key: Any=UNDO_MISSING):
+        # Sets a player field, hashed as its value unless keys are given.
+        old = getattr(player, field)
+        if old_key is UNDO_MISSING:
+            old_key, new_key = old, value
+        if old_key == new_key:
+            return
+        undo.append((player, field, old))
+        setattr(player, field, value)
+        self._rehash(player, field, old_key, new_key)
+
+    def _rehash(self, player: PlayerState, field: str, old: Any, new: Any):
+        # The player's hash is part of the state's, so both change alike.
+        delta = zobrist_key(player.name, field, old) ^ zobrist_key(player.name, field, new)
+        if player.zhash is not None:
+            player.zhash ^= delta
+        if self.zhash is not None:
+            self.zhash ^= delta
+
     def choices_freeResource(self, name: str) -> List[Resource]:
         """
         Returns the list of resources available to the given player
@@ -664,11 +1388,14 @@ class State():
         Returns the list of available advisor influences for the given player.
         Rewards are not included, this only represents possible dice placements.
         """
-        available: List[AdvisorScore] = []
-        for advisor in ADVISORS:
-            if advisor not in self.taken_advisors:
-                available.append(advisor)
-        return self.players[name].choices__advisorInfluence(available)
+        return self.players[name].choices__advisorInfluence(ADVISORS_MASK & ~self.taken_mask)
+
+    def legalActionMask(self, name: str) -> int:
+        """
+        Returns the available advisor influences for the given player as a
+        bitmask of action IDs, the same moves as choices__advisorInfluence.
+        """
+        return self.players[name].legalActionMask(ADVISORS_MASK & ~self.taken_mask)
 
     def choices__buildings(self, name: str) -> List[Building]:
         """
@@ -685,74 +1412,154 @@ class PlayerState():
     Tracks the state of an individual player.
     """
 
-    def __init__(self, name: str):
-        self.messages: List[str] = []
+    __slots__ = (
+        "sink", "name", "has_kings_favor_bonus_die", "has_kings_envoy", "used_kings_envoy",
+        "plustwo_tokens", "used_plustwo_token", "used_market", "building_mask", "resources",
+        "dice", "victory_points", "soldiers", "zhash",
+    )
+
+    def __init__(self, name: str, sink: events.EventSink=events.NULL_SINK):
+        self.sink: events.EventSink = sink
         self.name: str = name
         self.has_kings_favor_bonus_die: bool = False
-        self.has_kings_envoy = False
+        self.has_kings_envoy: bool = False
         # TODO get rid of this.
         # Should get taken away when influencing an advisor with it.
-        self.used_kings_envoy = False
-        self.plustwo_tokens = 0
-        self.used_plustwo_token = False
-        self.used_market = False
-        self.buildings: List[Building] = []
+        self.used_kings_envoy: bool = False
+        self.plustwo_tokens: int = 0
+        self.used_plustwo_token: bool = False
+        self.used_market: bool = False
+        self.building_mask: int = 0
         self.resources: ResourceInventory = {
             RESOURCE_WOOD: 0,
             RESOURCE_GOLD: 0,
             RESOURCE_STONE: 0
         }
         self.dice: ProductiveSeasonRoll = ProductiveSeasonRoll([], [])
-        self.victory_points = 0
-        self.soldiers = 0
+        self.victory_points: int = 0
+        self.soldiers: int = 0
+        # The Zobrist hash, if known. See State.zobristHash.
+        self.zhash: Optional[int] = None
+
+    def __eq__(self, other):
+        if not isinstance(other, PlayerState):
+            return NotImplemented
+        return self.name == other.name \
+            and self.has_kings_favor_bonus_die == other.has_kings_favor_bonus_die \
+            and self.has_kings_envoy == other.has_kings_envoy \
+            and self.used_kings_envoy == other.used_kings_envoy \
+            and self.plustwo_tokens == other.plustwo_tokens \
+            and self.used_plustwo_token == other.used_plustwo_token \
+            and self.used_market == other.used_market \
+            and self.building_mask == other.building_mask \
+            and self.resources == other.resources \
+            and self.dice == other.dice \
+            and self.victory_points == other.victory_points \
+            and self.soldiers == other.soldiers
+
+    def __hash__(self):
+        return self.zobristHash()
+
+    def zobristHash(self) -> int:
+        """
+        Returns this player's part of the State Zobrist hash. Every key is
+        salted with the player's name.
+        """
+        if self.zhash is None:
+            self.zhash = self.computeZobristHash()
+        elif DEBUG_ZOBRIST and self.zhash != self.computeZobristHash():
+            raise Exception("Incremental Zobrist hash does not match the player state")
+        return self.zhash
+
+    def computeZobristHash(self) -> int:
+        """
+        Computes the Zobrist hash from scratch.
+        """
+        n = self.name
+        h = zobrist_key(n, "has_kings_favor_bonus_die", self.has_kings_favor_bonus_die) \
+            ^ zobrist_key(n, "has_kings_envoy", self.has_kings_envoy) \
+            ^ zobrist_key(n, "used_kings_envoy", self.used_kings_envoy) \
+            ^ zobrist_key(n, "plustwo_tokens", self.plustwo_tokens) \
+            ^ zobrist_key(n, "used_plustwo_token", self.used_plustwo_token) \
+            ^ zobrist_key(n, "used_market", self.used_market) \
+            ^ zobrist_key(n, "building_mask", self.building_mask) \
+            ^ zobrist_key(n, "dice", (self.dice.player_counts, self.dice.bonus_counts)) \
+            ^ zobrist_key(n, "victory_points", self.victory_points) \
+            ^ zobrist_key(n, "soldiers", self.soldiers)
+        for resource in self.resources:
+            h ^= zobrist_key(n, "resource", (resource, self.resources[resource]))
+        return h
+
+    @property
+    def buildings(self) -> List[Building]:
+        """
+        The buildings this player owns, in province sheet order.
+        """
+        return [building for building in BUILDINGS if self.building_mask & BUILDING_BIT[building]]
 
     def toDict(self):
-        d = self.__dict__
-        d['dice'] = self.dice.__dict__
-        return d
+        return {
+            "name": self.name,
+            "has_kings_favor_bonus_die": self.has_kings_favor_bonus_die,
+            "has_kings_envoy": self.has_kings_envoy,
+            "used_kings_envoy": self.used_kings_envoy,
+            "plustwo_tokens": self.plustwo_tokens,
+            "used_plustwo_token": self.used_plustwo_token,
+            "used_market": self.used_market,
+            "buildings": self.buildings,
+            "resources": dict(self.resources),
+            "dice": self.dice.toDict(),
+            "victory_points": self.victory_points,
+            "soldiers": self.soldiers,
+        }
 
     # TODO make static method
     def fromDict(self, d):
-        self.messages = []
         self.name = d["name"]
         self.has_kings_favor_bonus_die = d["has_kings_favor_bonus_die"]
         self.has_kings_envoy = d["has_kings_envoy"]
+        self.used_kings_envoy = d["used_kings_envoy"]
         self.plustwo_tokens = d["plustwo_tokens"]
         self.used_plustwo_token = d["used_plustwo_token"]
         self.used_market = d["used_market"]
-        self.buildings = d["buildings"]
+        self.building_mask = sum(BUILDING_BIT[building] for building in d["buildings"])
         self.resources = d["resources"]
         self.victory_points = d["victory_points"]
         self.soldiers = d["soldiers"]
-        self.dice = ProductiveSeasonRoll(
-            player_dice=d["dice"]["player_dice"],
-            bonus_dice=d["dice"]["bonus_dice"],
-        )
+        self.dice = ProductiveSeasonRoll.fromDict(d["dice"])
+        self.zhash = None
         return self
 
     def copy(self) -> PlayerState:
-        return copy.deepcopy(self)
-
-    def message(self, message: str) -> PlayerState:
-        state = self.copy()
-        state.messages.append(self.name + " " + message)
+        """
+        Returns a shallow copy of this player. See State.copy.
+        """
+        state = PlayerState.__new__(PlayerState)
+        state.sink = self.sink
+        state.name = self.name
+        state.has_kings_favor_bonus_die = self.has_kings_favor_bonus_die
+        state.has_kings_envoy = self.has_kings_envoy
+        state.used_kings_envoy = self.used_kings_envoy
+        state.plustwo_tokens = self.plustwo_tokens
+        state.used_plustwo_token = self.used_plustwo_token
+        state.used_market = self.used_market
+        state.building_mask = self.building_mask
+        state.resources = self.resources
+        state.dice = self.dice
+        state.victory_points = self.victory_points
+        state.soldiers = self.soldiers
+        # Unknown until a transition sets it, as with State.copy.
+        state.zhash = None
         return state
 
-    def clearMessages(self) -> List[str]:
-        messages = self.messages
-        self.messages = []
-        return messages
-
     def addVictoryPoints(self, victory_points: int) -> PlayerState:
         """
         Adds the given victory points to the player.
         """
         state = self.copy()
         state.victory_points += victory_points
-        if victory_points >= 0:
-            state = state.message("gains +" + str(victory_points) + " victory points")
-        else:
-            state = state.message("loses -" + str(victory_points) + " victory points")
+        state.zhash = zobrist_swap(self.zhash, self.name, "victory_points", self.victory_points, state.victory_points)
+        self.sink.emit(events.EVENT_VICTORY_POINTS, self.name, victory_points)
         return state
 
     def addSoldiers(self, soldiers: int) -> PlayerState:
@@ -761,10 +1568,8 @@ class PlayerState():
         """
         state = self.copy()
         state.soldiers += soldiers
-        if soldiers >= 0:
-            state = state.message("gains +" + str(soldiers) + " soldiers")
-        else:
-            state = state.message("loses -" + str(soldiers) + " soldiers")
+        state.zhash = zobrist_swap(self.zhash, self.name, "soldiers", self.soldiers, state.soldiers)
+        self.sink.emit(events.EVENT_SOLDIERS, self.name, soldiers)
         return state
 
     def addResources(self, resources: ResourceInventory) -> PlayerState:
@@ -772,38 +1577,41 @@ class PlayerState():
         Adds the given resources to this player's resources.
         """
         state = self.copy()
+        state.resources = dict(self.resources)
+        state.zhash = self.zhash
         for resource in resources:
             amount = resources[resource]
-            if amount > 0:
-                state = state.message("gains +" + str(amount) + " " + resource)
-            else:
-                state = state.message("loses " + str(amount) + " " + resource)
-            state.resources[resource] += resources[resource]
+            self.sink.emit(events.EVENT_RESOURCE, self.name, amount, resource)
+            old = state.resources[resource]
+            state.resources[resource] += amount
+            state.zhash = zobrist_swap(state.zhash, self.name, "resource", (resource, old), (resource, old + amount))
         return state
 
-    def addBuilding(self, building: Building, player_advisors: List[AdvisorScore]) -> PlayerState:
+    def addBuilding(self, building: Building, player_advisors: Union[List[AdvisorScore], int]) -> PlayerState:
         """
         Adds the given building to this player's buildings.
         Subtract the cost of the building from the player's resources.
         Give the player victory points for the building.
         Special rule for buying Stable.
+
+        player_advisors are the advisors this player influenced this
+        season, as a list of scores or an advisor mask.
         """
-        if building in self.buildings:
-            raise Exception("Adding an already-owned building")
         state = self.copy()
+        state.zhash = self.zhash
         if building == BUILD_PASS:
-            return state.message("passes")
-        state = state.message("gains building " + building)
-        state.buildings.append(building)
+            self.sink.emit(events.EVENT_BUILD_PASS, self.name)
+            return state
+        if self.building_mask & BUILDING_BIT[building]:
+            raise Exception("Adding an already-owned building")
+        self.sink.emit(events.EVENT_BUILDING, self.name, building)
+        state.building_mask = self.building_mask | BUILDING_BIT[building]
+        state.zhash = zobrist_swap(self.zhash, self.name, "building_mask", self.building_mask, state.building_mask)
         state = state.addResources(BUILDING_COST[building])
         state = state.addVictoryPoints(BUILDING_VP[building])
-        if building == BUILDING_STABLE:
-            for advisor in ADVISORS_STABLE:
-                if advisor in player_advisors:
-                    state = state.message("Stable gives +1 solidier when influencing an advisor giving you at least 1 soldier")
-                    state = state.addSoldiers(1)
-                    break
-            pass
+        if building == BUILDING_STABLE and advisor_mask(player_advisors) & ADVISORS_STABLE_MASK:
+            self.sink.emit(events.EVENT_STABLE, self.name)
+            state = state.addSoldiers(1)
         return state
 
     def addKingsFavorBonusDie(self) -> PlayerState:
@@ -811,32 +1619,36 @@ class PlayerState():
         Adds a bonus die to this player.
         """
         state = self.copy()
-        state = state.message("gains King's Favor bonus die")
+        self.sink.emit(events.EVENT_KINGS_FAVOR_BONUS_DIE, self.name)
         state.has_kings_favor_bonus_die = True
+        state.zhash = zobrist_swap(self.zhash, self.name, "has_kings_favor_bonus_die", self.has_kings_favor_bonus_die, True)
         return state
 
     def influenceAdvisor(self, influence: AdvisorInfluence) -> PlayerState:
         # TODO test
-        state = self.copy()
         score = influence.advisorScore()
-        state = state.message("influences " + ADVISOR[score].name + " (" + str(score) + ")")
-        state = state.spendDice(influence)
-        return state
+        self.sink.emit(events.EVENT_INFLUENCE, self.name, score)
+        return self.spendDice(influence)
 
     def spendDice(self, influence: AdvisorInfluence) -> PlayerState:
         state = self.copy()
-        state = state.message("spends player dice: " + str(influence.player_dice))
-        state.dice.player_dice = util.list_minus(state.dice.player_dice, influence.player_dice)
+        self.sink.emit(events.EVENT_SPEND_PLAYER_DICE, self.name, influence.player_dice)
+        bonus_counts = self.dice.bonus_counts
         if len(influence.bonus_dice) > 0:
-            state = state.message("spends bonus dice: " + str(influence.bonus_dice))
-            state.dice.bonus_dice = util.list_minus(state.dice.bonus_dice, influence.bonus_dice)
+            self.sink.emit(events.EVENT_SPEND_BONUS_DICE, self.name, influence.bonus_dice)
+            bonus_counts = dice_minus(bonus_counts, influence.bonus_dice)
+        state.dice = ProductiveSeasonRoll.fromCounts(
+            dice_minus(self.dice.player_counts, influence.player_dice),
+            bonus_counts,
+        )
+        state.zhash = zobrist_swap(self.zhash, self.name, "dice",
+            (self.dice.player_counts, self.dice.bonus_counts), (state.dice.player_counts, state.dice.bonus_counts))
         if influence.plus_two:
-            state = state.message("spends a plustwo")
+            self.sink.emit(events.EVENT_SPEND_PLUSTWO, self.name)
             state.plustwo_tokens -= 1
-        if influence.market_modifier == -1:
-            state = state.message("uses market -1")
-        if influence.market_modifier == 1:
-            state = state.message("uses market +1")
+            state.zhash = zobrist_swap(state.zhash, self.name, "plustwo_tokens", self.plustwo_tokens, state.plustwo_tokens)
+        if influence.market_modifier != 0:
+            self.sink.emit(events.EVENT_MARKET, self.name, influence.market_modifier)
         return state
 
     def applyReward(self, reward: Reward) -> PlayerState:
@@ -844,15 +1656,15 @@ class PlayerState():
         Applies the given reward to this player.
         """
         state = self.copy()
+        state.zhash = self.zhash
         if reward.victory_points != 0:
             state = state.addVictoryPoints(reward.victory_points)
         state = state.addResources(reward.resources)
         if reward.soldiers != 0:
             state = state.addSoldiers(reward.soldiers)
-        if reward.plustwos < 0:
-            state = state.message("loses " + str(reward.plustwos) + " plustwo tokens")
-        elif reward.plustwos > 0:
-            state = state.message("gains +" + str(reward.plustwos) + " plustwo tokens")
+        if reward.plustwos != 0:
+            self.sink.emit(events.EVENT_PLUSTWOS, self.name, reward.plustwos)
+        state.zhash = zobrist_swap(state.zhash, self.name, "plustwo_tokens", state.plustwo_tokens, state.plustwo_tokens + reward.plustwos)
         state.plustwo_tokens += reward.plustwos
         # TODO view enemy
         return state
@@ -875,10 +1687,13 @@ class PlayerState():
         num = 0
         if self.has_kings_favor_bonus_die:
             num += 1
-        if BUILDING_FARMS in self.buildings:
+        if self.building_mask & BUILDING_BIT[BUILDING_FARMS]:
             num += 1
         return num
 
+    def getNumBuildings(self) -> int:
+        return building_count(self.building_mask)
+
     def getTotalResources(self) -> int:
         return self.resources[RESOURCE_GOLD] + self.resources[RESOURCE_WOOD] + self.resources[RESOURCE_STONE]
 
@@ -888,12 +1703,12 @@ class PlayerState():
         Resets bonus die.
         """
         state = self.copy()
-        state.dice = copy.deepcopy(roll)
+        state.dice = roll
         state.has_kings_favor_bonus_die = False
-        message = "rolled player dice: " + ", ".join([str(die) for die in roll.player_dice])
-        if len(roll.bonus_dice) > 0:
-            message += ", bonus dice: " + ", ".join([str(die) for die in roll.bonus_dice])
-        state = state.message(message)
+        state.zhash = zobrist_swap(self.zhash, self.name, "dice",
+            (self.dice.player_counts, self.dice.bonus_counts), (roll.player_counts, roll.bonus_counts))
+        state.zhash = zobrist_swap(state.zhash, self.name, "has_kings_favor_bonus_die", self.has_kings_favor_bonus_die, False)
+        self.sink.emit(events.EVENT_ROLL, self.name, roll.player_counts, roll.bonus_counts)
         return state
 
     def useKingsEnvoy(self):
@@ -901,80 +1716,68 @@ class PlayerState():
             raise Exception("Cannot use King's Envoy")
         state = self.copy()
         state.has_kings_envoy = False
-        return state.message("loses King's Envoy")
+        state.zhash = zobrist_swap(self.zhash, self.name, "has_kings_envoy", self.has_kings_envoy, False)
+        self.sink.emit(events.EVENT_LOSE_KINGS_ENVOY, self.name)
+        return state
 
-    def choices__advisorInfluence(self, available: List[AdvisorScore]) -> List[AdvisorInfluence]:
+    def choices__advisorInfluence(self, available: Union[List[AdvisorScore], int]) -> List[AdvisorInfluence]:
         """
         Returns the possible advisor influences this player could make.
         Does not compute all possible rewards.
+
+        available is the list or mask of advisors not yet influenced.
         """
-        # Determine available market modifiers.
-        market_modifiers: List[int] = []
-        if not self.used_market and BUILDING_MARKET in self.buildings:
-            market_modifiers = [-1, 1]
-
-        # Determine available plustwo modifiers.
-        plustwos: List[int] = []
-        if not self.used_plustwo_token and self.plustwo_tokens > 0:
-            plustwos = [1]
-
-        # Determine all unique combinations of each component.
-        player_dice_combos = util.unique_combinations(self.dice.player_dice)
-        bonus_dice_combos = util.unique_combinations(self.dice.bonus_dice)
-        plustwo_combos = util.unique_combinations(plustwos)
-        market_combos = util.unique_combinations(market_modifiers, 1)
-
-        # Determine all possible moves.
-        all_possible_moves = util.unique_list_pairs(
-            util.unique_list_pairs(
-                util.unique_list_pairs(player_dice_combos, bonus_dice_combos),
-                plustwo_combos
-            ),
-            market_combos
+        candidates = advisor_influence_candidates(
+            self.dice.player_counts,
+            self.dice.bonus_counts,
+            not self.used_plustwo_token and self.plustwo_tokens > 0,
+            not self.used_market and bool(self.building_mask & BUILDING_BIT[BUILDING_MARKET]),
         )
 
-        # Determine valid influences. Start with only the "Pass" influence.
+        # Start with only the "Pass" influence.
         possible_influences: List[AdvisorInfluence] = [ADVISOR_INFLUENCE_PASS]
-        for move in all_possible_moves:
-            player_dice: DiceRoll = move[0][0][0]
-            bonus_dice: DiceRoll = move[0][0][1]
-            plustwo: bool = len(move[0][1]) > 0
-            market_modifier: int = move[1][0] if len(move[1]) > 0 else 0
-            influence = AdvisorInfluence(player_dice, bonus_dice, plustwo, market_modifier)
-            score = influence.advisorScore()
-            # Can't score below 1 or above 18.
-            if score < 1 or score > ADVISOR_MAX:
-                continue
-            # Must use at least one player die.
-            if len(influence.player_dice) == 0:
-                continue
-            # If the player has the king's envoy and has not used it
-            # yet, they can influence already-influenced advisors
-            # Otherwise, in order for the move to be valid, it must be
-            # in the list of available advisors.
-            if (not self.has_kings_envoy or self.used_kings_envoy) and score not in available:
-                continue
-            possible_influences.append(influence)
+
+        # If the player has the king's envoy and has not used it
+        # yet, they can influence already-influenced advisors
+        # Otherwise, in order for the move to be valid, it must be
+        # in the list of available advisors.
+        if self.has_kings_envoy and not self.used_kings_envoy:
+            possible_influences.extend([influence for _, influence in candidates])
+        else:
+            available_mask = advisor_mask(available)
+            possible_influences.extend([influence for bit, influence in candidates if available_mask & bit])
 
         return possible_influences
 
+    def legalActionMask(self, available: Union[List[AdvisorScore], int]) -> int:
+        """
+        Returns choices__advisorInfluence as a bitmask of action IDs.
+
+        available is the list or mask of advisors not yet influenced.
+        """
+        masks = advisor_action_masks(
+            self.dice.player_counts,
+            self.dice.bonus_counts,
+            not self.used_plustwo_token and self.plustwo_tokens > 0,
+            not self.used_market and bool(self.building_mask & BUILDING_BIT[BUILDING_MARKET]),
+        )
+
+        mask = 1 << ACTION_PASS
+        # The king's envoy allows influencing advisors that are already taken.
+        if self.has_kings_envoy and not self.used_kings_envoy:
+            available_mask = ADVISORS_MASK
+        else:
+            available_mask = advisor_mask(available)
+        for score in ADVISORS:
+            if available_mask & ADVISOR_BIT[score]:
+                mask |= masks[score]
+        return mask
+
     def choices__buildings(self) -> List[Building]:
         """
         Returns the list of buildings this player can buy.
         """
-        buildings: List[Building] = []
-        for row in PROVINCE_SHEET:
-            for building in row:
-                if building in self.buildings:
-                    continue
-                after_buying = self.addResources(BUILDING_COST[building])
-                if after_buying.resources[RESOURCE_GOLD] < 0:
-                    break
-                if after_buying.resources[RESOURCE_WOOD] < 0:
-                    break
-                if after_buying.resources[RESOURCE_STONE] < 0:
-                    break
-                buildings.append(building)
-                break
+        available = building_frontier(self.building_mask) & buildings_affordable(self.resources)
+        buildings = [building for building in BUILDINGS if available & BUILDING_BIT[building]]
         buildings.append(BUILD_PASS)
         return buildings
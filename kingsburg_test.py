@@ -1,5 +1,10 @@
+import json
+import random
 from typing import List
 
+import pytest
+
+import events
 import kingsburg
 
 ##############################################
@@ -49,6 +54,13 @@ def test_choices_rewards():
     got = advisor.choices__rewards({})
     assert got == expected
 
+def test_reward_dict_roundtrip():
+    reward = kingsburg.Reward(victory_points=3, resources={kingsburg.RESOURCE_GOLD: 2}, view_enemy=True)
+    got = kingsburg.Reward.fromDict(json.loads(json.dumps(reward.toDict())))
+    assert got == reward
+    assert hash(got) == hash(reward)
+    assert kingsburg.Reward.fromDict(None) is None
+
 ##############################################
 # Die
 ##############################################
@@ -57,6 +69,13 @@ def test_productive_season_roll_total():
     roll = kingsburg.ProductiveSeasonRoll([1, 2, 3], [4])
     assert roll.totalValue() == 10
 
+def test_advisor_influence_dict_roundtrip():
+    influence = kingsburg.AdvisorInfluence([1, 2], [4], plus_two=True, market_modifier=-1)
+    got = kingsburg.AdvisorInfluence.fromDict(json.loads(json.dumps(influence.toDict())))
+    assert got == influence
+    assert hash(got) == hash(influence)
+    assert got != kingsburg.ADVISOR_INFLUENCE_PASS
+
 def test_advisor_influence_score():
     influence = kingsburg.AdvisorInfluence(
         [1, 2, 3],
@@ -101,6 +120,62 @@ def test_next_phase():
     assert state.phase == kingsburg.MAX_PHASE
     assert state.over
 
+def test_state_dict_roundtrip():
+    state = kingsburg.State() \
+        .setPlayers(["fred", "george"]) \
+        .takeFreeResource("fred", kingsburg.RESOURCE_GOLD) \
+        .productiveSeasonRolls({
+            "fred": kingsburg.ProductiveSeasonRoll([1, 2, 3], []),
+            "george": kingsburg.ProductiveSeasonRoll([3, 4, 5], [6]),
+        }) \
+        .influenceAdvisor("fred", kingsburg.AdvisorInfluence([1], []))
+    d = state.toDict()
+    got = kingsburg.State().fromDict(json.loads(json.dumps(d)))
+    assert got.toDict() == d
+
+def test_transitions_share_untouched_state():
+    state = kingsburg.State().setPlayers(["fred", "george"])
+    new_state = state \
+        .takeFreeResource("fred", kingsburg.RESOURCE_GOLD) \
+        .influenceAdvisor("fred", kingsburg.AdvisorInfluence([1], []))
+
+    # The original state is left untouched.
+    assert state.players["fred"].resources[kingsburg.RESOURCE_GOLD] == 0
+    assert state.taken_advisors == {}
+
+    # Only the touched player is copied.
+    assert new_state.players["fred"] is not state.players["fred"]
+    assert new_state.players["george"] is state.players["george"]
+    assert new_state.turn_order is state.turn_order
+
+def test_influence_advisor__masks():
+    state = kingsburg.State().setPlayers(["fred", "george"])
+    state = state \
+        .influenceAdvisor("fred", kingsburg.AdvisorInfluence([1], [])) \
+        .influenceAdvisor("george", kingsburg.AdvisorInfluence([2, 3], []))
+    assert state.taken_mask == kingsburg.advisor_mask([kingsburg.ADVISOR_JESTER, kingsburg.ADVISOR_SERGEANT])
+    assert state.player_advisor_masks == {
+        "fred": kingsburg.ADVISOR_BIT[kingsburg.ADVISOR_JESTER],
+        "george": kingsburg.ADVISOR_BIT[kingsburg.ADVISOR_SERGEANT],
+    }
+
+    got = kingsburg.State().fromDict(json.loads(json.dumps(state.toDict())))
+    assert got.taken_mask == state.taken_mask
+    assert got.player_advisor_masks == state.player_advisor_masks
+
+    state = state.clearAdvisorInfluences()
+    assert state.taken_mask == 0
+    assert state.player_advisor_masks == {}
+
+def test_give_building__stable():
+    state = kingsburg.State() \
+        .setPlayers(["fred", "george"]) \
+        .influenceAdvisor("fred", kingsburg.AdvisorInfluence([5], [])) \
+        .giveBuilding("fred", kingsburg.BUILDING_STABLE, False) \
+        .giveBuilding("george", kingsburg.BUILDING_STABLE, False)
+    assert state.players["fred"].soldiers == 1
+    assert state.players["george"].soldiers == 0
+
 def test_take_free_resource():
     state = kingsburg \
         .State() \
@@ -188,7 +263,7 @@ def test_get_winners__buildings():
     state = kingsburg.State().setPlayers(["fred", "george", "ron"])
     state.players["fred"].victory_points = 5
     state.players["fred"].resources[kingsburg.RESOURCE_GOLD] = 1
-    state.players["fred"].buildings.append(kingsburg.BUILDING_STABLE)
+    state.players["fred"].building_mask |= kingsburg.BUILDING_BIT[kingsburg.BUILDING_STABLE]
     state.players["george"].victory_points = 5
     state.players["george"].resources[kingsburg.RESOURCE_GOLD] = 1
     state.players["ron"].victory_points = 5
@@ -199,13 +274,13 @@ def test_get_winners__buildings_tie():
     state = kingsburg.State().setPlayers(["fred", "george", "ron"])
     state.players["fred"].victory_points = 5
     state.players["fred"].resources[kingsburg.RESOURCE_GOLD] = 1
-    state.players["fred"].buildings.append(kingsburg.BUILDING_STABLE)
+    state.players["fred"].building_mask |= kingsburg.BUILDING_BIT[kingsburg.BUILDING_STABLE]
     state.players["george"].victory_points = 5
     state.players["george"].resources[kingsburg.RESOURCE_GOLD] = 1
-    state.players["george"].buildings.append(kingsburg.BUILDING_STABLE)
+    state.players["george"].building_mask |= kingsburg.BUILDING_BIT[kingsburg.BUILDING_STABLE]
     state.players["ron"].victory_points = 5
     state.players["ron"].resources[kingsburg.RESOURCE_GOLD] = 1
-    state.players["ron"].buildings.append(kingsburg.BUILDING_STABLE)
+    state.players["ron"].building_mask |= kingsburg.BUILDING_BIT[kingsburg.BUILDING_STABLE]
     assert state.getWinners() == ["fred", "george", "ron"]
 
 ##############################################
@@ -1103,3 +1178,229 @@ def test_choices_buildings__limited():
         kingsburg.BUILD_PASS,
     ]
     assert choices == expected
+
+def test_buildings_affordable():
+    for gold in range(0, 8):
+        for wood in range(0, 5):
+            for stone in range(0, 5):
+                resources = {kingsburg.RESOURCE_GOLD: gold, kingsburg.RESOURCE_WOOD: wood, kingsburg.RESOURCE_STONE: stone}
+                mask = kingsburg.buildings_affordable(resources)
+                for building in kingsburg.BUILDINGS:
+                    cost = kingsburg.BUILDING_COST[building]
+                    affordable = all(resources[r] + cost[r] >= 0 for r in cost)
+                    assert bool(mask & kingsburg.BUILDING_BIT[building]) == affordable
+
+def test_building_frontier():
+    assert kingsburg.building_frontier(0) == sum(kingsburg.BUILDING_BIT[row[0]] for row in kingsburg.PROVINCE_SHEET)
+
+    mask = kingsburg.BUILDING_BIT[kingsburg.BUILDING_STATUE] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_CHURCH] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_INN] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_MARKET] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_FARMS] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_MERCHANTS_GUILD]
+    expected = kingsburg.BUILDING_BIT[kingsburg.BUILDING_CHAPEL] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_GUARD_TOWER] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_PALISADE] \
+        | kingsburg.BUILDING_BIT[kingsburg.BUILDING_BARRICADE]
+    assert kingsburg.building_frontier(mask) == expected
+
+def test_choices_advisor_influence__matches_generator():
+    for player_dice, bonus_dice in [([1, 2, 3], []), ([2, 2, 5], [3]), ([4, 5, 6], [1, 6])]:
+        for plustwo in [False, True]:
+            for market in [False, True]:
+                player = kingsburg.PlayerState("fred").roll(kingsburg.ProductiveSeasonRoll(player_dice, bonus_dice))
+                if market:
+                    player = player.addBuilding(kingsburg.BUILDING_MARKET, [])
+                if plustwo:
+                    player.plustwo_tokens = 1
+                available = [kingsburg.ADVISOR_JESTER, kingsburg.ADVISOR_MERCHANT, kingsburg.ADVISOR_GENERAL]
+                expected = [kingsburg.ADVISOR_INFLUENCE_PASS] + [
+                    i for i in kingsburg.generate_advisor_influences(player_dice, bonus_dice, plustwo, market)
+                    if i.advisorScore() in available
+                ]
+                assert player.choices__advisorInfluence(available) == expected
+
+def test_dice_counts():
+    roll = kingsburg.ProductiveSeasonRoll([3, 1, 3], [6])
+    assert roll.player_counts == (1, 0, 2, 0, 0, 0)
+    assert roll.bonus_counts == (0, 0, 0, 0, 0, 1)
+    assert roll.player_dice == [1, 3, 3]
+    assert roll == kingsburg.ProductiveSeasonRoll([3, 3, 1], [6])
+    assert kingsburg.dice_minus(roll.player_counts, [3, 1]) == (0, 0, 1, 0, 0, 0)
+    with pytest.raises(ValueError):
+        kingsburg.dice_counts([1, 7])
+
+def test_choices_rewards__shared():
+    advisor = kingsburg.ADVISOR[kingsburg.ADVISOR_SMUGGLER]
+    got = advisor.choices__rewards({kingsburg.RESOURCE_GOLD: 3})
+    assert len(got) == len(kingsburg.RECEIVE_ANY_RESOURCE[3])
+    assert all(r.victory_points == -1 and r.receive_any_resource == 0 for r in got)
+    # Rewards are computed once, not per call.
+    again = advisor.choices__rewards({})
+    assert all(a is b for a, b in zip(got, again))
+
+def test_action_catalog():
+    assert kingsburg.action(kingsburg.ACTION_PASS) == kingsburg.ADVISOR_INFLUENCE_PASS
+    # IDs are stored in datasets, so they must never change.
+    assert len(kingsburg.ACTIONS) == 9487
+    assert kingsburg.action_id(kingsburg.AdvisorInfluence([1], [])) == 1
+    assert kingsburg.action_id(kingsburg.AdvisorInfluence([6, 6, 6], [1], False, -1)) == len(kingsburg.ACTIONS) - 1
+    for i, a in enumerate(kingsburg.ACTIONS):
+        assert kingsburg.action_id(a) == i
+    # Dice order and rewards don't matter.
+    influence = kingsburg.AdvisorInfluence([5, 2], [3], True, -1, kingsburg.Reward(victory_points=1))
+    assert kingsburg.action(kingsburg.action_id(influence)) == kingsburg.AdvisorInfluence([2, 5], [3], True, -1)
+    assert kingsburg.action_ids((1 << 5) | (1 << 0) | (1 << 9000)) == [0, 5, 9000]
+
+def test_legal_action_mask():
+    state = kingsburg.State().setPlayers(["fred", "george"])
+    state = state.productiveSeasonRolls({
+        "fred": kingsburg.ProductiveSeasonRoll([2, 2, 5], [3]),
+        "george": kingsburg.ProductiveSeasonRoll([1, 4, 6], []),
+    })
+    state = state.influenceAdvisor("george", kingsburg.AdvisorInfluence([1, 4], []))
+    for plustwo in [0, 1]:
+        fred = state.players["fred"].addBuilding(kingsburg.BUILDING_MARKET, [])
+        fred.plustwo_tokens = plustwo
+        s = state.updatePlayer("fred", fred)
+        expected = [kingsburg.action_id(i) for i in s.choices__advisorInfluence("fred")]
+        mask = s.legalActionMask("fred")
+        assert kingsburg.action_ids(mask) == sorted(expected)
+        assert not mask & (1 << kingsburg.action_id(kingsburg.AdvisorInfluence([5], [])))
+
+    fred = state.players["fred"].copy()
+    fred.has_kings_envoy = True
+    s = state.updatePlayer("fred", fred)
+    assert s.legalActionMask("fred") & (1 << kingsburg.action_id(kingsburg.AdvisorInfluence([5], [])))
+
+def test_zobrist_hash__incremental(monkeypatch):
+    monkeypatch.setattr(kingsburg, "DEBUG_ZOBRIST", True)
+    rng = random.Random(7)
+    state = kingsburg.State().setPlayers(["fred", "george", "ron"])
+    state.zobristHash()
+
+    def check(s):
+        assert s.zhash is not None
+        assert s.zhash == s.computeZobristHash()
+        for p in s.playerList():
+            assert p.zhash is None or p.zhash == p.computeZobristHash()
+        return s
+
+    for year in range(0, 2):
+        result = state.kingsFavor()
+        if result == kingsburg.KINGS_FAVOR_TIE:
+            result = state.takeFreeResource("fred", kingsburg.RESOURCE_WOOD)
+        state = check(result)
+        state = check(state.nextPhase())
+        rolls = {name: kingsburg.ProductiveSeasonRoll([rng.randint(1, 6) for i in range(0, 3)], [rng.randint(1, 6)]) for name in state.players}
+        state = check(state.productiveSeasonRolls(rolls))
+        for name in state.turn_order:
+            state = check(state.influenceAdvisor(name, rng.choice(state.choices__advisorInfluence(name))))
+        for score in list(state.taken_advisors):
+            for name in state.taken_advisors[score]:
+                rewards = kingsburg.ADVISOR[score].choices__rewards(state.players[name].resources)
+                if len(rewards) > 0:
+                    state = check(state.giveReward(name, score, rng.choice(rewards)))
+        for name in state.turn_order:
+            state = check(state.giveBuilding(name, rng.choice(state.choices__buildings(name)), False))
+        state = check(state.clearAdvisorInfluences())
+        state = check(state.phaseComplete(kingsburg.PHASES[state.phase]))
+        for phase in range(state.phase, kingsburg.MAX_PHASE+1):
+            state = check(state.nextPhase())
+
+def test_zobrist_hash__transpositions():
+    state = kingsburg.State().setPlayers(["fred", "george"])
+    state = state.productiveSeasonRolls({
+        "fred": kingsburg.ProductiveSeasonRoll([1, 2, 3], []),
+        "george": kingsburg.ProductiveSeasonRoll([4, 5, 6], []),
+    })
+    fred = kingsburg.AdvisorInfluence([1, 2], [])
+    george = kingsburg.AdvisorInfluence([6], [])
+
+    a = state.influenceAdvisor("fred", fred).influenceAdvisor("george", george)
+    b = state.influenceAdvisor("george", george).influenceAdvisor("fred", fred)
+    assert a is not b
+    assert a == b
+    assert hash(a) == hash(b)
+    assert len({a, b}) == 1
+
+    # The sink is not part of the position.
+    assert a.withSink(events.ListEventSink()) == a
+
+    c = state.influenceAdvisor("fred", kingsburg.AdvisorInfluence([3], [])).influenceAdvisor("george", george)
+    assert a != c
+    assert hash(a) != hash(c)
+
+    # Hashes don't depend on how a state was built.
+    assert kingsburg.State().fromDict(a.toDict()).zobristHash() == a.zobristHash()
+
+def random_moves(state, rng):
+    # Every move that can be made from state, for any player.
+    moves = []
+    for name in state.turn_order:
+        moves.append((kingsburg.MOVE_RESOURCE, name, rng.choice(kingsburg.RESOURCES)))
+        for influence in state.choices__advisorInfluence(name):
+            moves.append((kingsburg.MOVE_INFLUENCE, name, influence))
+        for building in state.choices__buildings(name):
+            moves.append((kingsburg.MOVE_BUILDING, name, building, state.players[name].has_kings_envoy))
+    for score in state.taken_advisors:
+        for name in state.taken_advisors[score]:
+            for reward in kingsburg.ADVISOR[score].choices__rewards(state.players[name].resources):
+                moves.append((kingsburg.MOVE_REWARD, name, score, reward))
+    rolls = {name: kingsburg.ProductiveSeasonRoll([rng.randint(1, 6) for i in range(0, 3)], [rng.randint(1, 6)]) for name in state.players}
+    moves.append((kingsburg.MOVE_ROLL, rolls))
+    return moves
+
+def test_apply_undo():
+    rng = random.Random(11)
+    for game in range(0, 20):
+        state = kingsburg.State().setPlayers(["fred", "george", "ron"]).mutable()
+        state.zobristHash()
+        # Walk down a random line of play, checking each move matches the
+        # functional transition, then take every move back.
+        history = []
+        for depth in range(0, 30):
+            move = rng.choice(random_moves(state, rng))
+            # The functional result shares parts with the mutable state,
+            # so keep what it looked like before applying the move.
+            expected = state.move(move)
+            expected_dict, expected_hash = expected.toDict(), expected.zobristHash()
+            before = (state.toDict(), state.zobristHash(), state.taken_mask, dict(state.player_advisor_masks))
+            record = state.apply(move)
+            assert state.toDict() == expected_dict
+            assert state.zobristHash() == expected_hash
+            assert state.zhash == state.computeZobristHash()
+            for p in state.playerList():
+                assert p.zhash is None or p.zhash == p.computeZobristHash()
+            history.append(before + (record,))
+        while len(history) > 0:
+            d, h, taken_mask, player_advisor_masks, record = history.pop()
+            state.undo(record)
+            assert state.toDict() == d
+            assert state.zobristHash() == h
+            assert state.zhash == state.computeZobristHash()
+            assert state.taken_mask == taken_mask
+            assert state.player_advisor_masks == player_advisor_masks
+
+def test_apply__leaves_other_states_alone():
+    state = kingsburg.State().setPlayers(["fred", "george"])
+    state = state.productiveSeasonRolls({
+        "fred": kingsburg.ProductiveSeasonRoll([1, 2, 3], []),
+        "george": kingsburg.ProductiveSeasonRoll([4, 5, 6], []),
+    })
+    move = (kingsburg.MOVE_INFLUENCE, "fred", kingsburg.AdvisorInfluence([1, 2], []))
+    with pytest.raises(Exception):
+        state.copy().apply(move)
+
+    before = state.toDict()
+    search = state.mutable()
+    record = search.apply(move)
+    assert search.taken_advisors == {3: ["fred"]}
+    assert search.players["fred"].dice.player_dice == [3]
+    assert state.toDict() == before
+    with pytest.raises(Exception):
+        search.copy().undo(record)
+    assert search.taken_advisors == {3: ["fred"]}
+    search.undo(record)
+    assert search == state
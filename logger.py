@@ -1,6 +1,7 @@
 from typing import Union, List
-import collections
+import collections.abc
 
+import events
 import kingsburg
 
 class Logger():
@@ -8,7 +9,15 @@ class Logger():
     Logs game state.
     """
 
-    def log(self, state: kingsburg.State, message: Union[str, List[str], None]=None):
+    def eventSink(self) -> events.EventSink:
+        """
+        Returns the sink game events should be sent to. Loggers which
+        never look at events get the null sink, so games logged with
+        them never build any events at all.
+        """
+        return events.NULL_SINK
+
+    def log(self, state: kingsburg.State, message: Union[str, List[events.Event], None]=None):
         pass
 
     def start(self, state: kingsburg.State):
@@ -29,6 +38,9 @@ class StdoutLogger(Logger):
     Logs to stdout.
     """
 
+    def eventSink(self):
+        return events.ListEventSink()
+
     def startLog(self):
         print("")
         self.divider()
@@ -43,8 +55,8 @@ class StdoutLogger(Logger):
         self.startLog()
         if isinstance(message, str):
             print("> " + message)
-        elif isinstance(message, collections.Iterable) and len(message) > 0:
-            print("\n".join(["> " + m for m in message]))
+        elif isinstance(message, collections.abc.Iterable) and len(message) > 0:
+            print("\n".join(["> " + str(m) for m in message]))
         self.endLog()
 
     def start(self, state):
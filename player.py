@@ -1,13 +1,14 @@
 import random
-from typing import List, Optional
-
-import keras
-import numpy
+import time
+from typing import Any, List, Optional
 
+import events
 import kingsburg
-import training
 import util
 
+# numpy, training and inference are imported by the neural players only,
+# so that games between random players never load them.
+
 class Player():
     """
     Makes decisions based on game state.
@@ -31,6 +32,13 @@ class Player():
     def chooseBuilding(self, state: kingsburg.State, choices: List[kingsburg.Building], use_kings_envoy: bool) -> kingsburg.Building:
         raise NotImplementedError
 
+    def close(self):
+        """
+        Releases anything the player holds. Engines call this once the game
+        is over.
+        """
+        pass
+
 class CliPlayer(Player):
     """
     A player which asks for choices via CLI.
@@ -54,6 +62,9 @@ class CliPlayer(Player):
             bdice = rolls.split()
         if len(pdice) != numpdice or len(bdice) != numbdice:
             return self.rollDice(state)
+        if not all(die.isdigit() and 1 <= int(die) <= kingsburg.DIE_FACES for die in pdice + bdice):
+            print("Dice must be numbers from 1 to " + str(kingsburg.DIE_FACES))
+            return self.rollDice(state)
         return kingsburg.ProductiveSeasonRoll(
             player_dice=[int(die) for die in pdice],
             bonus_dice=[int(die) for die in bdice]
@@ -75,18 +86,26 @@ class RandomPlayer(Player):
     """
     A player which makes completely random choices.
     Dice rolls are randomly generated.
+
+    Randomness comes from the global random module unless an rng
+    (a random.Random) is given, which makes games reproducible.
     """
 
+    def __init__(self, name, rng: Optional[random.Random]=None):
+        Player.__init__(self, name)
+        # The random module has the same methods as random.Random.
+        self.rng: Any = rng if rng is not None else random
+
     def pickFreeResource(self, state):
-        return random.choice(state.choices_freeResource(self.name))
+        return self.rng.choice(state.choices_freeResource(self.name))
 
     def rollDice(self, state: kingsburg.State) -> kingsburg.ProductiveSeasonRoll:
         pdice: List[int] = []
         bdice: List[int] = []
         for i in range(0, state.getNumPlayerDice(self.name)):
-            pdice.append(random.randint(1, 6))
+            pdice.append(self.rng.randint(1, 6))
         for i in range(0, state.getNumBonusDice(self.name)):
-            bdice.append(random.randint(1, 6))
+            bdice.append(self.rng.randint(1, 6))
         return kingsburg.ProductiveSeasonRoll(
             player_dice=pdice,
             bonus_dice=bdice
@@ -98,15 +117,15 @@ class RandomPlayer(Player):
         choices = state.choices__advisorInfluence(self.name)
         if len(choices) == 1:
             return choices[0]
-        if random.randint(0, 100) > 95:
+        if self.rng.randint(0, 100) > 95:
             return kingsburg.ADVISOR_INFLUENCE_PASS
         choices = [c for c in choices if c != kingsburg.ADVISOR_INFLUENCE_PASS]
-        return random.choice(choices)
+        return self.rng.choice(choices)
 
     def chooseReward(self, state: kingsburg.State, advisorScore: kingsburg.AdvisorScore, possible_rewards: List[kingsburg.Reward]) -> Optional[kingsburg.Reward]:
         if len(possible_rewards) == 0:
             return None
-        return random.choice(possible_rewards)
+        return self.rng.choice(possible_rewards)
 
     def chooseBuilding(self, state: kingsburg.State, choices: List[kingsburg.Building], use_kings_envoy: bool) -> kingsburg.Building:
         # Give a bias towards not passing.
@@ -114,95 +133,178 @@ class RandomPlayer(Player):
         choices = state.choices__buildings(self.name)
         if len(choices) == 1:
             return choices[0]
-        if random.randint(0, 100) > 95:
+        if self.rng.randint(0, 100) > 95:
             return kingsburg.BUILD_PASS
         choices = [c for c in choices if c != kingsburg.BUILD_PASS]
-        return random.choice(choices)
+        return self.rng.choice(choices)
+
+class ModelPlayer(RandomPlayer):
+    """
+    A player whose decisions come from self.model, acquired from
+    inference.REGISTRY under filename unless a model is given. Models
+    passed in are left to their owner.
+    """
+
+    def __init__(self, name, filename: str, model=None):
+        RandomPlayer.__init__(self, name)
+        self.filename = filename
+        self.acquired = model is None
+        if model is None:
+            import inference
+            model = inference.REGISTRY.acquire(filename)
+        self.model = model
 
-class GovAlphaPlayer(RandomPlayer):
+    def close(self):
+        """
+        Releases the model, so it can be evicted from inference.REGISTRY.
+        Closing again does nothing.
+        """
+        if self.acquired:
+            import inference
+            inference.REGISTRY.release(self.filename)
+            self.acquired = False
+
+class GovAlphaPlayer(ModelPlayer):
     """
     The Governor.
     The very first version where I was just messing around.
+
+    If table_size is given, predictions are cached by state hash in a
+    transposition.TranspositionTable of that many entries, so states
+    reached again are not scored twice. Each player owns its table, as
+    scores from one model mean nothing to another.
+
+    The model is loaded from filename through inference.REGISTRY, unless
+    a model is given. Anything with predict will do, such as an
+    inference.BatchingPredictor shared by players in concurrent games.
+
+    encoding is the training.ENCODING_* the model was trained with.
     """
 
-    def __init__(self, name, filename):
-        Player.__init__(self, name)
-        self.model = keras.models.load_model(filename)
+    def __init__(self, name, filename, table_size: Optional[int]=None, model=None, encoding: int=1):
+        ModelPlayer.__init__(self, name, filename, model)
+        import transposition
+        self.table = None if table_size is None else transposition.TranspositionTable(table_size)
+        self.encoding = encoding
+        self.latencies: List[float] = []
 
     def pickFreeResource(self, state: kingsburg.State) -> str:
+        start = time.perf_counter()
+        # Look ahead silently so hypothetical moves stay out of the game log.
+        state = state.withSink(events.NULL_SINK)
         choices = state.choices_freeResource(self.name)
-        scored_choices = []
-        for c in choices:
-            new_state = state.takeFreeResource(self.name, c)
-            inp = training.state_to_input(new_state)
-            prediction = self.model.predict(numpy.asarray([inp]))[0][0]
-            scored_choices.append((prediction, c))
-        print(str(scored_choices))
-        chosen = util.pick_best(scored_choices)
-        print("Score: " + str(chosen[0]))
-        return chosen[1]
+        new_states = [state.takeFreeResource(self.name, c) for c in choices]
+        return self.pickBest(choices, new_states, start)
 
     def chooseAdvisor(self, state: kingsburg.State) -> kingsburg.AdvisorInfluence:
+        start = time.perf_counter()
+        state = state.withSink(events.NULL_SINK)
         choices = state.choices__advisorInfluence(self.name)
-        scored_choices = []
-        for c in choices:
-            new_state = state.influenceAdvisor(self.name, c)
-            inp = training.state_to_input(new_state)
-            prediction = self.model.predict(numpy.asarray([inp]))[0][0]
-            scored_choices.append((prediction, c))
-        print(str(scored_choices))
-        chosen = util.pick_best(scored_choices)
-        print("Score: " + str(chosen[0]))
-        return chosen[1]
+        new_states = [state.influenceAdvisor(self.name, c) for c in choices]
+        return self.pickBest(choices, new_states, start)
 
     def chooseReward(self, state: kingsburg.State, advisorScore: kingsburg.AdvisorScore, possible_rewards: List[kingsburg.Reward]) -> Optional[kingsburg.Reward]:
-        scored_choices = []
-        for c in possible_rewards:
-            new_state = state.giveReward(self.name, advisorScore, c)
-            inp = training.state_to_input(new_state)
-            prediction = self.model.predict(numpy.asarray([inp]))[0][0]
-            scored_choices.append((prediction, c))
-        print(str(scored_choices))
-        chosen = util.pick_best(scored_choices)
-        print("Score: " + str(chosen[0]))
-        return chosen[1]
+        start = time.perf_counter()
+        state = state.withSink(events.NULL_SINK)
+        new_states = [state.giveReward(self.name, advisorScore, c) for c in possible_rewards]
+        return self.pickBest(possible_rewards, new_states, start)
 
     def chooseBuilding(self, state: kingsburg.State, choices: List[kingsburg.Building], use_kings_envoy: bool) -> kingsburg.Building:
-        scored_choices = []
-        for c in choices:
-            new_state = state.giveBuilding(self.name, c, use_kings_envoy)
-            inp = training.state_to_input(new_state)
-            prediction = self.model.predict(numpy.asarray([inp]))[0][0]
-            scored_choices.append((prediction, c))
+        start = time.perf_counter()
+        state = state.withSink(events.NULL_SINK)
+        new_states = [state.giveBuilding(self.name, c, use_kings_envoy) for c in choices]
+        return self.pickBest(choices, new_states, start)
+
+    def pickBest(self, choices: List[Any], new_states: List[kingsburg.State], start: float) -> Any:
+        """
+        Scores the state each choice leads to with one predict call and
+        returns the best choice. start is when the decision began, used to
+        report its latency.
+        """
+        import training
+        if self.table is None:
+            predictions = list(self.model.predict(training.encode_states(new_states, self.encoding))[:, 0])
+        else:
+            keys = [s.zobristHash() for s in new_states]
+            predictions = [self.table.get(k) for k in keys]
+            missing = [i for i, p in enumerate(predictions) if p is None]
+            if len(missing) > 0:
+                scores = self.model.predict(training.encode_states([new_states[i] for i in missing], self.encoding))[:, 0]
+                for i, score in zip(missing, scores):
+                    predictions[i] = score
+                    self.table.put(keys[i], score)
+        scored_choices = list(zip(predictions, choices))
         print(str(scored_choices))
         chosen = util.pick_best(scored_choices)
         print("Score: " + str(chosen[0]))
+        report_latency(self.latencies, start, len(choices))
         return chosen[1]
 
-class GovAlpha2Player(RandomPlayer):
+class GovAlpha2Player(ModelPlayer):
     """
     The Governor.
     The second version where I tried a different neural net.
 
     Currently makes random choices for everything except placing dice.
     TODO: All other choices.
+
+    The model and encoding can be given as with GovAlphaPlayer.
     """
 
-    def __init__(self, name, filename):
-        Player.__init__(self, name)
-        self.advisor_chooser = keras.models.load_model(filename + '_advisor_chooser')
+    def __init__(self, name, filename, model=None, encoding: int=1):
+        ModelPlayer.__init__(self, name, filename + '_advisor_chooser', model)
+        self.encoding = encoding
+        self.latencies: List[float] = []
 
     def chooseAdvisor(self, state: kingsburg.State) -> kingsburg.AdvisorInfluence:
+        start = time.perf_counter()
+        import numpy
+        import training
         choices = state.choices__advisorInfluence(self.name)
-        best_choice = None
-        best_choice_score = None
-        base_inputs = training.state_to_input(state)
-        for c in choices:
-            additional_inputs = training.advisor_choice_to_input(state, c)
-            inputs = base_inputs + additional_inputs
-            prediction = self.advisor_chooser.predict(numpy.asarray([inputs]))[0][0]
-            if best_choice_score is None or prediction > best_choice_score:
-                best_choice_score = prediction
-                best_choice = c
-        print("Score: " + str(best_choice_score))
-        return best_choice
+        # Every row shares the state encoding, followed by its own choice.
+        state_inputs = training.state_inputs(self.encoding)
+        inputs = numpy.empty((len(choices), state_inputs + training.ADVISOR_CHOICE_INPUTS), dtype=training.INPUT_DTYPE)
+        inputs[:, :state_inputs] = training.encode_states([state], self.encoding)
+        training.advisor_choices_to_input([state] * len(choices), choices, inputs[:, state_inputs:])
+        predictions = self.model.predict(inputs)[:, 0]
+        # argmax keeps the first of equal scores, like the old strict > loop.
+        best = int(numpy.argmax(predictions))
+        print("Score: " + str(predictions[best]))
+        report_latency(self.latencies, start, len(choices))
+        return choices[best]
+
+class GovPolicyPlayer(ModelPlayer):
+    """
+    The Governor.
+    A policy network that scores every action in kingsburg.ACTIONS from
+    the state alone, so a decision costs one predict call however many
+    placements the dice allow. Illegal placements are masked out.
+
+    Currently makes random choices for everything except placing dice.
+
+    The model and encoding can be given as with GovAlphaPlayer.
+    """
+
+    def __init__(self, name, filename, model=None, encoding: int=1):
+        ModelPlayer.__init__(self, name, filename + '_policy', model)
+        self.encoding = encoding
+        self.latencies: List[float] = []
+
+    def chooseAdvisor(self, state: kingsburg.State) -> kingsburg.AdvisorInfluence:
+        start = time.perf_counter()
+        import numpy
+        import training
+        legal = kingsburg.action_ids(state.legalActionMask(self.name))
+        scores = self.model.predict(training.encode_states([state], self.encoding))[0]
+        best = legal[int(numpy.argmax(scores[legal]))]
+        print("Score: " + str(scores[best]))
+        report_latency(self.latencies, start, len(legal))
+        return kingsburg.action(best)
+
+def report_latency(latencies: List[float], start: float, candidates: int):
+    """
+    Records how long a decision took since start and prints it.
+    """
+    elapsed = time.perf_counter() - start
+    latencies.append(elapsed)
+    print("Scored %d choices in %.1fms" % (candidates, elapsed * 1000))
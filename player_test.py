@@ -0,0 +1,133 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Modules that only the neural players should load.
+HEAVY_MODULES = ["keras", "tensorflow", "numpy", "training", "inference"]
+
+def test_random_path_imports():
+    # Run in a fresh interpreter, as other tests may have imported these.
+    code = "import sys, engine, game, simulation, bin.generate_random_games; print(','.join(m for m in %r if m in sys.modules))" % HEAVY_MODULES
+    output = subprocess.check_output([sys.executable, "-c", code], universal_newlines=True)
+    assert output.strip() == ""
+
+def test_cli_player_reprompts_bad_dice(monkeypatch):
+    import kingsburg
+    import player
+
+    answers = iter(["1 2 x", "1 2 7", "3 1 2"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    state = kingsburg.State().setPlayers(["fred", "george", "ron"])
+    roll = player.CliPlayer("fred").rollDice(state)
+    assert roll == kingsburg.ProductiveSeasonRoll([1, 2, 3], [])
+
+def test_gov_policy_player_masks_illegal_moves():
+    import numpy
+    import inference
+    import kingsburg
+    import player
+    import training
+
+    # Favour the highest action IDs, which are mostly illegal.
+    bias = numpy.arange(len(kingsburg.ACTIONS), dtype=numpy.float32) / len(kingsburg.ACTIONS)
+    model = inference.NumpyModel([(numpy.zeros((training.STATE_INPUTS, len(kingsburg.ACTIONS))), bias, inference.ACTIVATION_SOFTMAX)])
+    with tempfile.TemporaryDirectory() as dir:
+        model.save(dir + "/gov_policy_fred_policy.npz")
+        p = player.GovPolicyPlayer("fred", dir + "/gov_policy_fred")
+
+    state = kingsburg.State().setPlayers(["fred", "george", "ron"])
+    state = state.productiveSeasonRolls({
+        "fred": kingsburg.ProductiveSeasonRoll([1, 2, 2], []),
+        "george": kingsburg.ProductiveSeasonRoll([3, 4, 5], []),
+        "ron": kingsburg.ProductiveSeasonRoll([6, 6, 6], []),
+    })
+    choice = p.chooseAdvisor(state)
+    legal = state.choices__advisorInfluence("fred")
+    assert choice in legal
+    assert kingsburg.action_id(choice) == max(kingsburg.action_id(i) for i in legal)
+    p.close()
+    # Closing again must not release someone else's reference.
+    p.close()
+    assert inference.REGISTRY.refcounts[os.path.abspath(p.filename)] == 0
+
+def test_gov_alpha_player_transpositions():
+    import numpy
+    import inference
+    import kingsburg
+    import player
+    import training
+    import transposition
+
+    rng = numpy.random.RandomState(0)
+    model = inference.NumpyModel([(rng.randn(training.STATE_INPUTS, 2), numpy.zeros(2), inference.ACTIVATION_LINEAR)])
+    with tempfile.TemporaryDirectory() as dir:
+        model.save(dir + "/gov_alpha_fred.npz")
+        cached = player.GovAlphaPlayer("fred", dir + "/gov_alpha_fred", table_size=1024)
+        uncached = player.GovAlphaPlayer("fred", dir + "/gov_alpha_fred")
+    table = cached.table
+    assert isinstance(table, transposition.TranspositionTable)
+    assert uncached.table is None
+
+    state = kingsburg.State().setPlayers(["fred", "george", "ron"])
+    state = state.productiveSeasonRolls({
+        "fred": kingsburg.ProductiveSeasonRoll([1, 2, 2], []),
+        "george": kingsburg.ProductiveSeasonRoll([3, 4, 5], []),
+        "ron": kingsburg.ProductiveSeasonRoll([6, 6, 6], []),
+    })
+    choice = cached.chooseAdvisor(state)
+    assert choice == uncached.chooseAdvisor(state)
+    assert table.hits == 0
+    stored = len(table)
+
+    # Deciding again from the same position is answered from the table.
+    assert cached.chooseAdvisor(state) == choice
+    assert table.hits == stored
+    assert len(table) == stored
+    cached.close()
+    uncached.close()
+
+def test_gov_alpha2_players_share_a_batching_predictor():
+    import threading
+    import random
+    import numpy
+    import inference
+    import kingsburg
+    import player
+    import simulation
+    import training
+
+    # Integer weights keep scores exact, however rows are batched.
+    rng = numpy.random.RandomState(0)
+    inputs = training.STATE_INPUTS + training.ADVISOR_CHOICE_INPUTS
+    model = inference.NumpyModel([(rng.randint(-3, 4, (inputs, 2)), numpy.zeros(2), inference.ACTIVATION_LINEAR)])
+
+    def play(seed, scorer):
+        fred = player.GovAlpha2Player("fred", "unused", model=scorer)
+        fred.rng = random.Random(seed)
+        players = {
+            "fred": fred,
+            "george": player.RandomPlayer("george", random.Random(seed + 1)),
+            "ron": player.RandomPlayer("ron", random.Random(seed + 2)),
+        }
+        state = simulation.play(players, ["fred", "george", "ron"])
+        fred.close()
+        return state, len(fred.latencies)
+
+    games = 4
+    results = [None] * games
+    with inference.BatchingPredictor(model, max_latency=0.02) as predictor:
+        def worker(i):
+            results[i] = play(i * 10, predictor)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(0, games)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    for i in range(0, games):
+        assert results[i][0] == play(i * 10, model)[0]
+    decisions = sum(r[1] for r in results)
+    assert predictor.batches > 0
+    # Decisions from concurrent games were scored together.
+    assert predictor.batches < decisions
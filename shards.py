@@ -0,0 +1,143 @@
+import gzip
+import io
+import json
+import lzma
+import os
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+COMPRESSION_NONE = None
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_LZMA = "lzma"
+
+EXTENSIONS = {
+    COMPRESSION_NONE: "",
+    COMPRESSION_GZIP: ".gz",
+    COMPRESSION_LZMA: ".xz",
+}
+
+MANIFEST_SUFFIX = ".manifest.json"
+TMP_SUFFIX = ".tmp"
+
+BUFFER_SIZE = 1 << 20
+
+class ShardWriter():
+    """
+    Streams newline-delimited records into a series of shard files.
+
+    Records are written through a buffer to a temporary file, which is
+    atomically renamed into place once the shard is complete, so readers
+    never see a partial shard. A new shard is started once the current one
+    holds max_records records or max_bytes bytes (before compression).
+    On close, a manifest listing every shard, its record count and the
+    given seeds is written to <dir>/<prefix>.manifest.json.
+    """
+
+    def __init__(self, dir: str, prefix: str, max_records: Optional[int]=None, max_bytes: Optional[int]=None, compression: Optional[str]=COMPRESSION_NONE, seeds: Optional[Dict[str, Any]]=None):
+        if compression not in EXTENSIONS:
+            raise ValueError("Unknown compression: " + str(compression))
+        self.dir = dir
+        self.prefix = prefix
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.seeds = seeds if seeds is not None else {}
+        self.shards: List[Dict[str, Any]] = []
+        self._file: Optional[IO[bytes]] = None
+        self._raw: Optional[IO[bytes]] = None
+        self._name = ""
+        self._records = 0
+        self._bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def write(self, record: str):
+        if self._file is None:
+            self._open()
+        data = (record + "\n").encode()
+        assert self._file is not None
+        self._file.write(data)
+        self._records += 1
+        self._bytes += len(data)
+        if (self.max_records is not None and self._records >= self.max_records) \
+                or (self.max_bytes is not None and self._bytes >= self.max_bytes):
+            self._finish()
+
+    def close(self):
+        """
+        Finishes the current shard, if any, and writes the manifest.
+        """
+        if self._file is not None:
+            self._finish()
+        manifest = {
+            "shards": self.shards,
+            "compression": self.compression,
+            "seeds": self.seeds,
+        }
+        path = os.path.join(self.dir, self.prefix + MANIFEST_SUFFIX)
+        with open(path + TMP_SUFFIX, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + TMP_SUFFIX, path)
+
+    def _open(self):
+        self._name = self.prefix + "-" + str(len(self.shards)) + EXTENSIONS[self.compression]
+        raw = open(os.path.join(self.dir, self._name + TMP_SUFFIX), "wb", buffering=BUFFER_SIZE)
+        if self.compression == COMPRESSION_GZIP:
+            self._file = gzip.GzipFile(fileobj=raw, mode="wb")
+        elif self.compression == COMPRESSION_LZMA:
+            self._file = lzma.LZMAFile(raw, mode="wb")
+        else:
+            self._file = raw
+        self._raw = raw
+        self._records = 0
+        self._bytes = 0
+
+    def _finish(self):
+        assert self._file is not None
+        self._file.close()
+        if self._raw is not None and self._raw is not self._file:
+            self._raw.close()
+        path = os.path.join(self.dir, self._name)
+        os.replace(path + TMP_SUFFIX, path)
+        self.shards.append({"name": self._name, "records": self._records})
+        self._file = None
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+            if self._raw is not None and self._raw is not self._file:
+                self._raw.close()
+            os.remove(os.path.join(self.dir, self._name + TMP_SUFFIX))
+            self._file = None
+
+def open_shard(path: str) -> IO[str]:
+    """
+    Opens a shard for reading as text, decompressing it by its extension.
+    """
+    if path.endswith(EXTENSIONS[COMPRESSION_GZIP]):
+        return gzip.open(path, "rt")
+    if path.endswith(EXTENSIONS[COMPRESSION_LZMA]):
+        return lzma.open(path, "rt")
+    return io.open(path, "r", buffering=BUFFER_SIZE)
+
+def shard_files(dir: str) -> List[str]:
+    """
+    Lists the completed shards in dir, skipping manifests and partial shards.
+    """
+    files = sorted(os.listdir(dir))
+    return [os.path.join(dir, f) for f in files
+            if os.path.isfile(os.path.join(dir, f)) and not f.endswith(MANIFEST_SUFFIX) and not f.endswith(TMP_SUFFIX)]
+
+def read_records(path: str) -> Iterator[str]:
+    """
+    Yields each record in a shard, without its trailing newline.
+    """
+    with open_shard(path) as f:
+        for line in f:
+            yield line.rstrip("\n")
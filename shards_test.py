@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+
+import shards
+
+def test_rotate_by_records():
+    with tempfile.TemporaryDirectory() as dir:
+        with shards.ShardWriter(dir, "run", max_records=2, seeds={"master": 5}) as w:
+            for i in range(0, 5):
+                w.write(str(i))
+
+        with open(os.path.join(dir, "run" + shards.MANIFEST_SUFFIX)) as f:
+            manifest = json.load(f)
+        assert manifest["shards"] == [
+            {"name": "run-0", "records": 2},
+            {"name": "run-1", "records": 2},
+            {"name": "run-2", "records": 1},
+        ]
+        assert manifest["seeds"] == {"master": 5}
+
+        files = shards.shard_files(dir)
+        assert [os.path.basename(f) for f in files] == ["run-0", "run-1", "run-2"]
+        assert [r for f in files for r in shards.read_records(f)] == ["0", "1", "2", "3", "4"]
+
+def test_rotate_by_bytes():
+    with tempfile.TemporaryDirectory() as dir:
+        with shards.ShardWriter(dir, "run", max_bytes=10) as w:
+            w.write("aaaa")
+            w.write("bbbb")
+            w.write("cccc")
+        assert [s["records"] for s in w.shards] == [2, 1]
+
+def test_compression():
+    for compression in [shards.COMPRESSION_GZIP, shards.COMPRESSION_LZMA]:
+        with tempfile.TemporaryDirectory() as dir:
+            with shards.ShardWriter(dir, "run", compression=compression) as w:
+                w.write('{"a": 1}')
+                w.write('{"b": 2}')
+            files = shards.shard_files(dir)
+            assert files == [os.path.join(dir, "run-0" + shards.EXTENSIONS[compression])]
+            assert list(shards.read_records(files[0])) == ['{"a": 1}', '{"b": 2}']
+
+def test_discard_on_error():
+    with tempfile.TemporaryDirectory() as dir:
+        try:
+            with shards.ShardWriter(dir, "run") as w:
+                w.write("partial")
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert os.listdir(dir) == []
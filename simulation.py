@@ -0,0 +1,99 @@
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+import engine
+import game
+import kingsburg
+import player
+
+Policy = Callable[[str, random.Random], player.Player]
+
+class GameResult():
+    """
+    The outcome of one simulated game.
+    Resources are (gold, stone, wood), in kingsburg.RESOURCES order.
+    """
+
+    __slots__ = ("winners", "victory_points", "building_masks", "resources")
+
+    def __init__(self, state: kingsburg.State):
+        self.winners: List[str] = state.getWinners()
+        self.victory_points: Dict[str, int] = {}
+        self.building_masks: Dict[str, int] = {}
+        self.resources: Dict[str, Tuple[int, ...]] = {}
+        for p in state.playerList():
+            self.victory_points[p.name] = p.victory_points
+            self.building_masks[p.name] = p.building_mask
+            self.resources[p.name] = tuple(p.resources[r] for r in kingsburg.RESOURCES)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameResult):
+            return NotImplemented
+        return self.winners == other.winners \
+            and self.victory_points == other.victory_points \
+            and self.building_masks == other.building_masks \
+            and self.resources == other.resources
+
+    def toDict(self):
+        return {
+            "winners": self.winners,
+            "victory_points": self.victory_points,
+            "buildings": {name: [b for b in kingsburg.BUILDINGS if self.building_masks[name] & kingsburg.BUILDING_BIT[b]] for name in self.building_masks},
+            "resources": {name: dict(zip(kingsburg.RESOURCES, self.resources[name])) for name in self.resources},
+        }
+
+def simulate(num: int, seed: Optional[int]=None, policy: Policy=player.RandomPlayer, names: Optional[List[str]]=None) -> List[GameResult]:
+    """
+    Plays num complete games back to back and returns their results.
+
+    Every seat is played by policy(name, rng), all drawing from one
+    random.Random seeded with seed. Given the same seed, the games are
+    identical to running game.Game.play with an engine.RandomEngine
+    sharing a random.Random(seed) for the same number of games.
+    The players are closed after each game.
+    """
+    rng = random.Random(seed)
+    if names is None:
+        names = engine.RANDOM_PLAYER_NAMES
+    results: List[GameResult] = []
+    for i in range(0, num):
+        players = {name: policy(name, rng) for name in names}
+        results.append(GameResult(play(players, names)))
+        for p in players.values():
+            p.close()
+    return results
+
+def play(players: Dict[str, player.Player], names: List[str]) -> kingsburg.State:
+    """
+    Plays one game between the given players and returns the final state.
+
+    This runs the rules in game directly, with no engine, logger or events.
+    """
+    state = kingsburg.State().setPlayers(list(names))
+    seats = Seats(players)
+    while not state.over:
+        state = game.advance(state, seats)
+    return state
+
+class Seats():
+    """
+    Asks the player seated under each name for its decisions.
+    """
+
+    def __init__(self, players: Dict[str, player.Player]):
+        self.players = players
+
+    def pickFreeResource(self, state: kingsburg.State, name: str) -> str:
+        return self.players[name].pickFreeResource(state)
+
+    def rollDice(self, state: kingsburg.State, name: str) -> kingsburg.ProductiveSeasonRoll:
+        return self.players[name].rollDice(state)
+
+    def chooseAdvisor(self, state: kingsburg.State, name: str) -> kingsburg.AdvisorInfluence:
+        return self.players[name].chooseAdvisor(state)
+
+    def chooseReward(self, state: kingsburg.State, name: str, advisorScore: kingsburg.AdvisorScore, possible_rewards: List[kingsburg.Reward]) -> Optional[kingsburg.Reward]:
+        return self.players[name].chooseReward(state, advisorScore, possible_rewards)
+
+    def chooseBuilding(self, state: kingsburg.State, name: str, use_kings_envoy: bool) -> kingsburg.Building:
+        return self.players[name].chooseBuilding(state, state.choices__buildings(name), use_kings_envoy)
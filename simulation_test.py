@@ -0,0 +1,22 @@
+import random
+
+import engine
+import game
+import kingsburg
+import logger
+import simulation
+
+def test_simulate_matches_game():
+    results = simulation.simulate(5, seed=42)
+
+    rng = random.Random(42)
+    expected = []
+    for i in range(0, 5):
+        g = game.Game(engine.RandomEngine(logger.SilentLogger(), rng), kingsburg.State())
+        g.play()
+        expected.append(simulation.GameResult(g.state))
+
+    assert results == expected
+
+def test_simulate_seeded():
+    assert simulation.simulate(3, seed=1) == simulation.simulate(3, seed=1)
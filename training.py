@@ -1,4 +1,6 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
+
+import numpy
 
 import kingsburg
 
@@ -60,9 +62,8 @@ def player_to_input(p: kingsburg.PlayerState) -> List[int]:
 
     # Represent each building as a boolean.
     buildings: List[int] = []
-    for row in kingsburg.PROVINCE_SHEET:
-        for b in row:
-            buildings.append(int(b in p.buildings))
+    for i in range(len(kingsburg.BUILDINGS)):
+        buildings.append((p.building_mask >> i) & 1)
     assert len(buildings) == 20
     input = input + buildings
 
@@ -98,6 +99,15 @@ def player_to_input(p: kingsburg.PlayerState) -> List[int]:
 
     return input
 
+def advisors_to_input(s: kingsburg.State, name: Optional[str]=None) -> List[int]:
+    """
+    Transform advisor occupancy into a list of 18 integers, one per advisor,
+    that can be fed into a neural net as inputs. If a player name is given
+    only the advisors influenced by that player are set.
+    """
+    mask = s.taken_mask if name is None else s.player_advisor_masks.get(name, 0)
+    return [(mask >> i) & 1 for i in range(kingsburg.ADVISOR_MAX)]
+
 def advisor_choice_to_input(s: kingsburg.State, influence: kingsburg.AdvisorInfluence) -> List[int]:
     input: List[int] = []
 
@@ -150,27 +160,33 @@ def advisor_choice_to_input(s: kingsburg.State, influence: kingsburg.AdvisorInfl
 
     # First the AI player.
     for p in [p for p in s.playerList() if p.name == "fred"]:
+        # Rolls keep face counts, so expand them to sorted dice once.
+        player_dice = p.dice.player_dice
+        bonus_dice = p.dice.bonus_dice
         for i in range(0, 3):
-            if len(p.dice.player_dice) >= i+1:
-                remaining_dice = remaining_dice + dice_to_input(p.dice.player_dice[i])
+            if len(player_dice) >= i+1:
+                remaining_dice = remaining_dice + dice_to_input(player_dice[i])
             else:
                 remaining_dice = remaining_dice + dice_to_input(0)
         for i in range(0, 2):
-            if len(p.dice.bonus_dice) >= i+1:
-                remaining_dice = remaining_dice + dice_to_input(p.dice.bonus_dice[i])
+            if len(bonus_dice) >= i+1:
+                remaining_dice = remaining_dice + dice_to_input(bonus_dice[i])
             else:
                 remaining_dice = remaining_dice + dice_to_input(0)
 
     # Then all the other players.
     for p in [p for p in s.playerList() if p.name != "fred"]:
+        # Rolls keep face counts, so expand them to sorted dice once.
+        player_dice = p.dice.player_dice
+        bonus_dice = p.dice.bonus_dice
         for i in range(0, 3):
-            if len(p.dice.player_dice) >= i+1:
-                remaining_dice = remaining_dice + dice_to_input(p.dice.player_dice[i])
+            if len(player_dice) >= i+1:
+                remaining_dice = remaining_dice + dice_to_input(player_dice[i])
             else:
                 remaining_dice = remaining_dice + dice_to_input(0)
         for i in range(0, 2):
-            if len(p.dice.bonus_dice) >= i+1:
-                remaining_dice = remaining_dice + dice_to_input(p.dice.bonus_dice[i])
+            if len(bonus_dice) >= i+1:
+                remaining_dice = remaining_dice + dice_to_input(bonus_dice[i])
             else:
                 remaining_dice = remaining_dice + dice_to_input(0)
 
@@ -191,3 +207,169 @@ def dice_to_input(die: int) -> List[int]:
     assert len(input) == 6
     assert len([d for d in input if input == 1]) <= 1
     return input
+
+# Sizes of the encodings above, used by the batch encoders below.
+STATE_INPUTS = 376
+ADVISOR_INPUTS = 18
+PLAYER_INPUTS = 112
+ADVISOR_CHOICE_INPUTS = 140
+PHASES_PER_YEAR = kingsburg.MAX_PHASE+1
+
+# The encodings are 0/1 apart from the market modifier, which can be -1,
+# so they are stored as signed bytes.
+INPUT_DTYPE = numpy.int8
+
+_PLUSTWO_LEVELS = numpy.arange(1, 11)
+_RESOURCE_LEVELS = numpy.arange(1, 21)
+_SOLDIER_LEVELS = numpy.arange(1, 21)
+_BUILDING_SHIFTS = numpy.arange(len(kingsburg.BUILDINGS))
+_ADVISOR_SCORES = numpy.arange(1, 19)
+_ADVISOR_SHIFTS = numpy.arange(kingsburg.ADVISOR_MAX)
+_DIE_FACES = numpy.arange(1, 7)
+
+def _ordered_players(s: kingsburg.State) -> List[kingsburg.PlayerState]:
+    # "fred" first, then everyone else, matching state_to_input.
+    players = s.playerList()
+    return [p for p in players if p.name == "fred"] + [p for p in players if p.name != "fred"]
+
+def states_to_input(states: Sequence[kingsburg.State], out: Optional[numpy.ndarray]=None) -> numpy.ndarray:
+    """
+    Batch version of state_to_input. Fills a (len(states), 376) matrix,
+    allocating one if out is not given, and returns it. Row i is identical
+    to state_to_input(states[i]).
+    """
+    n = len(states)
+    if out is None:
+        out = numpy.empty((n, STATE_INPUTS), dtype=INPUT_DTYPE)
+    out[:n] = 0
+    if n == 0:
+        return out
+
+    phases = numpy.array([(s.year-1) * PHASES_PER_YEAR + (s.phase-1) for s in states])
+    valid = numpy.array([1 <= s.year <= kingsburg.MAX_YEAR and 1 <= s.phase <= PHASES_PER_YEAR for s in states])
+    rows = numpy.arange(n)
+    out[rows[valid], phases[valid]] = 1
+
+    ordered = [_ordered_players(s) for s in states]
+    for slot in range(0, len(ordered[0])):
+        players = [o[slot] for o in ordered]
+        offset = 40 + slot * PLAYER_INPUTS
+        _players_to_input(players, out[:n, offset:offset+PLAYER_INPUTS])
+
+    return out
+
+def advisors_to_inputs(states: Sequence[kingsburg.State], out: Optional[numpy.ndarray]=None) -> numpy.ndarray:
+    """
+    Batch version of advisors_to_input. Fills a (len(states), 18) matrix,
+    allocating one if out is not given, and returns it.
+    """
+    n = len(states)
+    if out is None:
+        out = numpy.empty((n, ADVISOR_INPUTS), dtype=INPUT_DTYPE)
+    masks = numpy.array([s.taken_mask for s in states], dtype=numpy.int64)
+    out[:n] = (masks[:, None] >> _ADVISOR_SHIFTS) & 1
+    return out
+
+def _players_to_input(players: List[kingsburg.PlayerState], out: numpy.ndarray):
+    # Fills out, a (len(players), 112) view, like player_to_input.
+    out[:, 0] = [p.has_kings_favor_bonus_die for p in players]
+    out[:, 1] = [p.has_kings_envoy for p in players]
+
+    plustwo = numpy.array([p.plustwo_tokens for p in players])
+    out[:, 2:12] = _PLUSTWO_LEVELS <= plustwo[:, None]
+
+    masks = numpy.array([p.building_mask for p in players])
+    out[:, 12:32] = (masks[:, None] >> _BUILDING_SHIFTS) & 1
+
+    resources = numpy.array([[p.resources[r] for r in kingsburg.RESOURCES] for p in players])
+    out[:, 32:92] = (_RESOURCE_LEVELS <= resources[:, :, None]).reshape(len(players), 60)
+
+    soldiers = numpy.array([p.soldiers for p in players])
+    out[:, 92:112] = _SOLDIER_LEVELS <= soldiers[:, None]
+
+def advisor_choices_to_input(states: Sequence[kingsburg.State], influences: Sequence[kingsburg.AdvisorInfluence], out: Optional[numpy.ndarray]=None) -> numpy.ndarray:
+    """
+    Batch version of advisor_choice_to_input. Fills a (len(influences), 140)
+    matrix, allocating one if out is not given, and returns it. Row i is
+    identical to advisor_choice_to_input(states[i], influences[i]).
+    """
+    n = len(influences)
+    if out is None:
+        out = numpy.empty((n, ADVISOR_CHOICE_INPUTS), dtype=INPUT_DTYPE)
+    if n == 0:
+        return out
+
+    scores = numpy.array([i.advisorScore() for i in influences])
+    out[:n, 0:18] = _ADVISOR_SCORES == scores[:, None]
+    out[:n, 18] = [i.plus_two for i in influences]
+    out[:n, 19] = [i.market_modifier for i in influences]
+
+    # Every die slot holds a face, or 0 for an empty slot: three player and
+    # two bonus dice for the influence, then the same for each player's
+    # remaining roll. The one-hot codes for all of them are contiguous.
+    faces = numpy.zeros((n, 20), dtype=numpy.int8)
+    remaining: Dict[int, List[int]] = {}
+    for row in range(0, n):
+        influence = influences[row]
+        faces[row, 0:len(influence.player_dice)] = influence.player_dice
+        faces[row, 3:3+len(influence.bonus_dice)] = influence.bonus_dice
+        s = states[row]
+        key = id(s)
+        if key not in remaining:
+            dice: List[int] = []
+            for p in _ordered_players(s):
+                player_dice = p.dice.player_dice
+                bonus_dice = p.dice.bonus_dice
+                dice += (list(player_dice) + [0, 0, 0])[:3] + (list(bonus_dice) + [0, 0])[:2]
+            remaining[key] = dice
+        faces[row, 5:] = remaining[key]
+    out[:n, 20:140] = (_DIE_FACES == faces[:, :, None]).reshape(n, 120)
+
+    return out
+
+# Encodings models can be trained on. Models and .npy shards are only
+# usable with the encoding they were made with.
+#   ENCODING_V1: the state from state_to_input.
+#   ENCODING_V2: the state followed by advisors_to_input.
+# Advisor choices are the state followed by advisor_choice_to_input in both.
+ENCODING_V1 = 1
+ENCODING_V2 = 2
+ENCODINGS = [ENCODING_V1, ENCODING_V2]
+
+STATE_INPUTS_V2 = STATE_INPUTS + ADVISOR_INPUTS
+
+def state_inputs(encoding: int) -> int:
+    """
+    Returns the number of inputs encode_states produces per state.
+    """
+    if encoding == ENCODING_V1:
+        return STATE_INPUTS
+    if encoding == ENCODING_V2:
+        return STATE_INPUTS_V2
+    raise ValueError("Unknown encoding: " + str(encoding))
+
+def encode_states(states: Sequence[kingsburg.State], encoding: int, out: Optional[numpy.ndarray]=None) -> numpy.ndarray:
+    """
+    Encodes states with the given encoding into a (len(states),
+    state_inputs(encoding)) matrix, allocating one if out is not given.
+    """
+    n = len(states)
+    if out is None:
+        out = numpy.empty((n, state_inputs(encoding)), dtype=INPUT_DTYPE)
+    states_to_input(states, out[:, :STATE_INPUTS])
+    if encoding == ENCODING_V2:
+        advisors_to_inputs(states, out[:, STATE_INPUTS:STATE_INPUTS_V2])
+    return out
+
+def encode_advisor_choices(states: Sequence[kingsburg.State], influences: Sequence[kingsburg.AdvisorInfluence], encoding: int, out: Optional[numpy.ndarray]=None) -> numpy.ndarray:
+    """
+    Encodes each state followed by the advisor choice made from it, into a
+    (len(influences), state_inputs(encoding) + 140) matrix.
+    """
+    n = len(influences)
+    inputs = state_inputs(encoding)
+    if out is None:
+        out = numpy.empty((n, inputs + ADVISOR_CHOICE_INPUTS), dtype=INPUT_DTYPE)
+    encode_states(states, encoding, out[:, :inputs])
+    advisor_choices_to_input(states, influences, out[:, inputs:])
+    return out
@@ -0,0 +1,57 @@
+import random
+
+import engine
+import game
+import kingsburg
+import logger
+import training
+
+def play(seed: int) -> engine.TrainingDataEngine:
+    eng = engine.TrainingDataEngine(logger.SilentLogger(), random.Random(seed))
+    g = game.Game(eng, kingsburg.State())
+    g.play()
+    return eng
+
+def test_batch_encoders_match():
+    for seed in range(0, 5):
+        eng = play(seed)
+        states = [eng.states[idx] for influence, idx in eng.advisor_choices]
+        influences = [influence for influence, idx in eng.advisor_choices]
+
+        batch = training.states_to_input(states)
+        assert batch.dtype == training.INPUT_DTYPE
+        assert batch.tolist() == [training.state_to_input(s) for s in states]
+
+        batch = training.advisor_choices_to_input(states, influences)
+        assert batch.tolist() == [training.advisor_choice_to_input(s, i) for s, i in zip(states, influences)]
+
+def test_batch_encoders_edges():
+    state = kingsburg.State().setPlayers(["fred", "george", "ron"])
+    fred = state.players["fred"].copy()
+    fred.plustwo_tokens = 12
+    fred.soldiers = 25
+    fred.resources = {kingsburg.RESOURCE_GOLD: 21, kingsburg.RESOURCE_STONE: 0, kingsburg.RESOURCE_WOOD: 3}
+    state = state.updatePlayer("fred", fred.roll(kingsburg.ProductiveSeasonRoll([1, 1, 6], [2])))
+    state.phase = 1
+    influences = [
+        kingsburg.ADVISOR_INFLUENCE_PASS,
+        kingsburg.AdvisorInfluence([1], [], False, -1),
+        kingsburg.AdvisorInfluence([1, 6], [2], True, 1),
+    ]
+    states = [state] * len(influences)
+    assert training.states_to_input(states).tolist() == [training.state_to_input(state)] * 3
+    assert training.advisor_choices_to_input(states, influences).tolist() == [training.advisor_choice_to_input(state, i) for i in influences]
+    assert training.states_to_input([]).shape == (0, training.STATE_INPUTS)
+
+def test_encodings():
+    eng = play(3)
+    states = [eng.states[idx] for influence, idx in eng.advisor_choices]
+    influences = [influence for influence, idx in eng.advisor_choices]
+
+    # ENCODING_V1 keeps the original layout.
+    assert training.encode_states(states, training.ENCODING_V1).tolist() == [training.state_to_input(s) for s in states]
+    assert training.encode_states(states, training.ENCODING_V2).tolist() == [training.state_to_input(s) + training.advisors_to_input(s) for s in states]
+    assert training.advisors_to_inputs(states).tolist() == [training.advisors_to_input(s) for s in states]
+    assert training.encode_advisor_choices(states, influences, training.ENCODING_V2).tolist() == \
+        [training.state_to_input(s) + training.advisors_to_input(s) + training.advisor_choice_to_input(s, i) for s, i in zip(states, influences)]
+    assert any(training.advisors_to_input(s) != [0] * training.ADVISOR_INPUTS for s in states)
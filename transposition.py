@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional
+
+class TranspositionTable():
+    """
+    A fixed-size cache of search results keyed by 64-bit state hashes,
+    such as kingsburg.State.zobristHash().
+
+    The table never grows past max_entries. Entries live in buckets of two
+    slots. The first slot prefers deep results: it is only replaced by a
+    result searched at least as deep, or by anything once its entry is from
+    an older search (see newSearch). The second slot always takes whatever
+    did not fit in the first, so recent shallow results are still cached.
+
+    hits, misses, stores and evictions count how the table is used.
+    """
+
+    def __init__(self, max_entries: int):
+        if max_entries < 2:
+            raise ValueError("A transposition table needs at least 2 entries")
+        self.buckets = max_entries // 2
+        size = self.buckets * 2
+        self.keys: List[Optional[int]] = [None] * size
+        self.values: List[Any] = [None] * size
+        self.depths: List[int] = [0] * size
+        self.generations: List[int] = [0] * size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return sum(1 for key in self.keys if key is not None)
+
+    def get(self, key: int, depth: int=0) -> Optional[Any]:
+        """
+        Returns the value stored for key if it was searched at least depth
+        deep, otherwise None.
+        """
+        slot = (key % self.buckets) * 2
+        for i in [slot, slot + 1]:
+            if self.keys[i] == key and self.depths[i] >= depth:
+                self.hits += 1
+                return self.values[i]
+        self.misses += 1
+        return None
+
+    def put(self, key: int, value: Any, depth: int=0):
+        """
+        Stores the value for key, searched depth deep.
+        """
+        self.stores += 1
+        deep = (key % self.buckets) * 2
+        shallow = deep + 1
+
+        # Update an existing entry in place, keeping the deeper result.
+        for i in [deep, shallow]:
+            if self.keys[i] == key:
+                if depth >= self.depths[i] or self.generations[i] != self.generation:
+                    self._set(i, key, value, depth)
+                return
+
+        if self.keys[deep] is None or depth >= self.depths[deep] or self.generations[deep] != self.generation:
+            i = deep
+        else:
+            i = shallow
+        if self.keys[i] is not None:
+            self.evictions += 1
+        self._set(i, key, value, depth)
+
+    def newSearch(self):
+        """
+        Marks every entry as coming from an older search, so that deep but
+        stale results no longer block new ones. Entries can still be hit.
+        """
+        self.generation += 1
+
+    def clear(self):
+        for i in range(0, len(self.keys)):
+            self.keys[i] = None
+            self.values[i] = None
+            self.depths[i] = 0
+            self.generations[i] = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self),
+            "capacity": len(self.keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def _set(self, i: int, key: int, value: Any, depth: int):
+        self.keys[i] = key
+        self.values[i] = value
+        self.depths[i] = depth
+        self.generations[i] = self.generation
@@ -0,0 +1,59 @@
+import pytest
+
+import transposition
+
+def test_get_put():
+    table = transposition.TranspositionTable(8)
+    assert table.get(1) is None
+    table.put(1, "a")
+    assert table.get(1) == "a"
+    assert len(table) == 1
+    assert (table.hits, table.misses, table.stores) == (1, 1, 1)
+
+    with pytest.raises(ValueError):
+        transposition.TranspositionTable(1)
+
+def test_depth():
+    table = transposition.TranspositionTable(8)
+    table.put(1, "deep", depth=3)
+    assert table.get(1, depth=3) == "deep"
+    # Shallower results never replace deeper ones for the same state, and
+    # results searched too shallow are misses.
+    table.put(1, "shallow", depth=1)
+    assert table.get(1) == "deep"
+    assert table.get(1, depth=4) is None
+    table.put(1, "deeper", depth=4)
+    assert table.get(1, depth=4) == "deeper"
+    assert len(table) == 1
+
+def test_replacement():
+    # One bucket, so every key competes for the same two slots.
+    table = transposition.TranspositionTable(2)
+    table.put(1, "deep", depth=5)
+    table.put(2, "b", depth=1)
+    table.put(3, "c", depth=1)
+    assert table.get(1) == "deep"
+    assert table.get(2) is None
+    assert table.get(3) == "c"
+    assert table.evictions == 1
+    assert len(table) == 2
+
+    # Once stale, the deep entry gives way to new results.
+    table.newSearch()
+    assert table.get(1) == "deep"
+    table.put(4, "d", depth=0)
+    assert table.get(1) is None
+    assert table.get(4) == "d"
+    assert table.get(3) == "c"
+
+def test_bounded():
+    table = transposition.TranspositionTable(100)
+    for key in range(0, 1000):
+        table.put(key * 7919, key, depth=key % 4)
+    assert len(table) == 100
+    assert table.stats()["capacity"] == 100
+    assert table.evictions == 900
+
+    table.clear()
+    assert len(table) == 0
+    assert table.get(0) is None
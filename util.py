@@ -1,6 +1,5 @@
-from typing import Dict, Optional, List, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, Optional, List, Set, Tuple
 import itertools
-import collections
 
 def lowest(members: Dict[str, int]) -> Optional[str]:
     """
@@ -59,41 +58,61 @@ def highest(members: Dict[str, int]) -> Optional[str]:
     return highest_member
 
 def unique_combinations(nums: List[int], max_len=None) -> List[List[int]]:
-    combos: List[List[int]] = []
-    alreadySeen: Set[Tuple[int, ...]] = set()
+    return [list(combo) for combo in multiset_combinations(nums, max_len)]
+
+def multiset_combinations(nums: Iterable[int], max_len=None) -> Iterator[Tuple[int, ...]]:
+    """
+    Lazily yields every distinct combination of nums, treating nums as a
+    multiset, so nothing is generated only to be thrown away as a duplicate.
+
+    Combinations are yielded shortest first. Within a length they follow the
+    order values first appear in nums, which for sorted nums is the same
+    order itertools.combinations produces them in.
+
+        multiset_combinations([1, 1, 2]) ==> (), (1,), (2,), (1, 1), (1, 2), (1, 1, 2)
+    """
+    values: List[int] = []
+    counts: List[int] = []
+    for num in nums:
+        if num in values:
+            counts[values.index(num)] += 1
+        else:
+            values.append(num)
+            counts.append(1)
     l = max_len
     if l is None:
-        l = len(nums)
+        l = sum(counts)
     for i in range(0, l+1):
-        for combo in [x for x in itertools.combinations(nums, i)]:
-            if combo in alreadySeen:
-                continue
-            alreadySeen.add(combo)
-            combos.append(list(combo))
-    return combos
-
-# Leaving this untyped because I don't feel like dealing with it.
-def unique_list_pairs(lists1, lists2):
-    combos = []
-    alreadySeen = set()
-    for l1 in lists1:
-        for l2 in lists2:
-            combo = [l1, l2]
-            t = tuplize(combo)
-            if t in alreadySeen:
-                continue
-            alreadySeen.add(t)
-            combos.append(combo)
-    return combos
-
-def tuplize(list):
-    out = []
-    for item in list:
-        if not isinstance(item, collections.abc.Iterable):
+        yield from _multiset_combinations(values, counts, 0, i)
+
+def _multiset_combinations(values: List[int], counts: List[int], start: int, length: int) -> Iterator[Tuple[int, ...]]:
+    if length == 0:
+        yield ()
+        return
+    for i in range(start, len(values)):
+        if counts[i] == 0:
+            continue
+        counts[i] -= 1
+        for rest in _multiset_combinations(values, counts, i, length - 1):
+            yield (values[i],) + rest
+        counts[i] += 1
+
+def multiset_product(*pools: Iterable[Any]) -> Iterator[Tuple[Any, ...]]:
+    """
+    Lazily yields every distinct tuple made of one item from each pool.
+    Repeated items within a pool are only used once, so no tuple is
+    produced twice. Items must be hashable.
+    """
+    return itertools.product(*[_distinct(pool) for pool in pools])
+
+def _distinct(items: Iterable[Any]) -> List[Any]:
+    seen: Set[Any] = set()
+    out: List[Any] = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
             out.append(item)
-        else:
-            out.append(tuplize(item))
-    return tuple(out)
+    return out
 
 def list_minus(list1: List[int], list2: List[int]):
     """
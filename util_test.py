@@ -1,3 +1,4 @@
+import itertools
 from typing import List
 import util
 
@@ -77,286 +78,6 @@ def test_unique_combinations__allones():
     got = util.unique_combinations(roll)
     assert got == expected
 
-def test_unique_list_pairs__withduplicate():
-    player_roll = [1, 1, 1]
-    bonus_roll = [1]
-    expected = [
-        [1, 1]
-    ]
-    got = util.unique_list_pairs(
-        player_roll,
-        bonus_roll,
-    )
-
-    assert got == expected
-
-def test_unique_list_pairs__onebonus():
-    player_roll = [1, 2, 3]
-    bonus_roll = [4]
-    expected = [
-        [[], []],
-        [[], [4]],
-        [[1], []],
-        [[1], [4]],
-        [[2], []],
-        [[2], [4]],
-        [[3], []],
-        [[3], [4]],
-        [[1, 2], []],
-        [[1, 2], [4]],
-        [[1, 3], []],
-        [[1, 3], [4]],
-        [[2, 3], []],
-        [[2, 3], [4]],
-        [[1, 2, 3], []],
-        [[1, 2, 3], [4]],
-    ]
-    got = util.unique_list_pairs(
-        util.unique_combinations(player_roll),
-        util.unique_combinations(bonus_roll)
-    )
-
-    assert got == expected
-
-def test_unique_list_pairs__twobonus():
-    player_roll = [1, 2, 3]
-    bonus_roll = [4, 5]
-    expected = [
-        [[], []],
-        [[], [4]],
-        [[], [5]],
-        [[], [4, 5]],
-        [[1], []],
-        [[1], [4]],
-        [[1], [5]],
-        [[1], [4, 5]],
-        [[2], []],
-        [[2], [4]],
-        [[2], [5]],
-        [[2], [4, 5]],
-        [[3], []],
-        [[3], [4]],
-        [[3], [5]],
-        [[3], [4, 5]],
-        [[1, 2], []],
-        [[1, 2], [4]],
-        [[1, 2], [5]],
-        [[1, 2], [4, 5]],
-        [[1, 3], []],
-        [[1, 3], [4]],
-        [[1, 3], [5]],
-        [[1, 3], [4, 5]],
-        [[2, 3], []],
-        [[2, 3], [4]],
-        [[2, 3], [5]],
-        [[2, 3], [4, 5]],
-        [[1, 2, 3], []],
-        [[1, 2, 3], [4]],
-        [[1, 2, 3], [5]],
-        [[1, 2, 3], [4, 5]],
-    ]
-    got = util.unique_list_pairs(
-        util.unique_combinations(player_roll),
-        util.unique_combinations(bonus_roll)
-    )
-
-    assert got == expected
-
-def test_unique_list_pairs__onebonusandplustwo():
-    player_roll = [1, 2, 3]
-    bonus_roll = [4]
-    plus_two = [1]
-    expected = [
-        [[[], []], []],
-        [[[], []], [1]],
-        [[[], [4]], []],
-        [[[], [4]], [1]],
-        [[[1], []], []],
-        [[[1], []], [1]],
-        [[[1], [4]], []],
-        [[[1], [4]], [1]],
-        [[[2], []], []],
-        [[[2], []], [1]],
-        [[[2], [4]], []],
-        [[[2], [4]], [1]],
-        [[[3], []], []],
-        [[[3], []], [1]],
-        [[[3], [4]], []],
-        [[[3], [4]], [1]],
-        [[[1, 2], []], []],
-        [[[1, 2], []], [1]],
-        [[[1, 2], [4]], []],
-        [[[1, 2], [4]], [1]],
-        [[[1, 3], []], []],
-        [[[1, 3], []], [1]],
-        [[[1, 3], [4]], []],
-        [[[1, 3], [4]], [1]],
-        [[[2, 3], []], []],
-        [[[2, 3], []], [1]],
-        [[[2, 3], [4]], []],
-        [[[2, 3], [4]], [1]],
-        [[[1, 2, 3], []], []],
-        [[[1, 2, 3], []], [1]],
-        [[[1, 2, 3], [4]], []],
-        [[[1, 2, 3], [4]], [1]],
-    ]
-    got = util.unique_list_pairs(
-        util.unique_list_pairs(
-            util.unique_combinations(player_roll),
-            util.unique_combinations(bonus_roll)
-        ),
-        util.unique_combinations(plus_two)
-    )
-
-    assert got == expected
-
-def test_unique_list_pairs__onebonusandplustwoandmarket():
-    player_roll = [1, 2, 3]
-    bonus_roll = [4]
-    plus_two = [1]
-    market = [-1, 1]
-    expected = [
-        [[[[], []], []], []],
-        [[[[], []], []], [-1]],
-        [[[[], []], []], [1]],
-
-        [[[[], []], [1]], []],
-        [[[[], []], [1]], [-1]],
-        [[[[], []], [1]], [1]],
-
-        [[[[], [4]], []], []],
-        [[[[], [4]], []], [-1]],
-        [[[[], [4]], []], [1]],
-
-        [[[[], [4]], [1]], []],
-        [[[[], [4]], [1]], [-1]],
-        [[[[], [4]], [1]], [1]],
-
-        [[[[1], []], []], []],
-        [[[[1], []], []], [-1]],
-        [[[[1], []], []], [1]],
-
-        [[[[1], []], [1]], []],
-        [[[[1], []], [1]], [-1]],
-        [[[[1], []], [1]], [1]],
-
-        [[[[1], [4]], []], []],
-        [[[[1], [4]], []], [-1]],
-        [[[[1], [4]], []], [1]],
-
-        [[[[1], [4]], [1]], []],
-        [[[[1], [4]], [1]], [-1]],
-        [[[[1], [4]], [1]], [1]],
-
-        [[[[2], []], []], []],
-        [[[[2], []], []], [-1]],
-        [[[[2], []], []], [1]],
-
-        [[[[2], []], [1]], []],
-        [[[[2], []], [1]], [-1]],
-        [[[[2], []], [1]], [1]],
-
-        [[[[2], [4]], []], []],
-        [[[[2], [4]], []], [-1]],
-        [[[[2], [4]], []], [1]],
-
-        [[[[2], [4]], [1]], []],
-        [[[[2], [4]], [1]], [-1]],
-        [[[[2], [4]], [1]], [1]],
-
-        [[[[3], []], []], []],
-        [[[[3], []], []], [-1]],
-        [[[[3], []], []], [1]],
-
-        [[[[3], []], [1]], []],
-        [[[[3], []], [1]], [-1]],
-        [[[[3], []], [1]], [1]],
-
-        [[[[3], [4]], []], []],
-        [[[[3], [4]], []], [-1]],
-        [[[[3], [4]], []], [1]],
-
-        [[[[3], [4]], [1]], []],
-        [[[[3], [4]], [1]], [-1]],
-        [[[[3], [4]], [1]], [1]],
-
-        [[[[1, 2], []], []], []],
-        [[[[1, 2], []], []], [-1]],
-        [[[[1, 2], []], []], [1]],
-
-        [[[[1, 2], []], [1]], []],
-        [[[[1, 2], []], [1]], [-1]],
-        [[[[1, 2], []], [1]], [1]],
-
-        [[[[1, 2], [4]], []], []],
-        [[[[1, 2], [4]], []], [-1]],
-        [[[[1, 2], [4]], []], [1]],
-
-        [[[[1, 2], [4]], [1]], []],
-        [[[[1, 2], [4]], [1]], [-1]],
-        [[[[1, 2], [4]], [1]], [1]],
-
-        [[[[1, 3], []], []], []],
-        [[[[1, 3], []], []], [-1]],
-        [[[[1, 3], []], []], [1]],
-
-        [[[[1, 3], []], [1]], []],
-        [[[[1, 3], []], [1]], [-1]],
-        [[[[1, 3], []], [1]], [1]],
-
-        [[[[1, 3], [4]], []], []],
-        [[[[1, 3], [4]], []], [-1]],
-        [[[[1, 3], [4]], []], [1]],
-
-        [[[[1, 3], [4]], [1]], []],
-        [[[[1, 3], [4]], [1]], [-1]],
-        [[[[1, 3], [4]], [1]], [1]],
-
-        [[[[2, 3], []], []], []],
-        [[[[2, 3], []], []], [-1]],
-        [[[[2, 3], []], []], [1]],
-
-        [[[[2, 3], []], [1]], []],
-        [[[[2, 3], []], [1]], [-1]],
-        [[[[2, 3], []], [1]], [1]],
-
-        [[[[2, 3], [4]], []], []],
-        [[[[2, 3], [4]], []], [-1]],
-        [[[[2, 3], [4]], []], [1]],
-
-        [[[[2, 3], [4]], [1]], []],
-        [[[[2, 3], [4]], [1]], [-1]],
-        [[[[2, 3], [4]], [1]], [1]],
-
-        [[[[1, 2, 3], []], []], []],
-        [[[[1, 2, 3], []], []], [-1]],
-        [[[[1, 2, 3], []], []], [1]],
-
-        [[[[1, 2, 3], []], [1]], []],
-        [[[[1, 2, 3], []], [1]], [-1]],
-        [[[[1, 2, 3], []], [1]], [1]],
-
-        [[[[1, 2, 3], [4]], []], []],
-        [[[[1, 2, 3], [4]], []], [-1]],
-        [[[[1, 2, 3], [4]], []], [1]],
-
-        [[[[1, 2, 3], [4]], [1]], []],
-        [[[[1, 2, 3], [4]], [1]], [-1]],
-        [[[[1, 2, 3], [4]], [1]], [1]],
-    ]
-    got = util.unique_list_pairs(
-        util.unique_list_pairs(
-            util.unique_list_pairs(
-                util.unique_combinations(player_roll),
-                util.unique_combinations(bonus_roll)
-            ),
-            util.unique_combinations(plus_two)
-        ),
-        util.unique_combinations(market, 1)
-    )
-
-    assert got == expected
-
 def test_list_minus():
     list1 = [1, 1, 1]
     list2 = [1]
@@ -382,3 +103,23 @@ def test_pick_best():
     input = [(-1, "fred"), (-5, "george"), (-3, "ron")]
     got = util.pick_best(input)
     assert got == (-1, "fred")
+
+def test_multiset_combinations():
+    got = list(util.multiset_combinations([1, 1, 2]))
+    assert got == [(), (1,), (2,), (1, 1), (1, 2), (1, 1, 2)]
+
+    got = list(util.multiset_combinations([-1, 1], 1))
+    assert got == [(), (-1,), (1,)]
+
+    # Matches generate-then-dedup for sorted input.
+    roll = [2, 2, 3, 5, 5]
+    expected = []
+    for i in range(0, len(roll)+1):
+        for combo in itertools.combinations(roll, i):
+            if combo not in expected:
+                expected.append(combo)
+    assert list(util.multiset_combinations(roll)) == expected
+
+def test_multiset_product():
+    got = list(util.multiset_product([(), (1,), (1,)], [0, 0, 1]))
+    assert got == [((), 0), ((), 1), ((1,), 0), ((1,), 1)]